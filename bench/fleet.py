@@ -0,0 +1,140 @@
+"""
+Deterministic synthetic locker fleet.
+
+    python -m bench.fleet --events 100000 > fleet.ndjson
+
+`generate_fleet` yields event dicts for a fleet of lockers going through
+registrations, reservations, deposits, pickups, expiries, faults and clears.
+The same arguments always produce the same stream (ids are drawn from a
+seeded RNG), so runs are comparable between commits. A fraction of the
+stream is re-sent duplicates and invalid transitions (pickup before deposit,
+events for unknown compartments or reservations), as real devices produce.
+"""
+import argparse
+import json
+import random
+import sys
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional
+
+BASE_TIME = datetime(2026, 1, 1)
+# Recent events kept for duplicate injection
+DUPLICATE_WINDOW = 1024
+
+
+class _Compartment:
+    __slots__ = ('cid', 'reservation', 'deposited', 'faults')
+
+    def __init__(self, cid: str):
+        self.cid = cid
+        self.reservation: Optional[str] = None
+        self.deposited = False
+        self.faults: List[str] = []
+
+
+class FleetGenerator:
+    def __init__(self, num_lockers: int = 2000, compartments_per_locker: int = 24, seed: int = 0,
+                 duplicate_rate: float = 0.01, invalid_rate: float = 0.005):
+        self.rng = random.Random(seed)
+        self.num_lockers = num_lockers
+        self.per_locker = compartments_per_locker
+        self.duplicate_rate = duplicate_rate
+        self.invalid_rate = invalid_rate
+        self.lockers: List[List[_Compartment]] = [[] for _ in range(num_lockers)]
+        self.recent: deque = deque(maxlen=DUPLICATE_WINDOW)
+        self.count = 0
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _event(self, locker: int, etype: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        occurred_at = (BASE_TIME + timedelta(seconds=self.count)).isoformat() + 'Z'
+        return {
+            "event_id": self._uuid(),
+            "occurred_at": occurred_at,
+            "locker_id": f"locker-{locker:06d}",
+            "type": etype,
+            "payload": payload,
+        }
+
+    def _invalid(self, locker: int) -> Dict[str, Any]:
+        kind = self.rng.randrange(3)
+        if kind == 0:
+            # Reservation on a compartment that was never registered
+            return self._event(locker, "ReservationCreated",
+                               {"compartment_id": f"ghost-{self._uuid()}", "reservation_id": self._uuid()})
+        if kind == 1:
+            return self._event(locker, "ParcelDeposited", {"reservation_id": self._uuid()})
+        # Pickup of a reservation that has not been deposited yet, if there is one
+        for comp in self.lockers[locker]:
+            if comp.reservation is not None and not comp.deposited:
+                return self._event(locker, "ParcelPickedUp", {"reservation_id": comp.reservation})
+        return self._event(locker, "ParcelPickedUp", {"reservation_id": self._uuid()})
+
+    def _valid(self, locker: int) -> Dict[str, Any]:
+        rng = self.rng
+        comps = self.lockers[locker]
+        if len(comps) < self.per_locker and (not comps or rng.random() < 0.05):
+            comp = _Compartment(f"locker-{locker:06d}-c{len(comps):03d}")
+            comps.append(comp)
+            return self._event(locker, "CompartmentRegistered", {"compartment_id": comp.cid})
+        comp = comps[rng.randrange(len(comps))]
+        if comp.faults and rng.random() < 0.3:
+            fault = comp.faults.pop(rng.randrange(len(comp.faults)))
+            return self._event(locker, "FaultCleared", {"compartment_id": comp.cid, "fault_event_id": fault})
+        if rng.random() < 0.02:
+            event = self._event(locker, "FaultReported", {"compartment_id": comp.cid, "severity": rng.randint(1, 3)})
+            comp.faults.append(event["event_id"])
+            return event
+        if comp.reservation is None:
+            comp.reservation = self._uuid()
+            return self._event(locker, "ReservationCreated",
+                               {"compartment_id": comp.cid, "reservation_id": comp.reservation})
+        rid = comp.reservation
+        if not comp.deposited and rng.random() < 0.85:
+            comp.deposited = True
+            return self._event(locker, "ParcelDeposited", {"reservation_id": rid})
+        etype = "ParcelPickedUp" if comp.deposited and rng.random() < 0.9 else "ReservationExpired"
+        comp.reservation, comp.deposited = None, False
+        return self._event(locker, etype, {"reservation_id": rid})
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rng = self.rng
+        while True:
+            roll = rng.random()
+            if roll < self.duplicate_rate and self.recent:
+                event = self.recent[rng.randrange(len(self.recent))]
+            else:
+                locker = rng.randrange(self.num_lockers)
+                if roll < self.duplicate_rate + self.invalid_rate:
+                    event = self._invalid(locker)
+                else:
+                    event = self._valid(locker)
+                self.recent.append(event)
+            self.count += 1
+            yield event
+
+
+def generate_fleet(num_events: int, **kwargs) -> Iterator[Dict[str, Any]]:
+    """The first `num_events` events of a `FleetGenerator(**kwargs)` stream."""
+    for _, event in zip(range(num_events), FleetGenerator(**kwargs)):
+        yield event
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--lockers", type=int, default=2000)
+    parser.add_argument("--compartments", type=int, default=24, help="compartments per locker")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    out = sys.stdout
+    for event in generate_fleet(args.events, num_lockers=args.lockers,
+                                compartments_per_locker=args.compartments, seed=args.seed):
+        out.write(json.dumps(event) + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Heap bytes held by the projection per compartment and per reservation.
+
+    python -m bench.memory [--lockers 200] [--compartments 50] [--json out.json]
+
+Reservations are measured while active and again once picked up (terminal).
+Event ids are kept in a DedupIndex, as in the API, so they are not counted.
+tracemalloc only sees the Python heap: rows in the projection's ColdStore
+(SQLite) are outside it, which is the point of moving them there.
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+from src.dedup import DedupIndex
+from src.projection import Projection
+
+
+def _event(eid, locker_id, etype, payload):
+    return {"event_id": eid, "occurred_at": "2026-02-21T10:00:00Z",
+            "locker_id": locker_id, "type": etype, "payload": payload}
+
+
+def _traced(fn) -> int:
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    fn()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def measure(num_lockers: int, per_locker: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        dedup = DedupIndex(tmp)
+        proj = Projection(dedup=dedup)
+        n = num_lockers * per_locker
+        seq = iter(range(10 ** 9))
+
+        def apply_all(etype, make_payload):
+            # Ids are built here, as the JSON parser would, so the strings the
+            # projection keeps are counted
+            for i in range(num_lockers):
+                lid = f"mem-locker-{i}"
+                for j in range(per_locker):
+                    cid = f"{lid}-c{j}"
+                    proj.apply(_event(f"{etype}-{cid}", lid, etype, make_payload(cid)), next(seq))
+
+        tracemalloc.start()
+        registered = _traced(lambda: apply_all("CompartmentRegistered", lambda cid: {"compartment_id": cid}))
+        reserved = _traced(lambda: apply_all("ReservationCreated",
+                                             lambda cid: {"compartment_id": cid, "reservation_id": f"r-{cid}"}))
+        deposited = _traced(lambda: apply_all("ParcelDeposited", lambda cid: {"reservation_id": f"r-{cid}"}))
+        picked_up = _traced(lambda: apply_all("ParcelPickedUp", lambda cid: {"reservation_id": f"r-{cid}"}))
+        tracemalloc.stop()
+        dedup.close()
+    return {
+        "compartments": n,
+        "bytes_per_compartment": round(registered / n, 1),
+        "bytes_per_active_reservation": round((reserved + deposited) / n, 1),
+        "bytes_per_terminal_reservation": round((reserved + deposited + picked_up) / n, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lockers", type=int, default=200)
+    parser.add_argument("--compartments", type=int, default=50, help="compartments per locker")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+    result = measure(args.lockers, args.compartments)
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+Ingest, replay and read benchmarks over a synthetic fleet.
+
+    python -m bench.suite [--events 1000000 10000000] [--json out.json] [--compare base.json]
+
+For each log size the suite writes a fleet log (`bench.fleet`) and measures:
+  - append: `EventStore.append` events/sec per durability mode on a sample,
+    from one thread and from concurrent threads sharing group commits, and
+    `append_many` events/sec while the full log is written
+  - rebuild: log decode events/sec and `Projection.replay` events/sec, and
+    on decoded records held in memory, reducer events/sec of `Projection.apply`
+    per event and of `Projection.apply_many`
+  - parallel_rebuild: cold-start `restore_parallel` seconds per worker count
+    (1, 2, 4, ... up to the core count), checked against the serial state
+  - formats: the log converted to the binary record format, with bytes per
+    event and decode / replay events/sec for both formats
+  - serve: in a fresh process running `src.api` from the log directory,
+    startup time with a full replay and again from the shutdown snapshot,
+    read latency percentiles per endpoint through the ASGI app, and peak RSS
+
+Results are JSON; `--compare` prints the relative change of every number
+against an earlier results file, so regressions show up between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Any, List
+from bench.fleet import generate_fleet
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CHUNK = 4096
+PERCENTILES = (50, 90, 99)
+# Concurrent appenders for the group-commit measurement
+APPEND_THREADS = 16
+# Decoded records held in memory for the reducer measurement
+APPLY_SAMPLE = 500_000
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    out = {f"p{p}_ms": round(ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000, 3) for p in PERCENTILES}
+    out["max_ms"] = round(ordered[-1] * 1000, 3)
+    return out
+
+
+def _chunks(events, size: int):
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _timed_appends(mode: str, events: List[Dict[str, Any]], threads: int) -> float:
+    from src.event_store import EventStore
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EventStore(Path(tmp) / 'log', durability=mode)
+        workers = [
+            threading.Thread(target=lambda part: [store.append(e) for e in part], args=(events[i::threads],))
+            for i in range(threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        store.close()
+    return elapsed
+
+
+def bench_append(sample: int, seed: int) -> Dict[str, Any]:
+    """Single-event appends per durability mode, from one thread and from many."""
+    events = list(generate_fleet(sample, seed=seed + 1))
+    results = {}
+    for mode in ('none', 'batch', 'always'):
+        results[f"append_{mode}_ev_s"] = _rate(sample, _timed_appends(mode, events, 1))
+        results[f"append_{mode}_{APPEND_THREADS}_threads_ev_s"] = _rate(
+            sample, _timed_appends(mode, events, APPEND_THREADS))
+    return results
+
+
+def write_log(path: Path, num_events: int, seed: int) -> Dict[str, Any]:
+    from src.event_store import EventStore
+    store = EventStore(path, durability='batch')
+    elapsed = 0.0
+    for chunk in _chunks(generate_fleet(num_events, seed=seed), CHUNK):
+        started = time.perf_counter()
+        store.append_many(chunk)
+        elapsed += time.perf_counter() - started
+    records = store.next_seq
+    store.close()
+    return {"append_many_batch_ev_s": _rate(num_events, elapsed), "records": records}
+
+
+def bench_rebuild(path: Path) -> Dict[str, Any]:
+    from src.event_store import EventStore
+    from src.projection import Projection
+    store = EventStore(path, read_only=True)
+    started = time.perf_counter()
+    count = sum(1 for _ in store.iter_records())
+    decode = time.perf_counter() - started
+    projection = Projection()
+    started = time.perf_counter()
+    projection.replay(store.iter_records())
+    replay = time.perf_counter() - started
+    # The reducer alone, on a decoded prefix of the log
+    records = list(islice(store.iter_records(), APPLY_SAMPLE))
+    store.close()
+    one_by_one = Projection()
+    started = time.perf_counter()
+    for seq, event in records:
+        one_by_one.apply(event, seq)
+    apply = time.perf_counter() - started
+    started = time.perf_counter()
+    Projection().apply_many(records)
+    apply_many = time.perf_counter() - started
+    return {
+        "decode_ev_s": _rate(count, decode),
+        "replay_ev_s": _rate(count, replay),
+        "replay_s": round(replay, 3),
+        "apply_ev_s": _rate(len(records), apply),
+        "apply_many_ev_s": _rate(len(records), apply_many),
+        "lockers": len(projection.lockers),
+    }
+
+
+def bench_parallel_rebuild(path: Path) -> Dict[str, Any]:
+    """Seconds to rebuild from an empty projection per worker count, with every state hash checked."""
+    from src.event_store import EventStore
+    from src.parallel_rebuild import restore_parallel
+    from src.projection import Projection
+    store = EventStore(path, read_only=True)
+    serial = Projection()
+    started = time.perf_counter()
+    restore_parallel(serial, store, workers=1)
+    results: Dict[str, Any] = {"cores": os.cpu_count(), "workers_1_s": round(time.perf_counter() - started, 3)}
+    expected = {lid: serial.locker_summary(lid).state_hash for lid in serial.lockers}
+    del serial
+    workers = 2
+    while workers <= max(2, os.cpu_count() or 1):
+        projection = Projection()
+        started = time.perf_counter()
+        restore_parallel(projection, store, workers=workers, min_records=0)
+        results[f"workers_{workers}_s"] = round(time.perf_counter() - started, 3)
+        assert {lid: projection.locker_summary(lid).state_hash for lid in projection.lockers} == expected
+        workers *= 2
+    store.close()
+    return results
+
+
+def bench_formats(log: Path) -> Dict[str, Any]:
+    """On-disk size and decode / replay speed of the JSONL log and its binary conversion."""
+    from src.event_store import EventStore
+    from src.log_convert import convert
+    binary = log.with_name(log.name + '_binary')
+    started = time.perf_counter()
+    converted = convert(log, binary, 'binary')
+    results: Dict[str, Any] = {"convert_ev_s": _rate(converted["records"], time.perf_counter() - started)}
+    for name, path in (("jsonl", log), ("binary", binary)):
+        store = EventStore(path, read_only=True)
+        size, records = store.size_bytes, store.next_seq
+        store.close()
+        results[name] = {"bytes": size, "bytes_per_event": round(size / max(records, 1), 1)}
+        results[name].update(bench_rebuild(path))
+        del results[name]["lockers"]
+    shutil.rmtree(binary)
+    return results
+
+
+def serve(requests: int, seed: int, startup_only: bool) -> Dict[str, Any]:
+    """Runs in a child process whose working directory holds `event_log/`."""
+    started = time.perf_counter()
+    from src import api
+    api.startup_event()
+    result: Dict[str, Any] = {"startup_s": round(time.perf_counter() - started, 3)}
+    if not startup_only:
+        result["latency"] = asyncio.run(_measure_reads(api, requests, seed))
+    api.shutdown_event()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+async def _measure_reads(api, requests: int, seed: int) -> Dict[str, Dict[str, float]]:
+    import httpx
+    rng = random.Random(seed)
+    projection = api.projection
+    compartments = rng.sample(sorted(projection.compartments), min(requests, len(projection.compartments)))
+    reservations = rng.sample(sorted(projection.reservations), min(requests, len(projection.reservations)))
+    paths = {
+        "get_locker": [f"/lockers/{projection.compartments[cid].locker_id}" for cid in compartments],
+        "get_compartment": [f"/lockers/{projection.compartments[cid].locker_id}/compartments/{cid}"
+                            for cid in compartments],
+        "get_reservation": [f"/reservations/{rid}" for rid in reservations],
+    }
+    latency = {}
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, urls in paths.items():
+            samples = []
+            for url in urls:
+                started = time.perf_counter()
+                response = await client.get(url)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200, (url, response.status_code)
+            if samples:
+                latency[name] = _percentiles(samples)
+        samples = []
+        for event in generate_fleet(requests, seed=seed + 2, num_lockers=50):
+            started = time.perf_counter()
+            await client.post("/events", json=event)
+            samples.append(time.perf_counter() - started)
+        latency["post_event"] = _percentiles(samples)
+    return latency
+
+
+def _run_serve(log_dir: Path, requests: int, seed: int, startup_only: bool) -> Dict[str, Any]:
+    args = [sys.executable, "-m", "bench.suite", "--serve", "--requests", str(requests), "--seed", str(seed)]
+    if startup_only:
+        args.append("--startup-only")
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), LOCKSTREAM_SHARDS="1")
+    out = subprocess.run(args, cwd=log_dir, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(num_events: int, append_sample: int, requests: int, seed: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "event_log"
+        result: Dict[str, Any] = {"events": num_events}
+        result["append"] = bench_append(min(append_sample, num_events), seed)
+        result["append"].update(write_log(log, num_events, seed))
+        result["rebuild"] = bench_rebuild(log)
+        result["parallel_rebuild"] = bench_parallel_rebuild(log)
+        result["formats"] = bench_formats(log)
+        first = _run_serve(Path(tmp), requests, seed, startup_only=False)
+        second = _run_serve(Path(tmp), requests, seed, startup_only=True)
+        result["serve"] = {
+            "startup_full_replay_s": first["startup_s"],
+            "startup_from_snapshot_s": second["startup_s"],
+            "peak_rss_mb": max(first["peak_rss_mb"], second["peak_rss_mb"]),
+            "latency": first["latency"],
+        }
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(value, prefix="") -> Dict[str, float]:
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return out
+    return {prefix: value} if isinstance(value, (int, float)) else {}
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any]):
+    """Prints every numeric result next to the same result in `base`."""
+    base_runs = {run["events"]: run for run in base["runs"]}
+    for run in current["runs"]:
+        old = base_runs.get(run["events"])
+        if old is None:
+            continue
+        print(f"== {run['events']} events ({base['meta']['commit']} -> {current['meta']['commit']})")
+        old_flat = _flatten(old)
+        for key, value in _flatten(run).items():
+            if key in old_flat and old_flat[key]:
+                change = (value - old_flat[key]) / old_flat[key] * 100
+                print(f"{key:50} {old_flat[key]:>14} {value:>14} {change:+8.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, nargs="+", default=[100_000], help="log sizes to run")
+    parser.add_argument("--append-sample", type=int, default=20_000, help="events per durability mode")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        print(json.dumps(serve(args.requests, args.seed, args.startup_only)))
+        return
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "runs": [run(n, args.append_sample, args.requests, args.seed) for n in args.events],
+    }
+    result["meta"]["bench_peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,613 @@
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
-from src.models import Event, LockerSummary, CompartmentStatus, ReservationStatus
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, Query, Header, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from src.models import (
+    EventType, LockerSummary, CompartmentStatus, ReservationStatus,
+    BatchEventStatusEnum, BatchIngestResponse, IngestStats,
+    LockerQuery, LockerQueryResponse, LockerPage, ReservationQuery, ReservationQueryResponse,
+)
+from src.compaction import Compactor
 from src.event_store import EventStore
+from src.expiry import ExpiryScheduler, ExpiryEngine
+from src.feed import ChangeFeed, sse_stream
+from src.follower import Follower
+from src.history import HistoryStore, TimeTravel, HistoryCompacted
+from src.http_cache import ResponseCache, etag_for, etag_matches
+from src.ingest import IngestPipeline, IngestQueueFull
+from src.metrics import Metrics, CONTENT_TYPE
+from src.parallel_rebuild import restore_parallel
 from src.projection import Projection
+from src.sharding import ShardedProjection
+from src.snapshot import SnapshotStore, Snapshotter, restore
+from src.wire import canonical_event, encode_json
+
+MAX_BATCH_EVENTS = 10_000
+MAX_QUERY_IDS = 10_000
+MAX_PAGE_SIZE = 1000
+# Rows per chunk of an NDJSON response
+NDJSON_CHUNK_ROWS = 500
+# Events waiting for the writer before ingest answers 503
+INGEST_QUEUE_CAPACITY = int(os.environ.get('LOCKSTREAM_INGEST_QUEUE', '10000'))
+LOG_PATH = 'event_log'
+# Record format for a new log (jsonl or binary); an existing log keeps its own
+LOG_FORMAT = os.environ.get('LOCKSTREAM_LOG_FORMAT')
+# Number of projection worker processes, 1 keeps the projection in-process
+NUM_SHARDS = int(os.environ.get('LOCKSTREAM_SHARDS', '1'))
+# Processes replaying the log at startup, 1 replays it in-process
+REBUILD_WORKERS = int(os.environ.get('LOCKSTREAM_REBUILD_WORKERS', '1'))
+# Seconds a reservation may wait for a deposit / a parcel for pickup before the
+# service expires it itself; unset leaves expiry to ReservationExpired events
+RESERVATION_TTL = os.environ.get('LOCKSTREAM_RESERVATION_TTL')
+PICKUP_TTL = os.environ.get('LOCKSTREAM_PICKUP_TTL')
+# Records to keep in the log when compacting it in the background (unset: never
+# compact), and seconds between compaction runs
+COMPACT_RETAIN = os.environ.get('LOCKSTREAM_COMPACT_RETAIN')
+COMPACT_INTERVAL = float(os.environ.get('LOCKSTREAM_COMPACT_INTERVAL', '300'))
+# 'follower' serves reads from a projection tailing the writer's LOG_PATH
+# (read-only, e.g. on a shared volume), keeping its own state in FOLLOWER_DIR
+ROLE = os.environ.get('LOCKSTREAM_ROLE', 'writer')
+FOLLOWER_DIR = os.environ.get('LOCKSTREAM_FOLLOWER_DIR', 'follower_state')
+FOLLOW_INTERVAL = float(os.environ.get('LOCKSTREAM_FOLLOW_INTERVAL', '0.05'))
+# Set when running several worker processes on one LOG_PATH (uvicorn --workers N):
+# they append under a shared commit lock and catch up with each other before reads
+MULTI_WRITER = bool(os.environ.get('LOCKSTREAM_MULTI_WRITER'))
+# Seconds between looks for other workers' appends when no request asks for them
+MULTI_WRITER_POLL = float(os.environ.get('LOCKSTREAM_MULTI_WRITER_POLL', '0.05'))
+if ROLE not in ('writer', 'follower'):
+    raise ValueError(f"LOCKSTREAM_ROLE must be writer or follower, got {ROLE!r}")
+if MULTI_WRITER and (ROLE == 'follower' or NUM_SHARDS > 1 or COMPACT_RETAIN):
+    raise RuntimeError("LOCKSTREAM_MULTI_WRITER requires the writer role, LOCKSTREAM_SHARDS=1 and no compaction")
 
 app = FastAPI()
-event_store = EventStore('events.jsonl')
-projection = Projection()
+metrics = Metrics()
+if ROLE == 'follower':
+    event_store = EventStore(LOG_PATH, read_only=True, metrics=metrics)
+else:
+    # append() blocks until the group commit holding the event is fsynced
+    event_store = EventStore(LOG_PATH, durability='batch', metrics=metrics, log_format=LOG_FORMAT,
+                             shared=MULTI_WRITER)
+
+def make_expiry() -> Optional[ExpiryScheduler]:
+    if not (RESERVATION_TTL or PICKUP_TTL):
+        return None
+    return ExpiryScheduler(
+        reservation_ttl=float(RESERVATION_TTL) if RESERVATION_TTL else None,
+        pickup_ttl=float(PICKUP_TTL) if PICKUP_TTL else None,
+    )
+
+if NUM_SHARDS > 1:
+    if event_store.start_seq > 0:
+        # Shards replay the log itself and cannot start from a compaction base
+        raise RuntimeError("A compacted log requires LOCKSTREAM_SHARDS=1")
+    if ROLE == 'follower':
+        raise RuntimeError("A follower requires LOCKSTREAM_SHARDS=1")
+    projection = ShardedProjection(NUM_SHARDS, LOG_PATH)
+    # The router collects the shards' states into one snapshot, and seeds them from it
+    snapshots = SnapshotStore(os.path.join(LOG_PATH, 'snapshots'))
+    snapshotter = Snapshotter(projection, snapshots)
+    expiry_engine = None
+    compactor = None
+elif ROLE == 'follower':
+    # Expiry and compaction are the writer's, the follower sees their results in the log
+    projection = Projection(metrics=metrics)
+    expiry_engine = None
+    compactor = None
+    snapshots = SnapshotStore(os.path.join(FOLLOWER_DIR, 'snapshots'))
+    snapshotter = Snapshotter(projection, snapshots)
+else:
+    expiry = make_expiry()
+    projection = Projection(dedup=event_store.dedup, metrics=metrics, expiry=expiry)
+    expiry_engine = ExpiryEngine(projection, event_store, expiry) if expiry is not None else None
+    snapshots = SnapshotStore(os.path.join(LOG_PATH, 'snapshots'))
+    snapshotter = Snapshotter(projection, snapshots)
+    compactor = None
+    if COMPACT_RETAIN:
+        compactor = Compactor(
+            event_store, snapshots, retain_records=int(COMPACT_RETAIN), interval=COMPACT_INTERVAL,
+            projection_factory=lambda: Projection(dedup=event_store.dedup, expiry=make_expiry()),
+        )
+
+# Point-in-time reads replay one locker from its checkpoints, off the live projection
+history_dir = FOLLOWER_DIR if ROLE == 'follower' else LOG_PATH
+os.makedirs(history_dir, exist_ok=True)
+# (kept in memory per worker when several share the log, as the file has no journal)
+time_travel = TimeTravel(event_store, HistoryStore() if MULTI_WRITER else
+                         HistoryStore(os.path.join(history_dir, 'history.sqlite')))
+
+# Serialized read responses, keyed by entity and valid for one entity version
+response_cache = ResponseCache()
+
+# Deltas need the projection's post-apply state, so only the in-process projection has a feed
+change_feed = ChangeFeed(projection) if isinstance(projection, Projection) else None
+
+def on_applied(seq, event, outcome):
+    if change_feed is not None:
+        change_feed.publish(seq, event, outcome)
+    if snapshotter is not None:
+        snapshotter.on_applied()
+
+# Durable events are applied by the store's flusher in log order, before the
+# appending request is released, so the projection never sees a gap.
+# (A follower applies them from its own thread as it finds them in the log.)
+def on_durable(seq, event):
+    on_applied(seq, event, projection.apply(event, seq))
+
+follower = None
+ingest = None
+if ROLE == 'follower':
+    follower = Follower(event_store, projection, snapshots, sources=[SnapshotStore(os.path.join(LOG_PATH, 'snapshots'))],
+                        interval=FOLLOW_INTERVAL, on_applied=on_applied)
+else:
+    event_store.subscribe(on_durable)
+    # Ingest handlers only enqueue; one writer appends (and so applies) in order.
+    # Reads are served from memory and never queue behind it.
+    ingest = IngestPipeline(event_store, capacity=INGEST_QUEUE_CAPACITY, metrics=metrics)
+
+metrics.gauge('lockstream_log_records', 'Records in the event log', lambda: event_store.next_seq)
+metrics.gauge('lockstream_log_bytes', 'Size of the event log segments', lambda: event_store.size_bytes)
+metrics.gauge('lockstream_log_segments', 'Event log segments', lambda: len(event_store.segments))
+metrics.gauge('lockstream_log_start_seq', 'Oldest record kept in the event log (raised by compaction)',
+              lambda: event_store.start_seq)
+if ingest is not None:
+    metrics.gauge('lockstream_ingest_queue_depth', 'Events waiting for the ingest writer', lambda: ingest.depth)
+if follower is not None:
+    metrics.gauge('lockstream_replica_lag_records', 'Logged records the replica has not applied yet',
+                  lambda: follower.lag_records)
+    metrics.gauge('lockstream_replica_lag_seconds', 'Seconds since the replica last held every logged record',
+                  lambda: follower.lag_seconds)
+if isinstance(projection, Projection):
+    def _entity_counts():
+        cold_reservations, cold_faults = projection.cold.counts()
+        return {
+            ('lockers',): len(projection.lockers),
+            ('compartments',): len(projection.compartments),
+            ('reservations_active',): len(projection.reservations),
+            ('reservations_settled',): cold_reservations,
+            ('faults_open',): len(projection.faults),
+            ('faults_cleared',): cold_faults,
+        }
+    metrics.gauge('lockstream_entities', 'In-memory (and cold store) projection entities', _entity_counts, ('kind',))
+if change_feed is not None:
+    metrics.gauge('lockstream_feed_subscribers', 'Open change feed subscriptions', lambda: change_feed.subscribers)
+if expiry_engine is not None:
+    metrics.gauge('lockstream_expiry_pending', 'Reservation deadline timers waiting to fire',
+                  lambda: len(expiry_engine.scheduler))
+    metrics.gauge('lockstream_expiry_fired', 'ReservationExpired events emitted by the expiry engine',
+                  lambda: expiry_engine.fired)
 
-# On startup, rebuild projection from event log
+# On startup, load the newest snapshot and replay only the log tail
+# (sharded: every shard replays its own lockers after it in parallel; with
+# LOCKSTREAM_REBUILD_WORKERS, a long tail is replayed across processes;
+# a follower then keeps tailing the log)
 @app.on_event("startup")
 def startup_event():
-    events = event_store.load_all()
-    projection.rebuild(events)
+    started = time.perf_counter()
+    if follower is not None:
+        replayed = follower.start()
+    elif isinstance(projection, ShardedProjection):
+        projection.start()
+        replayed = projection.rebuild_from_log(snapshots)
+    elif REBUILD_WORKERS > 1:
+        replayed = restore_parallel(projection, event_store, snapshots, REBUILD_WORKERS)
+    else:
+        replayed = restore(projection, event_store, snapshots)
+    metrics.rebuild_seconds.set(time.perf_counter() - started)
+    metrics.rebuild_events.set(replayed)
+    if expiry_engine is not None:
+        # Only once caught up, so deadlines that passed while down fire once
+        expiry_engine.start()
+    if compactor is not None:
+        compactor.start()
+    if MULTI_WRITER:
+        # Only now, so other workers' records reach the projection after the replay
+        event_store.poll_interval = MULTI_WRITER_POLL
 
+@app.on_event("shutdown")
+def shutdown_event():
+    if expiry_engine is not None:
+        expiry_engine.close()
+    if compactor is not None:
+        compactor.close()
+    if follower is not None:
+        follower.close()
+    if ingest is not None:
+        ingest.close()
+    event_store.close()
+    time_travel.history.close()
+    snapshotter.close()
+    if isinstance(projection, ShardedProjection):
+        projection.close()
 
+
+if follower is not None:
+    @app.middleware("http")
+    async def report_replication_lag(request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Replica-Position"] = str(projection.position)
+        response.headers["X-Replica-Lag-Records"] = str(follower.lag_records)
+        response.headers["X-Replica-Lag-Seconds"] = f"{follower.lag_seconds:.3f}"
+        return response
+
+if MULTI_WRITER:
+    @app.middleware("http")
+    async def catch_up_with_other_workers(request: Request, call_next):
+        # Reads see every event acknowledged by any worker before the request arrived
+        if request.method == "GET" or request.url.path.endswith(":query"):
+            await asyncio.to_thread(event_store.catch_up)
+        return await call_next(request)
+
+def _check_writable():
+    if ingest is None:
+        raise HTTPException(status_code=405, detail="Read replica, send events to the writer")
+
+def _overloaded(exc: IngestQueueFull) -> JSONResponse:
+    return JSONResponse(
+        content={"detail": "Ingest queue full"},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+ACCEPTED_BODY = encode_json({"detail": "Event accepted"})
+DUPLICATE_BODY = encode_json({"detail": "Duplicate event"})
+
+def _read_event(body: bytes) -> dict:
+    """The request's event in its logged form; invalid input answers 422 as a FastAPI body model would."""
+    try:
+        item = json.loads(body)
+    except ValueError as exc:
+        raise RequestValidationError([{
+            "type": "json_invalid", "loc": ("body", getattr(exc, 'pos', 0)), "msg": "JSON decode error",
+            "input": {}, "ctx": {"error": getattr(exc, 'msg', str(exc))},
+        }])
+    try:
+        return canonical_event(item)
+    except ValidationError as exc:
+        raise RequestValidationError([dict(e, loc=("body", *e['loc'])) for e in exc.errors(include_url=False)])
+
+# The body is validated without an Event model and logged as parsed (see
+# wire.canonical_event); the Event schema is documented in openapi.yaml
 @app.post("/events")
-def ingest_event(event: Event):
-    event_dict = event.model_dump()
-    appended = event_store.append(event_dict)
+async def ingest_event(request: Request):
+    _check_writable()
+    event = _read_event(await request.body())
+    try:
+        pending = ingest.submit([event])
+    except IngestQueueFull as exc:
+        return _overloaded(exc)
+    appended, = await asyncio.wrap_future(pending)
     if not appended:
-        return JSONResponse(content={"detail": "Duplicate event"}, status_code=200)
-    projection.apply(event_dict)
-    return JSONResponse(content={"detail": "Event accepted"}, status_code=202)
+        return Response(content=DUPLICATE_BODY, media_type="application/json", status_code=200)
+    return Response(content=ACCEPTED_BODY, media_type="application/json", status_code=202)
 
-@app.get("/lockers/{locker_id}", response_model=LockerSummary)
-def get_locker_summary(locker_id: str):
+def _parse_batch_body(body: bytes, content_type: str) -> list:
+    if 'ndjson' in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Batch body must be a JSON array")
+    return items
+
+def _format_errors(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
+
+@app.post("/events:batch", response_model=BatchIngestResponse)
+async def ingest_event_batch(request: Request):
+    _check_writable()
+    try:
+        items = _parse_batch_body(await request.body(), request.headers.get('content-type', ''))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON of events")
+    if len(items) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_EVENTS} events")
+
+    # Validate everything first, then append the valid events as one group commit
+    results = []
+    valid, valid_idx = [], []
+    for i, item in enumerate(items):
+        try:
+            event = canonical_event(item)
+        except ValidationError as exc:
+            event_id = item.get('event_id') if isinstance(item, dict) else None
+            results.append({
+                "index": i,
+                "event_id": event_id if isinstance(event_id, str) else None,
+                "status": BatchEventStatusEnum.REJECTED.value,
+                "detail": _format_errors(exc),
+            })
+            continue
+        results.append(None)
+        valid.append(event)
+        valid_idx.append(i)
+    appended = []
+    if valid:
+        # The batch is queued as one unit, so it is appended contiguously or refused whole
+        try:
+            pending = ingest.submit(valid)
+        except IngestQueueFull as exc:
+            return _overloaded(exc)
+        appended = await asyncio.wrap_future(pending)
+    for i, event, ok in zip(valid_idx, valid, appended):
+        results[i] = {
+            "index": i,
+            "event_id": event['event_id'],
+            "status": (BatchEventStatusEnum.ACCEPTED if ok else BatchEventStatusEnum.DUPLICATE).value,
+            "detail": None,
+        }
+
+    # Rows in BatchIngestResponse's layout, encoded without building the models
+    accepted = sum(appended)
+    response = {
+        "accepted": accepted,
+        "duplicates": len(appended) - accepted,
+        "rejected": len(items) - len(appended),
+        "results": results,
+    }
+    return Response(content=encode_json(response), media_type="application/json",
+                    status_code=202 if accepted else 200)
+
+@app.get("/feed")
+async def get_change_feed(
+    locker_id: Optional[List[str]] = Query(None),
+    after: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    if change_feed is None:
+        raise HTTPException(status_code=501, detail="Change feed requires the in-process projection")
+    # An SSE client reconnecting sends the id of the last event it received
+    if after is None and last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Last-Event-ID must be a log position")
+    sub = change_feed.subscribe(set(locker_id) if locker_id else None, after)
+    return StreamingResponse(
+        sse_stream(change_feed, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+# Log export: the logged events as NDJSON, in log order (a body POST
+# /events:batch accepts). Streamed from the store a chunk at a time, in a
+# worker thread and only as fast as the client reads; covers the records in
+# [X-Log-Start, X-Log-End), so the next export resumes from X-Log-End.
+@app.get("/events")
+def export_events(
+    from_seq: Optional[int] = Query(None, ge=0),
+    types: Optional[List[EventType]] = Query(None, alias="type"),
+    locker_id: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    start, end = event_store.start_seq, event_store.next_seq
+    if from_seq is not None:
+        if from_seq < start:
+            raise HTTPException(status_code=410, detail=f"Records before log position {start} are compacted")
+        start = from_seq
+    rows = (event for _, event in event_store.iter_events(start, end, types, locker_id, since, until))
+    return _ndjson(rows, headers={"X-Log-Start": str(start), "X-Log-End": str(max(start, end))})
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/ingest/stats", response_model=IngestStats)
+def get_ingest_stats():
+    _check_writable()
+    stats = ingest.stats
+    return IngestStats(
+        queue_depth=ingest.depth,
+        queue_capacity=ingest.capacity,
+        accepted=stats.accepted,
+        duplicates=stats.duplicates,
+        rejected_queue_full=stats.rejected_full,
+        batches=stats.batches,
+        wait_seconds_avg=stats.wait_avg,
+        wait_seconds_max=stats.wait_max,
+        service_seconds_avg=stats.service_avg,
+        service_seconds_max=stats.service_max,
+    )
+
+def _conditional_get(request: Request, kind: str, key, version_of, build, not_found: str):
+    """
+    Serves an entity by its version: 304 if the client's ETag is current,
+    else the cached body for this version, encoding the projection's row
+    (and caching it) only on a miss.
+    """
+    version = version_of()
+    if version is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    etag = etag_for(kind, version)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    body = response_cache.get((kind, key), version)
+    if body is None:
+        row = build()
+        if row is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        body = encode_json(row)
+        # Applies run concurrently: only cache if the body matches the version
+        if version_of() == version:
+            response_cache.put((kind, key), version, body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def _wants_ndjson(request: Request) -> bool:
+    return 'application/x-ndjson' in request.headers.get('accept', '')
+
+def _ndjson(rows, headers: Optional[dict] = None) -> StreamingResponse:
+    def chunks():
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row))
+            if len(lines) == NDJSON_CHUNK_ROWS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    return StreamingResponse(chunks(), media_type='application/x-ndjson', headers=headers)
+
+def _summary_row(locker_id: str):
+    if isinstance(projection, Projection):
+        return projection.summary_row(locker_id)
     summary = projection.locker_summary(locker_id)
-    if summary is None:
-        raise HTTPException(status_code=404, detail="Locker not found")
-    return summary
+    return None if summary is None else summary.model_dump()
+
+def _reservation_row(reservation_id: str):
+    if isinstance(projection, Projection):
+        return projection.reservation_row(reservation_id)
+    res = projection.reservation_status(reservation_id)
+    return None if res is None else res.model_dump(mode='json')
+
+def _check_query_size(ids: list):
+    if len(ids) > MAX_QUERY_IDS:
+        raise HTTPException(status_code=413, detail=f"Query exceeds {MAX_QUERY_IDS} ids")
+
+# Bulk reads are answered from the projection as plain dicts (no per-row
+# model) in one pass; with Accept: application/x-ndjson they are streamed
+# one object per line, omitting ids that are not found.
+@app.post("/lockers:query", response_model=LockerQueryResponse)
+def query_lockers(query: LockerQuery, request: Request):
+    _check_query_size(query.locker_ids)
+    if _wants_ndjson(request):
+        return _ndjson(row for row in map(_summary_row, query.locker_ids) if row is not None)
+    lockers, not_found = [], []
+    for locker_id in query.locker_ids:
+        row = _summary_row(locker_id)
+        if row is None:
+            not_found.append(locker_id)
+        else:
+            lockers.append(row)
+    return JSONResponse(content={"lockers": lockers, "not_found": not_found})
+
+@app.get("/lockers", response_model=LockerPage)
+def list_lockers(
+    request: Request,
+    degraded: Optional[bool] = None,
+    has_active_reservations: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    if not isinstance(projection, Projection):
+        raise HTTPException(status_code=501, detail="Locker listing requires the in-process projection")
+    def page(after, size):
+        return projection.list_lockers(degraded, has_active_reservations, after, size)
+    if _wants_ndjson(request):
+        # Every match after the cursor, read a page at a time
+        def rows():
+            after = cursor
+            while True:
+                ids = page(after, MAX_PAGE_SIZE)
+                for locker_id in ids:
+                    row = projection.summary_row(locker_id)
+                    if row is not None:
+                        yield row
+                if len(ids) < MAX_PAGE_SIZE:
+                    return
+                after = ids[-1]
+        return _ndjson(rows())
+    ids = page(cursor, limit)
+    items = [row for row in map(projection.summary_row, ids) if row is not None]
+    return JSONResponse(content={"items": items, "next_cursor": ids[-1] if len(ids) == limit else None})
+
+@app.post("/reservations:query", response_model=ReservationQueryResponse)
+def query_reservations(query: ReservationQuery, request: Request):
+    _check_query_size(query.reservation_ids)
+    if _wants_ndjson(request):
+        return _ndjson(row for row in map(_reservation_row, query.reservation_ids) if row is not None)
+    reservations, not_found = [], []
+    for reservation_id in query.reservation_ids:
+        row = _reservation_row(reservation_id)
+        if row is None:
+            not_found.append(reservation_id)
+        else:
+            reservations.append(row)
+    return JSONResponse(content={"reservations": reservations, "not_found": not_found})
+
+def _parse_as_of(as_of: str):
+    if as_of.isdigit():
+        return int(as_of)
+    try:
+        # An unescaped '+' in a query string arrives as a space
+        return datetime.fromisoformat(as_of.replace(' ', '+'))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="as_of must be a log sequence number or an ISO-8601 time")
+
+def _read_as_of(locker_id: str, as_of: str, read, not_found: str):
+    """Answers a read from the locker's state as of a log position or time, not the live projection."""
+    point = _parse_as_of(as_of)
+    try:
+        past = time_travel.at(locker_id, point)
+    except HistoryCompacted as exc:
+        raise HTTPException(status_code=410, detail=str(exc))
+    model = read(past)
+    if model is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return model
+
+def _sharded_read(read, not_found: str):
+    """A read from the sharded projection, which has no versions to cache by."""
+    model = read()
+    if model is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return model
+
+# Entity reads are answered on the event loop from memory, skipping the
+# thread pool hop; point-in-time reads (which may replay a locker's history)
+# and the sharded projection (a round trip to a worker process) block, so
+# they still run in the pool.
+@app.get("/lockers/{locker_id}", response_model=LockerSummary)
+async def get_locker_summary(locker_id: str, request: Request, as_of: Optional[str] = None):
+    if as_of is not None:
+        return await run_in_threadpool(_read_as_of, locker_id, as_of, lambda past: past.locker_summary(locker_id),
+                                       "Locker not found")
+    if not isinstance(projection, Projection):
+        return await run_in_threadpool(_sharded_read, lambda: projection.locker_summary(locker_id), "Locker not found")
+    return _conditional_get(
+        request, "l", locker_id,
+        lambda: projection.locker_version(locker_id),
+        lambda: projection.summary_row(locker_id),
+        "Locker not found",
+    )
 
 @app.get("/lockers/{locker_id}/compartments/{compartment_id}", response_model=CompartmentStatus)
-def get_compartment_status(locker_id: str, compartment_id: str):
-    status_obj = projection.compartment_status(locker_id, compartment_id)
-    if status_obj is None:
-        raise HTTPException(status_code=404, detail="Compartment not found")
-    return status_obj
+async def get_compartment_status(locker_id: str, compartment_id: str, request: Request, as_of: Optional[str] = None):
+    if as_of is not None:
+        return await run_in_threadpool(
+            _read_as_of, locker_id, as_of, lambda past: past.compartment_status(locker_id, compartment_id),
+            "Compartment not found")
+    if not isinstance(projection, Projection):
+        return await run_in_threadpool(
+            _sharded_read, lambda: projection.compartment_status(locker_id, compartment_id), "Compartment not found")
+    return _conditional_get(
+        request, "c", compartment_id,
+        lambda: projection.compartment_version(locker_id, compartment_id),
+        lambda: projection.compartment_row(locker_id, compartment_id),
+        "Compartment not found",
+    )
 
 @app.get("/reservations/{reservation_id}", response_model=ReservationStatus)
-def get_reservation_status(reservation_id: str):
-    res_status = projection.reservation_status(reservation_id)
-    if res_status is None:
-        raise HTTPException(status_code=404, detail="Reservation not found")
-    return res_status
+async def get_reservation_status(reservation_id: str, request: Request, as_of: Optional[str] = None):
+    if as_of is not None:
+        if not isinstance(projection, Projection):
+            raise HTTPException(status_code=501, detail="Reservation history requires the in-process projection")
+        locker_id = projection.reservation_locker(reservation_id)
+        if locker_id is None:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        return await run_in_threadpool(_read_as_of, locker_id, as_of,
+                                       lambda past: past.reservation_status(reservation_id), "Reservation not found")
+    if not isinstance(projection, Projection):
+        return await run_in_threadpool(
+            _sharded_read, lambda: projection.reservation_status(reservation_id), "Reservation not found")
+    return _conditional_get(
+        request, "r", reservation_id,
+        lambda: projection.reservation_version(reservation_id),
+        lambda: projection.reservation_row(reservation_id),
+        "Reservation not found",
+    )
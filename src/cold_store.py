@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from typing import Optional, List, Tuple
+
+COLD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id TEXT PRIMARY KEY,
+    compartment_id TEXT NOT NULL,
+    locker_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS faults (
+    fault_id TEXT PRIMARY KEY,
+    compartment_id TEXT NOT NULL,
+    severity INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ColdStore:
+    """
+    Settled projection history (terminal reservations, cleared faults) kept
+    off the Python heap in SQLite and only read on demand. It is derived data
+    that is rebuilt on replay, so there is no journal or fsync. In-memory by
+    default; pass a path to spill it to disk.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.executescript(COLD_SCHEMA)
+
+    def put_reservation(self, reservation_id: str, compartment_id: str, locker_id: str, status: str,
+                        version: int = 0):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reservations VALUES (?, ?, ?, ?, ?)",
+                (reservation_id, compartment_id, locker_id, status, version),
+            )
+
+    def get_reservation(self, reservation_id: str) -> Optional[Tuple[str, str, str, str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM reservations WHERE reservation_id = ?", (reservation_id,)
+            ).fetchone()
+
+    def put_fault(self, fault_id: str, compartment_id: str, severity: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO faults VALUES (?, ?, ?)", (fault_id, compartment_id, severity))
+
+    def get_fault(self, fault_id: str) -> Optional[Tuple[str, str, int]]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM faults WHERE fault_id = ?", (fault_id,)).fetchone()
+
+    def reservations(self) -> List[Tuple[str, str, str, str, int]]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM reservations").fetchall()
+
+    def faults(self) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM faults").fetchall()
+
+    def counts(self) -> Tuple[int, int]:
+        with self._lock:
+            reservations = self._conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+            faults = self._conn.execute("SELECT COUNT(*) FROM faults").fetchone()[0]
+        return reservations, faults
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM reservations")
+            self._conn.execute("DELETE FROM faults")
+
+    def close(self):
+        self._conn.close()
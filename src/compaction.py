@@ -0,0 +1,136 @@
+"""
+Compacts an event log: drops its oldest sealed segments once their state is
+kept as the log's base snapshot.
+
+    python -m src.compaction event_log [--retain 1000000] [--reservation-ttl S] [--pickup-ttl S]
+
+Run it with the service stopped; the service compacts online when
+LOCKSTREAM_COMPACT_RETAIN is set.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+from src.event_store import EventStore
+from src.expiry import ExpiryScheduler
+from src.projection import Projection
+from src.snapshot import SnapshotStore, BASE_DIR, load_start
+
+# Records kept in the log behind its head, and so event ids that survive a
+# rebuild of the dedup index from the log
+DEFAULT_RETAIN = 1_000_000
+DEFAULT_INTERVAL = 300.0
+
+logger = logging.getLogger(__name__)
+
+
+class Compactor:
+    """
+    Replaces the log's prefix with a snapshot plus the residual events after
+    it. A run picks the horizon: the end of the newest sealed segment that
+    still leaves `retain_records` records (and at least the dedup window)
+    after it. It replays the records before the horizon into a fresh
+    projection, starting from the newest snapshot or base it can, saves that
+    state as the log's base and then drops the segments. Restoring the base
+    and replaying the rest reproduces the projection exactly: the base is
+    the state at that position, versions and deadlines included.
+
+    Only sealed segments are read and the store is only locked to swap its
+    segment list, so appends carry on during a run. `projection_factory`
+    must build projections configured like the service's (expiry TTLs) so
+    deadlines in the base match.
+    """
+
+    def __init__(self, store: EventStore, snapshots: Optional[SnapshotStore] = None,
+                 retain_records: int = DEFAULT_RETAIN, interval: float = DEFAULT_INTERVAL,
+                 projection_factory: Optional[Callable[[], Projection]] = None):
+        self.store = store
+        self.snapshots = snapshots
+        self.base = SnapshotStore(store.path / BASE_DIR)
+        window = store.dedup.window if store.dedup is not None else None
+        self.retain_records = max(retain_records, window or 0)
+        self.interval = interval
+        # Replayed records are unique, so the projection need not track ids
+        self.projection_factory = projection_factory or (lambda: Projection(dedup=store.dedup))
+        self.runs = 0
+        self.dropped_records = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def horizon(self) -> int:
+        limit = self.store.next_seq - self.retain_records
+        horizon = self.store.start_seq
+        for segment in list(self.store.segments):
+            if segment.sealed and segment.end_seq <= limit:
+                horizon = segment.end_seq
+        return horizon
+
+    def compact(self) -> Dict[str, Any]:
+        """One run; returns the log's start before and after and the records dropped."""
+        store = self.store
+        start, horizon = store.start_seq, self.horizon()
+        result = {"start_seq": start, "horizon": horizon, "dropped_records": 0}
+        if horizon <= start:
+            return result
+        started = time.perf_counter()
+        projection = self.projection_factory()
+        state = load_start(store, self.snapshots, horizon)
+        if state is not None:
+            projection.restore_state(state)
+        projection.replay(store.iter_records(projection.position, horizon))
+        if projection.position != horizon:
+            raise RuntimeError(f"Replay stopped at {projection.position}, expected {horizon}")
+        self.base.save(projection.snapshot_state())
+        new_start = store.drop_before(horizon)
+        self.runs += 1
+        self.dropped_records += new_start - start
+        result.update(dropped_records=new_start - start, start_seq=new_start,
+                      seconds=round(time.perf_counter() - started, 3))
+        return result
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='compactor', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.compact()
+                if result["dropped_records"]:
+                    logger.info("Compacted the log to start at %d (%d records dropped)",
+                                result["start_seq"], result["dropped_records"])
+            except Exception:
+                logger.exception("Log compaction failed")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("log", help="event log directory")
+    parser.add_argument("--retain", type=int, default=DEFAULT_RETAIN, help="records to keep after the horizon")
+    parser.add_argument("--reservation-ttl", type=float, help="as LOCKSTREAM_RESERVATION_TTL")
+    parser.add_argument("--pickup-ttl", type=float, help="as LOCKSTREAM_PICKUP_TTL")
+    args = parser.parse_args(argv)
+    store = EventStore(args.log)
+    try:
+        def projection_factory():
+            expiry = None
+            if args.reservation_ttl or args.pickup_ttl:
+                expiry = ExpiryScheduler(reservation_ttl=args.reservation_ttl, pickup_ttl=args.pickup_ttl)
+            return Projection(dedup=store.dedup, expiry=expiry)
+        compactor = Compactor(store, SnapshotStore(store.path / 'snapshots'), args.retain,
+                              projection_factory=projection_factory)
+        print(json.dumps(compactor.compact()))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
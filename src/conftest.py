@@ -0,0 +1,11 @@
+import os
+import shutil
+import pytest
+
+# Where the API opens its log: the tests run from the repository root
+EVENT_LOG = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'event_log'))
+
+
+@pytest.fixture
+def clear_event_log():
+    shutil.rmtree(EVENT_LOG, ignore_errors=True)
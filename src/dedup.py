@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import mmap
+import uuid
+from pathlib import Path
+from typing import Optional, List, Iterable
+from src.fileutil import write_atomic
+
+MAGIC = b'LSDEDUP2'
+HEADER_SIZE = 32
+KEY_SIZE = 16
+MIN_CAPACITY = 1024
+MAX_LOAD = 0.5
+CHECKPOINT_NAME = 'dedup.json'
+CHECKPOINT_VERSION = 2  # 2: slots from the whole key (see KeyTable._slot); older tables are rebuilt
+# Fibonacci hashing constant (2^64 / golden ratio, odd)
+SLOT_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(event_id: str) -> bytes:
+    """128-bit key of an event id: the UUID bytes, or a 128-bit BLAKE2b digest for other ids."""
+    try:
+        parsed = uuid.UUID(event_id)
+    except ValueError:
+        parsed = None
+    # Only the canonical form maps to raw bytes, so "ABC.." and "abc.." stay distinct ids
+    if parsed is not None and str(parsed) == event_id:
+        key = parsed.bytes
+    else:
+        key = hashlib.blake2b(event_id.encode(), digest_size=KEY_SIZE).digest()
+    # All-zero marks an empty slot
+    return key if any(key) else b'\x00' * (KEY_SIZE - 1) + b'\x01'
+
+
+def _capacity_for(entries: int) -> int:
+    capacity = MIN_CAPACITY
+    while capacity * MAX_LOAD < entries:
+        capacity *= 2
+    return capacity
+
+
+class KeyTable:
+    """
+    Open-addressing (linear probing) set of 16-byte keys in one flat buffer:
+    a 32-byte header followed by `capacity` slots. Backed by a shared mmap of
+    `path`, so the table lives in the page cache rather than on the heap and
+    is reopened without parsing anything.
+    """
+
+    def __init__(self, path: Path, capacity: int):
+        self.path = path
+        if path.exists() and path.stat().st_size >= HEADER_SIZE:
+            with path.open('r+b') as f:
+                self._buf = mmap.mmap(f.fileno(), 0)
+            if self._buf[:8] != MAGIC:
+                raise ValueError(f"{path} is not a dedup table")
+            self.capacity = int.from_bytes(self._buf[8:16], 'little')
+            self.count = int.from_bytes(self._buf[16:24], 'little')
+        else:
+            self.capacity = capacity
+            self.count = 0
+            with path.open('w+b') as f:
+                f.truncate(HEADER_SIZE + capacity * KEY_SIZE)
+                self._buf = mmap.mmap(f.fileno(), 0)
+            self._buf[:16] = MAGIC + capacity.to_bytes(8, 'little')
+        self._mask = self.capacity - 1
+        self._shift = 64 - (self.capacity.bit_length() - 1)
+
+    def _slot(self, key: bytes) -> int:
+        """
+        Home slot of `key`: the halves folded together, times an odd constant,
+        top bits. Every key bit reaches them, so ids that share a prefix
+        (time-ordered UUIDv7s, ULIDs) or only differ at the end still spread.
+        """
+        k = int.from_bytes(key, 'little')
+        return (((k ^ (k >> 64)) * SLOT_MULTIPLIER) & MASK64) >> self._shift
+
+    def _find(self, key: bytes) -> int:
+        """Offset of `key`'s slot, or of the empty slot where it would go."""
+        buf = self._buf
+        slot = self._slot(key)
+        while True:
+            off = HEADER_SIZE + slot * KEY_SIZE
+            current = buf[off:off + KEY_SIZE]
+            if current == key or not any(current):
+                return off
+            slot = (slot + 1) & self._mask
+
+    def __contains__(self, key: bytes) -> bool:
+        off = self._find(key)
+        return self._buf[off:off + KEY_SIZE] == key
+
+    def add(self, key: bytes) -> bool:
+        off = self._find(key)
+        if self._buf[off:off + KEY_SIZE] == key:
+            return False
+        self._buf[off:off + KEY_SIZE] = key
+        self.count += 1
+        self._buf[16:24] = self.count.to_bytes(8, 'little')
+        return True
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity * MAX_LOAD
+
+    def keys(self) -> Iterable[bytes]:
+        buf = self._buf
+        for off in range(HEADER_SIZE, HEADER_SIZE + self.capacity * KEY_SIZE, KEY_SIZE):
+            key = buf[off:off + KEY_SIZE]
+            if any(key):
+                yield key
+
+    def flush(self):
+        self._buf.flush()
+
+    def close(self):
+        self._buf.close()
+
+
+class DedupIndex:
+    """
+    Persistent idempotency index of event ids, stored next to the log in
+    generation files `gen-<n>.tbl` plus a `dedup.json` checkpoint recording
+    the log position the flushed tables cover.
+
+    With `window=None` a single generation grows as needed and every id is
+    remembered. With a window, a generation is retired once it holds `window`
+    ids and only the previous generation is kept, so at least the last
+    `window` (and at most 2x `window`) ids are remembered in bounded memory.
+    """
+
+    def __init__(self, path: str, window: Optional[int] = None):
+        self.path = Path(path)
+        self.window = window
+        self.position = 0
+        self.generations: List[KeyTable] = []
+        # Layout changes since the last checkpoint; retired files are only
+        # deleted once a checkpoint no longer references them
+        self.layout_changed = False
+        self._retired: List[KeyTable] = []
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        checkpoint = self.path / CHECKPOINT_NAME
+        state = json.loads(checkpoint.read_text()) if checkpoint.exists() else None
+        if state is None or state.get('version') != CHECKPOINT_VERSION or state.get('window') != self.window:
+            self._reset()
+            return
+        files = [self.path / name for name in state['generations']]
+        try:
+            if not all(f.exists() for f in files):
+                raise ValueError("missing generation file")
+            self.generations = [KeyTable(f, MIN_CAPACITY) for f in files]
+        except (OSError, ValueError):
+            logger.warning("Dedup tables in %s are unreadable, rebuilding", self.path)
+            self._reset()
+            return
+        self.position = state['position']
+
+    def _reset(self):
+        for table in self.generations:
+            table.close()
+        for file in self.path.glob('gen-*.tbl'):
+            file.unlink()
+        (self.path / CHECKPOINT_NAME).unlink(missing_ok=True)
+        self.position = 0
+        self.generations = [self._new_table(0)]
+
+    def _new_table(self, gen: int, entries: int = 0) -> KeyTable:
+        size = self.window if self.window is not None else entries
+        return KeyTable(self.path / f"gen-{gen:08d}.tbl", _capacity_for(max(size, 1)))
+
+    def _gen_number(self, table: KeyTable) -> int:
+        return int(table.path.stem.split('-')[1])
+
+    def __contains__(self, event_id: str) -> bool:
+        key = event_key(event_id)
+        return any(key in table for table in reversed(self.generations))
+
+    def add(self, event_id: str) -> bool:
+        if event_id in self:
+            return False
+        current = self.generations[-1]
+        if self.window is not None and current.count >= self.window:
+            current = self._rotate()
+        elif current.full:
+            current = self._grow()
+        return current.add(event_key(event_id))
+
+    def __len__(self) -> int:
+        return sum(table.count for table in self.generations)
+
+    def sync(self):
+        """
+        Takes in what other processes sharing the tables have changed: their
+        adds are already in the shared mmaps, but not in each table's cached
+        count, and a table they rotated or grew is only in the checkpoint
+        (which a shared writer rewrites before releasing its commit lock).
+        """
+        checkpoint = self.path / CHECKPOINT_NAME
+        state = json.loads(checkpoint.read_text()) if checkpoint.exists() else None
+        if state is not None and state['generations'] != [table.path.name for table in self.generations]:
+            current = {table.path.name: table for table in self.generations}
+            self.generations = [current.pop(name, None) or KeyTable(self.path / name, MIN_CAPACITY)
+                                for name in state['generations']]
+            for table in current.values():
+                table.close()
+            self.position = state['position']
+        for table in self.generations:
+            table.count = int.from_bytes(table._buf[16:24], 'little')
+
+    def _rotate(self) -> KeyTable:
+        fresh = self._new_table(self._gen_number(self.generations[-1]) + 1)
+        self.generations.append(fresh)
+        while len(self.generations) > 2:
+            self._retired.append(self.generations.pop(0))
+        self.layout_changed = True
+        return fresh
+
+    def _grow(self) -> KeyTable:
+        old = self.generations[-1]
+        bigger = self._new_table(self._gen_number(old) + 1, entries=old.count * 2)
+        for key in old.keys():
+            bigger.add(key)
+        self.generations[-1] = bigger
+        self._retired.append(old)
+        self.layout_changed = True
+        return bigger
+
+    def checkpoint(self, position: int):
+        """Flush the tables and record that they cover the log up to `position`."""
+        for table in self.generations:
+            table.flush()
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'window': self.window,
+            'position': position,
+            'generations': [table.path.name for table in self.generations],
+        }
+        write_atomic(self.path / CHECKPOINT_NAME, json.dumps(state).encode())
+        self.position = position
+        self.layout_changed = False
+        for table in self._retired:
+            table.close()
+            table.path.unlink(missing_ok=True)
+        self._retired = []
+
+    def close(self):
+        for table in self.generations + self._retired:
+            table.close()
@@ -0,0 +1,176 @@
+import heapq
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Callable
+from src.event_store import EventStore, MAX_BATCH_RECORDS
+from src.locker_index import to_micros
+from src.models import EventType, ReservationStatusEnum
+
+# Expiry event ids are uuid5(EXPIRY_NAMESPACE, "<reservation_id>@<deadline>"):
+# the same deadline always expires with the same id, so the store's dedup
+# index turns a second firing (after a restart, or a race) into a duplicate,
+# while a reservation id reused later (with a new deadline) can expire again
+EXPIRY_NAMESPACE = uuid.UUID('5f0c2a8e-7d4b-4f1e-9a63-0b9d3c6e21a4')
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_event_id(reservation_id: str, deadline: int) -> str:
+    return str(uuid.uuid5(EXPIRY_NAMESPACE, f"{reservation_id}@{deadline}"))
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def payload_deadline(expires_at: Any) -> Optional[int]:
+    """Epoch micros of a payload's `expires_at`, or None unless it is an ISO-8601 string."""
+    if not isinstance(expires_at, str):
+        return None
+    try:
+        return to_micros(expires_at)
+    except ValueError:
+        return None
+
+
+class ExpiryScheduler:
+    """
+    Pending reservation deadlines as a calendar queue: one bucket of
+    reservation ids per second plus a heap of the bucket keys, so a pending
+    timer costs one list slot and the heap holds one entry per distinct
+    second rather than per reservation.
+
+    The projection owns the deadlines (`Reservation.deadline`) and calls
+    `schedule` from `apply`, so timers are rebuilt by replaying the log.
+    Cancelling is lazy: a popped id is only due if its reservation is still
+    active and its current deadline has passed.
+
+    A deadline is the event's `payload.expires_at` if it is an ISO-8601
+    time, otherwise its `occurred_at` plus the TTL for the state it enters
+    (`reservation_ttl` after ReservationCreated, `pickup_ttl` after
+    ParcelDeposited). With no TTL for a state, reservations in it do not
+    expire on their own. Any other `expires_at` is ignored rather than
+    rejected: it is already in the log, and `apply` must not fail on replay.
+    """
+
+    def __init__(self, reservation_ttl: Optional[float] = None, pickup_ttl: Optional[float] = None):
+        self.ttls = {
+            ReservationStatusEnum.CREATED: reservation_ttl,
+            ReservationStatusEnum.DEPOSITED: pickup_ttl,
+        }
+        self._buckets: Dict[int, List[str]] = {}
+        self._heap: List[int] = []
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def deadline_for(self, event: Dict[str, Any], status: ReservationStatusEnum) -> Optional[int]:
+        deadline = payload_deadline(event['payload'].get('expires_at'))
+        if deadline is not None:
+            return deadline
+        ttl = self.ttls.get(status)
+        if ttl is None:
+            return None
+        return to_micros(event['occurred_at']) + int(ttl * 1_000_000)
+
+    def schedule(self, reservation_id: str, deadline: int):
+        second = -(-deadline // 1_000_000)  # due once the whole second has started
+        with self._lock:
+            bucket = self._buckets.get(second)
+            if bucket is None:
+                bucket = self._buckets[second] = []
+                heapq.heappush(self._heap, second)
+            bucket.append(reservation_id)
+            self._pending += 1
+
+    def pop_due(self, now: int) -> List[str]:
+        """Reservation ids whose bucket is due at `now` (epoch micros), oldest first."""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0] * 1_000_000 <= now:
+                due.extend(self._buckets.pop(heapq.heappop(self._heap)))
+            self._pending -= len(due)
+        return due
+
+    def next_due(self) -> Optional[int]:
+        with self._lock:
+            return self._heap[0] * 1_000_000 if self._heap else None
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._heap.clear()
+            self._pending = 0
+
+
+class ExpiryEngine:
+    """
+    Fires due reservations as `ReservationExpired` events through
+    `EventStore.append_many`. The event's occurred_at is the deadline, not
+    the time it fired, so the log is the same however late the engine runs.
+    A pickup can still be logged between the check here and the append; the
+    projection then rejects the expiry, as it does for any settled
+    reservation. Start it once the projection has caught up with the log.
+    """
+
+    def __init__(self, projection, store: EventStore, scheduler: ExpiryScheduler,
+                 clock: Callable[[], float] = time.time, max_sleep: float = 1.0):
+        self.projection = projection
+        self.store = store
+        self.scheduler = scheduler
+        self.clock = clock
+        self.max_sleep = max_sleep
+        self.fired = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, now: Optional[int] = None) -> int:
+        """Appends expiries for everything due at `now` (epoch micros); returns how many were new."""
+        if now is None:
+            now = int(self.clock() * 1_000_000)
+        events = []
+        for rid in self.scheduler.pop_due(now):
+            res = self.projection.reservations.get(rid)
+            if res is None or res.deadline is None:
+                continue  # settled or no longer timed
+            if res.deadline > now:
+                continue  # rescheduled, its later bucket will fire it
+            events.append({
+                "event_id": expiry_event_id(rid, res.deadline),
+                "occurred_at": from_micros(res.deadline).isoformat(),
+                "locker_id": res.locker_id,
+                "type": EventType.RESERVATION_EXPIRED.value,
+                "payload": {"reservation_id": rid},
+            })
+        fired = 0
+        for start in range(0, len(events), MAX_BATCH_RECORDS):
+            fired += sum(self.store.append_many(events[start:start + MAX_BATCH_RECORDS]))
+        self.fired += fired
+        return fired
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='expiry-engine', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Expiry run failed")
+            next_due = self.scheduler.next_due()
+            wait = self.max_sleep
+            if next_due is not None:
+                wait = min(wait, max(0.0, next_due / 1_000_000 - self.clock()))
+            self._stop.wait(wait)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Set, Deque, AsyncIterator
+from src.models import EventType
+from src.projection import Projection, ApplyOutcome
+
+# Deltas kept for resuming subscribers
+DEFAULT_HISTORY = 10_000
+# Deltas a subscriber may fall behind by before it is dropped
+DEFAULT_BUFFER = 1_000
+HEARTBEAT_SECONDS = 15.0
+
+
+class Subscription:
+    """
+    One subscriber's bounded buffer. Filled by the publishing (apply) thread
+    and drained by the subscriber's event loop; when it would overflow the
+    subscription is marked dropped instead of blocking the publisher.
+    """
+
+    def __init__(self, lockers: Optional[Set[str]], max_buffer: int, loop: asyncio.AbstractEventLoop):
+        self.lockers = lockers
+        self.max_buffer = max_buffer
+        self.buffer: Deque[Dict[str, Any]] = deque()
+        self.dropped = False
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def wants(self, locker_id: str) -> bool:
+        return self.lockers is None or locker_id in self.lockers
+
+    def offer(self, delta: Dict[str, Any]) -> bool:
+        """Called with the feed lock held; False once the subscriber is gone."""
+        if len(self.buffer) >= self.max_buffer:
+            self.dropped = True
+            self._wake()
+            return False
+        was_empty = not self.buffer
+        self.buffer.append(delta)
+        # The consumer drains everything per wakeup, so only wake it once
+        return self._wake() if was_empty else True
+
+    def _wake(self) -> bool:
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            return False  # event loop closed, the client is gone
+        return True
+
+    async def next_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        if not self.buffer and not self.dropped:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        batch = []
+        while self.buffer:
+            batch.append(self.buffer.popleft())
+        return batch
+
+
+class ChangeFeed:
+    """
+    Stream of compact projection deltas, one per applied event, carrying the
+    post-event locker summary and the compartment / reservation it touched.
+    Deltas hold absolute values, so receiving one twice is harmless.
+
+    Each delta's `position` is the log sequence number of its event. A
+    subscriber resuming `after` a position is sent the deltas after it from
+    the recent history; if that history no longer reaches back far enough it
+    is first sent a `reset`: the current summary of every locker it follows.
+    """
+
+    def __init__(self, projection: Projection, history: int = DEFAULT_HISTORY, max_buffer: int = DEFAULT_BUFFER):
+        self.projection = projection
+        self.max_buffer = max_buffer
+        self.history: Deque[Dict[str, Any]] = deque()
+        self.history_size = history
+        self.last_position: Optional[int] = None
+        # Highest position whose delta is no longer in `history`
+        self._floor: Optional[int] = None
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def _locker_state(self, locker_id: str) -> Dict[str, Any]:
+        locker = self.projection.lockers[locker_id]
+        return {
+            "compartments": len(locker.compartments),
+            "active_reservations": len(locker.active_reservations),
+            "degraded_compartments": len(locker.degraded_compartments),
+            "state_hash": locker.state_hash,
+        }
+
+    def delta(self, seq: int, event: Dict[str, Any]) -> Dict[str, Any]:
+        projection = self.projection
+        payload = event['payload']
+        etype = EventType(event['type'])
+        delta = {
+            "kind": "delta",
+            "position": seq,
+            "event_type": etype.value,
+            "locker_id": event['locker_id'],
+            "locker": self._locker_state(event['locker_id']),
+        }
+        rid = payload.get('reservation_id')
+        cid = payload.get('compartment_id')
+        if rid is not None:
+            res = projection.reservation_status(rid)
+            if res is not None:
+                delta["reservation"] = {"reservation_id": rid, "status": res.status.value}
+                if cid is None and rid in projection.reservations:
+                    cid = projection.reservations[rid].compartment_id
+                elif cid is None:
+                    cid = projection.cold.get_reservation(rid)[1]
+        if cid is not None:
+            comp = projection.compartments.get(cid)
+            if comp is not None:
+                delta["compartment"] = {
+                    "compartment_id": cid,
+                    "degraded": comp.degraded,
+                    "active_reservation": comp.active_reservation,
+                }
+        return delta
+
+    def publish(self, seq: int, event: Dict[str, Any], outcome: ApplyOutcome):
+        """Called on the apply thread after `Projection.apply` returned `outcome`."""
+        with self._lock:
+            if self._floor is None:
+                self._floor = seq - 1
+            self.last_position = seq
+            if outcome != ApplyOutcome.APPLIED:
+                return
+            delta = self.delta(seq, event)
+            self.history.append(delta)
+            if len(self.history) > self.history_size:
+                self._floor = self.history.popleft()["position"]
+            if self._subscribers:
+                self._subscribers = [
+                    sub for sub in self._subscribers
+                    if not sub.wants(delta["locker_id"]) or sub.offer(delta)
+                ]
+
+    def subscribe(self, lockers: Optional[Set[str]] = None, after: Optional[int] = None,
+                  loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        """Live deltas for `lockers` (None: all), preceded by everything after position `after`."""
+        sub = Subscription(lockers, self.max_buffer, loop or asyncio.get_running_loop())
+        with self._lock:
+            if after is not None:
+                floor = self._floor if self._floor is not None else self.projection.position - 1
+                if after >= floor:
+                    sub.buffer.extend(d for d in self.history if d["position"] > after and sub.wants(d["locker_id"]))
+                else:
+                    sub.buffer.extend(self._reset(lockers))
+            self._subscribers.append(sub)
+        return sub
+
+    def _reset(self, lockers: Optional[Set[str]]) -> List[Dict[str, Any]]:
+        position = self.last_position if self.last_position is not None else self.projection.position - 1
+        locker_ids = self.projection.lockers.keys() if lockers is None else lockers
+        return [
+            {"kind": "reset", "position": position, "locker_id": lid, "locker": self._locker_state(lid)}
+            for lid in locker_ids if lid in self.projection.lockers
+        ]
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+def format_sse(delta: Dict[str, Any]) -> str:
+    return f"id: {delta['position']}\nevent: {delta['kind']}\ndata: {json.dumps(delta)}\n\n"
+
+
+async def sse_stream(feed: ChangeFeed, sub: Subscription, heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+    """Server-sent events for `sub`; ends with a `dropped` event if the subscriber fell too far behind."""
+    try:
+        while True:
+            batch = await sub.next_batch(heartbeat)
+            if batch:
+                yield ''.join(format_sse(delta) for delta in batch)
+            elif not sub.dropped:
+                yield ": keepalive\n\n"
+            if sub.dropped and not sub.buffer:
+                yield f"event: dropped\ndata: {json.dumps({'detail': 'Subscriber fell behind, resume with Last-Event-ID'})}\n\n"
+                return
+    finally:
+        feed.unsubscribe(sub)
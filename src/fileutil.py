@@ -0,0 +1,11 @@
+import os
+from pathlib import Path
+
+def write_atomic(path: Path, data: bytes):
+    # Per process, as writers sharing a log may save the same file at once
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open('wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,28 @@
+"""Event builders shared by the test modules."""
+from datetime import datetime, timedelta, timezone
+
+# Events occur at 10:00 on this day unless a test says otherwise
+T0 = datetime(2026, 2, 21, 10, tzinfo=timezone.utc)
+
+
+def make_event(eid, etype, payload, locker_id="lockerA", minute=0, occurred_at=None, start=T0):
+    """An event as a client sends it, occurring `minute` minutes after `start` unless `occurred_at` is given."""
+    if occurred_at is None:
+        occurred_at = (start + timedelta(minutes=minute)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {
+        "event_id": eid,
+        "occurred_at": occurred_at,
+        "locker_id": locker_id,
+        "type": etype,
+        "payload": payload
+    }
+
+
+def event_maker(locker_id="lockerA", start=T0):
+    """
+    `make_event` with a module's own default locker (the API tests share one
+    app and projection, so each module keeps to its lockers) or start time.
+    """
+    def make(eid, etype, payload, locker_id=locker_id, minute=0, occurred_at=None):
+        return make_event(eid, etype, payload, locker_id, minute, occurred_at, start)
+    return make
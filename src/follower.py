@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from typing import Optional, List, Callable, Dict, Any
+from src.event_store import EventStore
+from src.projection import Projection, ApplyOutcome
+from src.snapshot import SnapshotStore, load_start
+
+# Seconds between looks at the writer's log
+DEFAULT_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+class Follower:
+    """
+    A read replica's projection, kept up with a writer's log directory (on
+    this box or a shared volume) through a read-only `EventStore`. Every
+    `interval` the store is refreshed and the records the writer has made
+    durable since are applied in log order, so the replica's state is always
+    the writer's as of some log position, versions (ETags) included.
+
+    Polling rather than inotify: it needs nothing outside the standard
+    library and sees writes made by another host to a shared volume. The
+    replica resumes from its own snapshots (`snapshots`), or the writer's
+    (`sources`) when those are further on, and restarts from them if the
+    writer compacts past it or the log is replaced.
+
+    `lag_records` is how far the replica is behind the log as of its last
+    look; `lag_seconds` how long ago it last held everything logged.
+    """
+
+    def __init__(self, store: EventStore, projection: Projection, snapshots: Optional[SnapshotStore] = None,
+                 sources: Optional[List[SnapshotStore]] = None, interval: float = DEFAULT_INTERVAL,
+                 on_applied: Optional[Callable[[int, Dict[str, Any], ApplyOutcome], None]] = None):
+        if not store.read_only:
+            raise ValueError("A follower tails a read-only EventStore")
+        self.store = store
+        self.projection = projection
+        self.snapshots = snapshots
+        self.sources = sources or []
+        self.interval = interval
+        self.on_applied = on_applied
+        self.restores = 0
+        self._caught_up_at = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def lag_records(self) -> int:
+        return max(0, self.store.next_seq - self.projection.position)
+
+    @property
+    def lag_seconds(self) -> float:
+        return time.monotonic() - self._caught_up_at
+
+    def restore(self) -> int:
+        """Loads the furthest snapshot (the replica's, the writer's, or the log's base); returns its position."""
+        store = self.store
+        states = [load_start(store, snapshots, store.next_seq) for snapshots in [self.snapshots, *self.sources]]
+        state = max((s for s in states if s is not None), key=lambda s: s['position'], default=None)
+        if state is None:
+            self.projection.clear()
+        else:
+            self.projection.restore_state(state)
+        self.restores += 1
+        return self.projection.position
+
+    def poll(self) -> int:
+        """Applies what the writer has logged since the last poll; returns the number of records."""
+        looked_at = time.monotonic()
+        store = self.store
+        end = store.refresh()
+        projection = self.projection
+        if projection.position < store.start_seq or projection.position > end:
+            logger.warning("Log moved from under the replica (at %d, log %d-%d), restoring",
+                           projection.position, store.start_seq, end)
+            self.restore()
+        start = projection.position
+        on_applied = self.on_applied
+        for seq, event in store.iter_records(start, end):
+            outcome = projection.apply(event, seq)
+            if on_applied is not None:
+                on_applied(seq, event, outcome)
+        # Logged events are already unique, as for a projection sharing the writer's DedupIndex
+        projection.applied_event_ids.clear()
+        self._caught_up_at = looked_at
+        return projection.position - start
+
+    def start(self) -> int:
+        """Restores, catches up with the log and starts tailing it; returns the number of records replayed."""
+        self.store.refresh()
+        start = self.restore()
+        self.poll()
+        self._thread = threading.Thread(target=self._run, name='follower', daemon=True)
+        self._thread.start()
+        return self.projection.position - start
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Follower failed to apply the log tail")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
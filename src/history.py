@@ -0,0 +1,284 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, NamedTuple, Union
+from src.cold_store import ColdStore
+from src.event_store import EventStore
+from src.locker_index import to_micros
+from src.projection import Projection, TERMINAL_STATUSES
+from src.models import ReservationStatusEnum
+from src.snapshot import load_base
+
+# A locker's replay state is checkpointed every this many of its records
+CHECKPOINT_EVERY = 256
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    locker_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    max_micros INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (locker_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS checkpoints_by_time ON checkpoints (locker_id, max_micros, seq);
+CREATE TABLE IF NOT EXISTS settled (
+    reservation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    compartment_id TEXT NOT NULL,
+    locker_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (reservation_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryCompacted(Exception):
+    """The requested point lies before the log's start and no checkpoint covers it."""
+
+
+class Checkpoint(NamedTuple):
+    seq: int  # the locker's records before this log position are applied
+    max_micros: int  # latest occurred_at among them
+    state: Dict[str, Any]  # the locker's rows, in the snapshot layout
+
+
+class HistoryStore:
+    """
+    Per-locker checkpoints for point-in-time reads, in SQLite. A checkpoint
+    holds one locker's live rows (locker, compartments, active reservations,
+    open faults); reservations it settled since the previous checkpoint go
+    to `settled`, keyed by the checkpoint position, since expiring a settled
+    reservation and reading its status still need them. Like the cold store
+    it is derived data without a journal: an unreadable file is started over.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self._lock = threading.Lock()
+        try:
+            self._conn = self._open(path)
+        except sqlite3.DatabaseError:
+            logger.warning("History store %s is unreadable, starting over", path)
+            with open(path, 'wb'):
+                pass
+            self._conn = self._open(path)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(HISTORY_SCHEMA)
+        return conn
+
+    def put(self, locker_id: str, checkpoint: Checkpoint, settled: List[Tuple[str, str, str, str, int]]):
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            conn.execute("INSERT OR IGNORE INTO checkpoints VALUES (?, ?, ?, ?)",
+                         (locker_id, checkpoint.seq, checkpoint.max_micros,
+                          json.dumps(checkpoint.state, separators=(',', ':'))))
+            conn.executemany("INSERT OR REPLACE INTO settled VALUES (?, ?, ?, ?, ?, ?)",
+                             [(rid, checkpoint.seq, cid, lid, status, version)
+                              for rid, cid, lid, status, version in settled])
+            conn.execute("COMMIT")
+
+    def latest(self, locker_id: str) -> Optional[Checkpoint]:
+        return self._one("SELECT seq, max_micros, state FROM checkpoints WHERE locker_id = ? "
+                         "ORDER BY seq DESC LIMIT 1", (locker_id,))
+
+    def before(self, locker_id: str, seq: Optional[int] = None, micros: Optional[int] = None) -> Optional[Checkpoint]:
+        """Newest checkpoint at or before log position `seq`, or holding nothing after `micros`."""
+        if micros is not None:
+            return self._one("SELECT seq, max_micros, state FROM checkpoints WHERE locker_id = ? AND max_micros <= ? "
+                             "ORDER BY max_micros DESC, seq DESC LIMIT 1", (locker_id, micros))
+        return self._one("SELECT seq, max_micros, state FROM checkpoints WHERE locker_id = ? AND seq <= ? "
+                         "ORDER BY seq DESC LIMIT 1", (locker_id, seq))
+
+    def _one(self, sql: str, args) -> Optional[Checkpoint]:
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return None if row is None else Checkpoint(row[0], row[1], json.loads(row[2]))
+
+    def settled_reservation(self, reservation_id: str, max_seq: int) -> Optional[Tuple[str, str, str, str, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reservation_id, compartment_id, locker_id, status, version FROM settled "
+                "WHERE reservation_id = ? AND seq <= ? ORDER BY seq DESC LIMIT 1", (reservation_id, max_seq),
+            ).fetchone()
+        return row
+
+    def position(self) -> int:
+        """Log position of the newest checkpoint of any locker."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM checkpoints").fetchone()
+        return 0 if row[0] is None else row[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM checkpoints; DELETE FROM settled; DELETE FROM meta;")
+
+    def seeded_at(self) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'seeded_at'").fetchone()
+        return None if row is None else row[0]
+
+    def seed(self, state: Dict[str, Any], max_micros: int):
+        """A checkpoint per locker of a full projection state (a compaction base), kept where one exists."""
+        seq = state['position']
+        for locker_id, (rows, settled) in split_by_locker(state).items():
+            self.put(locker_id, Checkpoint(seq, max_micros, rows), settled)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('seeded_at', ?)", (seq,))
+
+    def close(self):
+        self._conn.close()
+
+
+def split_by_locker(state: Dict[str, Any]) -> Dict[str, Tuple[Dict[str, Any], List[Tuple]]]:
+    """Each locker's live rows of a snapshot state, and its settled reservations."""
+    out: Dict[str, Tuple[Dict[str, Any], List[Tuple]]] = {}
+
+    def of(locker_id):
+        entry = out.get(locker_id)
+        if entry is None:
+            entry = out[locker_id] = ({'lockers': [], 'compartments': [], 'reservations': [], 'faults': []}, [])
+        return entry
+
+    owner = {}
+    for row in state['lockers']:
+        of(row[0])[0]['lockers'].append(row)
+    for row in state['compartments']:
+        owner[row[0]] = row[1]
+        of(row[1])[0]['compartments'].append(row)
+    for rid, cid, locker_id, status, *extra in state['reservations']:
+        if ReservationStatusEnum(status) in TERMINAL_STATUSES:
+            of(locker_id)[1].append((rid, cid, locker_id, status, extra[1] if len(extra) > 1 else 0))
+        else:
+            of(locker_id)[0]['reservations'].append([rid, cid, locker_id, status, *extra])
+    for row in state['faults']:
+        # Faults on unregistered compartments have no locker to go with
+        if not row[3] and row[1] in owner:
+            of(owner[row[1]])[0]['faults'].append(row)
+    return out
+
+
+class HistoryColdStore(ColdStore):
+    """A replay's cold store: what it settled itself, else the history as of `horizon`."""
+
+    def __init__(self, history: HistoryStore, horizon: int):
+        super().__init__()
+        self.history = history
+        self.horizon = horizon
+
+    def get_reservation(self, reservation_id: str) -> Optional[Tuple[str, str, str, str, int]]:
+        row = super().get_reservation(reservation_id)
+        if row is None:
+            row = self.history.settled_reservation(reservation_id, self.horizon)
+        return row
+
+
+class TimeTravel:
+    """
+    Point-in-time reads of one locker, off the live projection: `at`
+    restores the locker's nearest checkpoint into a scratch projection and
+    replays only that locker's records after it, read through the
+    per-locker index. `as_of` is a log sequence number (the state once that
+    record is applied) or an occurred_at time (every record of the locker
+    that occurred by then, in log order).
+
+    Checkpoints are made as a side effect: every read first extends the
+    locker's checkpoints to the log head, so the first read of a locker
+    replays its whole history once and later reads replay at most
+    `every` records (plus any logged late with an earlier occurred_at). On
+    a compacted log, lockers start from the compaction base. The replay
+    sees only the locker's own records, so references to other lockers'
+    compartments or reservations are not resolved (as with sharding).
+    """
+
+    def __init__(self, store: EventStore, history: HistoryStore, every: int = CHECKPOINT_EVERY):
+        self.store = store
+        self.history = history
+        self.every = every
+        self._lock = threading.Lock()
+        if history.position() > store.next_seq:
+            # History is ahead of the log (log replaced or truncated), start over
+            logger.warning("History store is ahead of the log, starting over")
+            history.clear()
+
+    def _scratch(self, checkpoint: Optional[Checkpoint], start: int) -> Projection:
+        projection = Projection(dedup=self.store.dedup, cold=HistoryColdStore(self.history, start))
+        if checkpoint is not None:
+            projection.restore_state(dict(checkpoint.state, position=start, applied_event_ids=[]))
+        projection.position = start
+        return projection
+
+    def _seed(self):
+        start = self.store.start_seq
+        if self.history.seeded_at() == start:
+            return
+        base = load_base(self.store)
+        first = next(self.store.iter_records(start, start + 1), None)
+        # Records dropped from the log are taken to have occurred before the first one kept
+        self.history.seed(base, to_micros(first[1]['occurred_at']) if first else 0)
+
+    def catch_up(self, locker_id: str):
+        """Extends the locker's checkpoints up to the log head."""
+        with self._lock:
+            store = self.store
+            latest = self.history.latest(locker_id)
+            if store.start_seq and (latest is None or latest.seq < store.start_seq):
+                self._seed()
+                latest = self.history.latest(locker_id)
+            start = max(latest.seq if latest is not None else 0, store.start_seq)
+            projection = self._scratch(latest, start)
+            max_micros = latest.max_micros if latest is not None else 0
+            applied = 0
+            for seq, event in store.iter_by_locker(locker_id, start):
+                projection.apply(event, seq)
+                max_micros = max(max_micros, to_micros(event['occurred_at']))
+                applied += 1
+                if applied % self.every == 0:
+                    self._checkpoint(locker_id, projection, seq + 1, max_micros)
+
+    def _checkpoint(self, locker_id: str, projection: Projection, seq: int, max_micros: int):
+        state = projection.snapshot_state()
+        rows = {
+            'lockers': state['lockers'],
+            'compartments': state['compartments'],
+            'reservations': [r for r in state['reservations'] if ReservationStatusEnum(r[3]) not in TERMINAL_STATUSES],
+            'faults': [f for f in state['faults'] if not f[3]],
+        }
+        cold = projection.cold
+        self.history.put(locker_id, Checkpoint(seq, max_micros, rows), cold.reservations())
+        # Settled rows are now in the history, later lookups find them there
+        cold.clear()
+        cold.horizon = seq
+
+    def at(self, locker_id: str, as_of: Union[int, datetime, str]) -> Projection:
+        """A projection holding the locker as of `as_of`; raises HistoryCompacted if that is no longer known."""
+        self.catch_up(locker_id)
+        store = self.store
+        if isinstance(as_of, int):
+            end, until = as_of + 1, None
+            checkpoint = self.history.before(locker_id, seq=end)
+        else:
+            end, until = None, to_micros(as_of) + 1
+            checkpoint = self.history.before(locker_id, micros=until - 1)
+        if checkpoint is None:
+            if store.start_seq and self.history.before(locker_id, seq=store.start_seq) is not None:
+                raise HistoryCompacted(f"History of {locker_id} before log position {store.start_seq} is compacted")
+            start = store.start_seq
+        else:
+            start = checkpoint.seq
+            # Only a checkpoint exactly at the point answers without replaying dropped records
+            if start < store.start_seq and start != end:
+                raise HistoryCompacted(f"History of {locker_id} before log position {store.start_seq} is compacted")
+        projection = self._scratch(checkpoint, start)
+        projection.replay(store.iter_by_locker(locker_id, start, end, until=until))
+        return projection
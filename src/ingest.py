@@ -0,0 +1,138 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, List, Deque, Tuple, Optional
+from src.event_store import EventStore, MAX_BATCH_RECORDS
+from src.metrics import Metrics
+
+DEFAULT_CAPACITY = 10_000
+# Smoothing factor of the wait/service time moving averages
+EWMA_ALPHA = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Ingest queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class IngestStats:
+    def __init__(self):
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected_full = 0
+        self.batches = 0
+        self.wait_avg = 0.0
+        self.wait_max = 0.0
+        self.service_avg = 0.0
+        self.service_max = 0.0
+
+    def record(self, waits: List[float], service: float, appended: List[bool]):
+        self.batches += 1
+        accepted = sum(appended)
+        self.accepted += accepted
+        self.duplicates += len(appended) - accepted
+        for wait in waits:
+            self.wait_avg += EWMA_ALPHA * (wait - self.wait_avg)
+            self.wait_max = max(self.wait_max, wait)
+        # Every event in a batch is serviced by the same append
+        self.service_avg += EWMA_ALPHA * (service - self.service_avg)
+        self.service_max = max(self.service_max, service)
+
+
+class IngestPipeline:
+    """
+    Bounded ingest queue in front of the `EventStore`. Handlers submit
+    validated events and await the returned future; a single writer thread
+    drains the queue in arrival order and appends everything it picked up
+    with one `append_many` (one group commit). Projection updates follow from
+    the store's subscriber, in log order.
+
+    The queue is bounded in events, not submissions: a submission that does
+    not fit is refused with `IngestQueueFull` rather than blocking the
+    handler, so overload turns into 503 + Retry-After at the edge.
+    """
+
+    def __init__(self, store: EventStore, capacity: int = DEFAULT_CAPACITY, max_batch: int = MAX_BATCH_RECORDS,
+                 metrics: Optional[Metrics] = None):
+        self.store = store
+        self.metrics = metrics
+        self.capacity = capacity
+        self.max_batch = max_batch
+        self.stats = IngestStats()
+        self._items: Deque[Tuple[List[Dict[str, Any]], Future, float]] = deque()
+        self._depth = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        self._writer = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._writer.start()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        per_event = self.stats.service_avg / max(self.max_batch, 1)
+        return max(1, math.ceil(self._depth * per_event))
+
+    def submit(self, events: List[Dict[str, Any]]) -> Future:
+        """Queues `events` as one unit; the future resolves to `append_many`'s result."""
+        future: Future = Future()
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("Ingest pipeline is closed")
+            if self._depth + len(events) > self.capacity:
+                self.stats.rejected_full += len(events)
+                if self.metrics is not None:
+                    for event in events:
+                        self.metrics.events.inc(event['type'], 'queue_full')
+                raise IngestQueueFull(self.retry_after())
+            self._items.append((events, future, time.monotonic()))
+            self._depth += len(events)
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items and not self._closing:
+                    self._cond.wait()
+                if not self._items:
+                    return
+                taken = [self._items.popleft()]
+                count = len(taken[0][0])
+                while self._items and count + len(self._items[0][0]) <= self.max_batch:
+                    taken.append(self._items.popleft())
+                    count += len(taken[-1][0])
+                self._depth -= count
+            started = time.monotonic()
+            events = [event for item in taken for event in item[0]]
+            try:
+                appended = self.store.append_many(events)
+            except Exception as exc:
+                logger.exception("Ingest append failed")
+                for _, future, _ in taken:
+                    future.set_exception(exc)
+                continue
+            service = time.monotonic() - started
+            self.stats.record(
+                [started - enqueued for item_events, _, enqueued in taken for _ in item_events],
+                service,
+                appended,
+            )
+            offset = 0
+            for item_events, future, _ in taken:
+                future.set_result(appended[offset:offset + len(item_events)])
+                offset += len(item_events)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._writer.join()
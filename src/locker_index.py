@@ -0,0 +1,98 @@
+import struct
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Iterable, Any
+
+# seq, occurred_at (epoch micros), locker_id length, then the utf-8 locker_id
+ENTRY = struct.Struct('<QqH')
+
+
+def to_micros(value: Any) -> int:
+    """Epoch microseconds of an occurred_at value (datetime, ISO-8601 string, or already micros)."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def encode_entry(seq: int, micros: int, locker_id: str) -> bytes:
+    raw = locker_id.encode()
+    return ENTRY.pack(seq, micros, len(raw)) + raw
+
+
+class LockerIndex:
+    """
+    Secondary index of one log segment: locker_id -> the sequence numbers of
+    its records, with their occurred_at. Persisted as the segment's `.lidx`
+    sidecar (one entry per record, appended alongside the record) and kept in
+    memory as parallel arrays per locker, in log order.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lockers: Dict[str, Tuple[array, array]] = {}
+        self.count = 0
+
+    def add(self, seq: int, micros: int, locker_id: str):
+        entry = self.lockers.get(locker_id)
+        if entry is None:
+            entry = self.lockers[locker_id] = (array('Q'), array('q'))
+        entry[0].append(seq)
+        entry[1].append(micros)
+        self.count += 1
+
+    def load(self) -> bool:
+        """Reads the sidecar; False if it is missing."""
+        if not self.path.exists():
+            return False
+        raw = self.path.read_bytes()
+        pos, end = 0, len(raw)
+        unpack, size = ENTRY.unpack_from, ENTRY.size
+        by_raw: Dict[bytes, Tuple[array, array]] = {}  # skips decoding a locker id seen before
+        while pos + size <= end:
+            seq, micros, length = unpack(raw, pos)
+            pos += size
+            if pos + length > end:
+                break  # torn trailing entry
+            key = raw[pos:pos + length]
+            entry = by_raw.get(key)
+            if entry is None:
+                self.add(seq, micros, key.decode())
+                by_raw[key] = self.lockers[key.decode()]
+            else:
+                entry[0].append(seq)
+                entry[1].append(micros)
+                self.count += 1
+            pos += length
+        return True
+
+    def rebuild(self, entries: Iterable[Tuple[int, int, str]]) -> bytes:
+        """Re-derive the index from (seq, micros, locker_id) entries; returns the sidecar bytes."""
+        self.lockers.clear()
+        self.count = 0
+        out = []
+        for seq, micros, locker_id in entries:
+            self.add(seq, micros, locker_id)
+            out.append(encode_entry(seq, micros, locker_id))
+        return b''.join(out)
+
+    def lookup(self, locker_id: str, since: Optional[int] = None, until: Optional[int] = None,
+               before_seq: Optional[int] = None, start_seq: Optional[int] = None) -> List[int]:
+        entry = self.lockers.get(locker_id)
+        if entry is None:
+            return []
+        seqs, micros = entry
+        first = 0 if start_seq is None else bisect_left(seqs, start_seq)
+        stop = len(seqs) if before_seq is None else bisect_left(seqs, before_seq)
+        if since is None and until is None:
+            return list(seqs[first:stop])
+        return [
+            seqs[i] for i in range(first, stop)
+            if (since is None or micros[i] >= since) and (until is None or micros[i] < until)
+        ]
@@ -0,0 +1,94 @@
+"""
+Converts an event log between the JSONL and binary record formats.
+
+    python -m src.log_convert SRC DST --to {binary,jsonl} [--segment-bytes N]
+
+SRC is an event log directory (in either format) or a JSONL file with one
+event per line. DST is a new event log directory in the `--to` format or,
+with `--to jsonl` and a DST ending in `.jsonl`, a single JSONL file.
+
+Events keep their order and so their sequence numbers, and come back
+exactly as they were appended. When every record was copied (a JSONL file
+may repeat an event id, the store keeps the first) SRC's snapshots are
+copied along, since their positions still hold. A compacted log (one whose
+start is past 0) can't be converted: DST would renumber from 0 without its
+base state. Run it with the service stopped.
+"""
+import argparse
+import json
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Any, Iterator
+from src.event_store import EventStore, LOG_FORMATS, DEFAULT_SEGMENT_BYTES, MAX_BATCH_RECORDS, default_serializer
+
+
+def read_events(src: Path) -> Iterator[Dict[str, Any]]:
+    if src.is_dir():
+        store = EventStore(src, read_only=True)
+        try:
+            for _, event in store.iter_records():
+                yield event
+        finally:
+            store.close()
+        return
+    with src.open('rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def convert(src: Path, dst: Path, log_format: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES) -> Dict[str, Any]:
+    """Writes SRC's events to DST; returns the counts and DST's size in bytes."""
+    src, dst = Path(src), Path(dst)
+    if dst.exists() and (dst.is_file() or any(dst.iterdir())):
+        raise ValueError(f"{dst} already exists")
+    if src.is_dir():
+        source = EventStore(src, read_only=True)
+        source.close()
+        if source.start_seq:
+            raise ValueError(f"{src} is compacted")
+    read = 0
+    if log_format == 'jsonl' and dst.suffix == '.jsonl':
+        with dst.open('w') as f:
+            for event in read_events(src):
+                f.write(json.dumps(event, default=default_serializer) + '\n')
+                read += 1
+        return {"events": read, "records": read, "bytes": dst.stat().st_size}
+
+    store = EventStore(dst, segment_bytes=segment_bytes, durability='batch', log_format=log_format)
+    try:
+        chunk = []
+        for event in read_events(src):
+            chunk.append(event)
+            read += 1
+            if len(chunk) == MAX_BATCH_RECORDS:
+                store.append_many(chunk)
+                chunk = []
+        if chunk:
+            store.append_many(chunk)
+        records = store.next_seq
+        size = store.size_bytes
+    finally:
+        store.close()
+    if records == read and (src / 'snapshots').is_dir():
+        shutil.copytree(src / 'snapshots', dst / 'snapshots')
+    return {"events": read, "records": records, "bytes": size}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("src", type=Path, help="event log directory or JSONL file")
+    parser.add_argument("dst", type=Path, help="new event log directory, or a .jsonl file")
+    parser.add_argument("--to", choices=LOG_FORMATS, required=True, help="format of DST")
+    parser.add_argument("--segment-bytes", type=int, default=DEFAULT_SEGMENT_BYTES)
+    args = parser.parse_args(argv)
+    try:
+        result = convert(args.src, args.dst, args.to, args.segment_bytes)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
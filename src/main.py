@@ -3,7 +3,7 @@ from event_store import EventStore
 from projection import Projection
 
 def test_event_store_and_projection():
-    store = EventStore('events.jsonl')
+    store = EventStore('event_log')
     # Create events
     events = [
         Event(
@@ -39,13 +39,13 @@ def test_event_store_and_projection():
     for e in events:
         store.append(e.model_dump())
 
-    # Load all events
-    all_events = store.load_all()
-    print("All events:", all_events)
+    # Stream the log
+    for seq, event in store.iter_events():
+        print(seq, event)
 
     # Test projection
     proj = Projection()
-    proj.rebuild(all_events)
+    proj.replay(store.iter_events())
 
     # Locker summary
     summary = proj.locker_summary("locker1")
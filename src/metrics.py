@@ -0,0 +1,208 @@
+import threading
+from bisect import bisect_left
+from enum import Enum
+from typing import Dict, Any, List, Tuple, Callable, Optional, Sequence
+
+# Seconds; covers in-memory applies (microseconds) up to slow fsyncs
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label_value(value: Any) -> str:
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    parts = [f'{n}="{_label_value(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _PerThread:
+    """
+    Values kept in one shard per writing thread. Only the owning thread
+    writes a shard, so the hot path takes no lock; a scrape sums a copy of
+    every shard. Shards of finished threads are kept so totals never drop.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple, Any]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple, Any]:
+        shard = self._local.__dict__.get('shard')
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> List[Dict[Tuple, Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        return [dict(shard) for shard in shards]
+
+
+class Counter(_PerThread):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: int = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Tuple, int]:
+        totals: Dict[Tuple, int] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in sorted(self.values().items(), key=lambda kv: tuple(map(_label_value, kv[0])))
+        ]
+
+
+class Histogram(_PerThread):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Per-bucket (non-cumulative) counts, then +Inf, sum and count
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def values(self) -> Dict[Tuple, List]:
+        totals: Dict[Tuple, List] = {}
+        for shard in self._snapshot():
+            for labels, entry in shard.items():
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(entry)
+                else:
+                    totals[labels] = [a + b for a, b in zip(total, entry)]
+        return totals
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, entry in sorted(self.values().items(), key=lambda kv: tuple(map(_label_value, kv[0]))):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {entry[-1]}")
+        return lines
+
+
+class Gauge:
+    """A value computed at scrape time, or set explicitly."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.value: Any = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> List[str]:
+        value = self.fn() if self.fn is not None else self.value
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(v)}"
+            for labels, v in sorted(value.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              fn: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """
+    The service's metrics. Components take an optional `Metrics` and record
+    into it only when one is given, so library use pays nothing.
+    """
+
+    def __init__(self):
+        self.registry = Registry()
+        r = self.registry
+        self.events = r.counter(
+            'lockstream_events_total',
+            'Events by type and outcome (applied, duplicate, or the rejection reason)',
+            ('type', 'outcome'),
+        )
+        self.apply_seconds = r.histogram('lockstream_apply_seconds', 'Projection.apply latency', ('type',))
+        self.append_seconds = r.histogram('lockstream_append_seconds', 'EventStore append latency until durable')
+        self.fsync_seconds = r.histogram('lockstream_fsync_seconds', 'Time spent in fsync of the log head')
+        self.batch_records = r.histogram(
+            'lockstream_group_commit_records', 'Records per group commit',
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+        )
+        self.rebuild_seconds = r.gauge('lockstream_rebuild_seconds', 'Duration of the last startup restore / rebuild')
+        self.rebuild_events = r.gauge('lockstream_rebuild_events', 'Events replayed by the last startup restore / rebuild')
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Any], labelnames: Sequence[str] = ()) -> Gauge:
+        return self.registry.gauge(name, help, labelnames, fn)
+
+    def render(self) -> str:
+        return self.registry.render()
@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from enum import Enum
 from datetime import datetime
 from pydantic import BaseModel, Field
@@ -40,3 +40,50 @@ class ReservationStatusEnum(str, Enum):
 class ReservationStatus(BaseModel):
     reservation_id: str
     status: ReservationStatusEnum
+
+class BatchEventStatusEnum(str, Enum):
+    ACCEPTED = "accepted"
+    DUPLICATE = "duplicate"
+    REJECTED = "rejected"
+
+class BatchEventResult(BaseModel):
+    index: int
+    event_id: Optional[str]
+    status: BatchEventStatusEnum
+    detail: Optional[str] = None
+
+class BatchIngestResponse(BaseModel):
+    accepted: int
+    duplicates: int
+    rejected: int
+    results: List[BatchEventResult]
+
+class IngestStats(BaseModel):
+    queue_depth: int
+    queue_capacity: int
+    accepted: int
+    duplicates: int
+    rejected_queue_full: int
+    batches: int
+    wait_seconds_avg: float
+    wait_seconds_max: float
+    service_seconds_avg: float
+    service_seconds_max: float
+
+class LockerQuery(BaseModel):
+    locker_ids: List[str]
+
+class LockerQueryResponse(BaseModel):
+    lockers: List[LockerSummary]
+    not_found: List[str]
+
+class LockerPage(BaseModel):
+    items: List[LockerSummary]
+    next_cursor: Optional[str]
+
+class ReservationQuery(BaseModel):
+    reservation_ids: List[str]
+
+class ReservationQueryResponse(BaseModel):
+    reservations: List[ReservationStatus]
+    not_found: List[str]
@@ -1,158 +1,523 @@
 
-from typing import Dict, Optional, Set
+from typing import Dict, Optional, Set, Any, Iterable, List, Tuple
+from bisect import bisect_left, bisect_right, insort
 from dataclasses import dataclass, field
+from src.cold_store import ColdStore
+from src.dedup import DedupIndex
+from src.expiry import ExpiryScheduler
+from src.metrics import Metrics
 from src.models import LockerSummary, CompartmentStatus, ReservationStatus, ReservationStatusEnum, EventType
 import hashlib
+import time
+from enum import Enum
+from itertools import islice
 
-@dataclass
+# state_hash scheme v2: the sum mod 2^256 of sha256("<set name>\0<member>")
+# over every member of the locker's compartments, active_reservations and
+# degraded_compartments sets. It is order independent, so it is maintained in
+# O(1) per membership change and equals the hash recomputed from scratch.
+STATE_HASH_VERSION = 2
+_HASH_MASK = (1 << 256) - 1
+_HASHED_SETS = ('compartments', 'active_reservations', 'degraded_compartments')
+
+# Records per apply_many call when replaying a stream
+REPLAY_CHUNK = 4096
+
+def member_digest(set_name: str, member: str) -> int:
+    return int.from_bytes(hashlib.sha256(f"{set_name}\0{member}".encode()).digest(), 'big')
+
+class ApplyOutcome(str, Enum):
+    APPLIED = "applied"
+    DUPLICATE = "duplicate"
+    # Domain-rule rejections: the event is logged but changes nothing
+    UNKNOWN_COMPARTMENT = "unknown_compartment"
+    COMPARTMENT_OCCUPIED = "compartment_occupied"
+    COMPARTMENT_DEGRADED = "compartment_degraded"
+    UNKNOWN_RESERVATION = "unknown_reservation"
+    INVALID_STATUS = "invalid_status"
+    UNKNOWN_FAULT = "unknown_fault"
+    COMPARTMENT_MISMATCH = "compartment_mismatch"
+
+TERMINAL_STATUSES = (ReservationStatusEnum.PICKED_UP, ReservationStatusEnum.EXPIRED)
+
+@dataclass(slots=True)
 class Locker:
     locker_id: str
     compartments: Set[str] = field(default_factory=set)
     active_reservations: Set[str] = field(default_factory=set)
     degraded_compartments: Set[str] = field(default_factory=set)
+    state_acc: int = 0
+    version: int = 0  # Projection.clock at the last change
+
+    def add(self, set_name: str, member: str):
+        members = getattr(self, set_name)
+        if member not in members:
+            members.add(member)
+            self.state_acc = (self.state_acc + member_digest(set_name, member)) & _HASH_MASK
+
+    def discard(self, set_name: str, member: str):
+        members = getattr(self, set_name)
+        if member in members:
+            members.remove(member)
+            self.state_acc = (self.state_acc - member_digest(set_name, member)) & _HASH_MASK
+
+    def recompute_state_acc(self) -> int:
+        acc = 0
+        for set_name in _HASHED_SETS:
+            for member in getattr(self, set_name):
+                acc += member_digest(set_name, member)
+        return acc & _HASH_MASK
+
+    @property
+    def state_hash(self) -> str:
+        return f"v{STATE_HASH_VERSION}:{self.state_acc:064x}"
 
-@dataclass
+@dataclass(slots=True)
 class Compartment:
     compartment_id: str
     locker_id: str
     degraded: bool = False
     active_reservation: Optional[str] = None
-    faults: Set[str] = field(default_factory=set)
+    faults: Optional[Set[str]] = None  # uncleared fault ids, created on the first fault
+    version: int = 0
+    severe_faults: int = 0  # of those, the ones with severity >= 3 (degraded while any)
 
-@dataclass
+@dataclass(slots=True)
 class Reservation:
     reservation_id: str
     compartment_id: str
     locker_id: str
     status: ReservationStatusEnum = ReservationStatusEnum.CREATED
+    deadline: Optional[int] = None  # epoch micros, only tracked with an ExpiryScheduler
+    version: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class Fault:
     fault_id: str
     compartment_id: str
     severity: int = 1
     cleared: bool = False
 
-class Projection:
+class SortedIdSet:
+    """
+    A set of ids that also keeps them in a sorted list, so a page of members
+    after a cursor is a bisect away. Membership is the set's; `add` and
+    `discard` keep the list in step.
+    """
+    __slots__ = ('members', 'ids')
+
     def __init__(self):
+        self.members: Set[str] = set()
+        self.ids: List[str] = []
+
+    def add(self, item: str):
+        if item not in self.members:
+            self.members.add(item)
+            insort(self.ids, item)
+
+    def discard(self, item: str):
+        if item in self.members:
+            self.members.remove(item)
+            del self.ids[bisect_left(self.ids, item)]
+
+    def update(self, items: Iterable[str]):
+        self.members.update(items)
+        self.ids = sorted(self.members)
+
+    def clear(self):
+        self.members.clear()
+        self.ids = []
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.members
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def run_end(self, ids: List[str], i: int) -> int:
+        """
+        Where the run of members starting at ids[i] (a member) ends in `ids`,
+        a sorted list holding every member. The run ends where the two lists
+        stop lining up, found by galloping then bisecting.
+        """
+        mine = self.ids
+        j = bisect_left(mine, ids[i])
+        limit = min(len(ids) - i, len(mine) - j)
+        lo, step = 1, 1  # ids[i:i + lo] is known to be members
+        while lo + step <= limit and ids[i + lo + step - 1] == mine[j + lo + step - 1]:
+            lo += step
+            step *= 2
+        hi = min(lo + step, limit + 1)  # the run is shorter than hi
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if ids[i + mid - 1] == mine[j + mid - 1]:
+                lo = mid
+            else:
+                hi = mid
+        return i + lo
+
+class Projection:
+    """
+    Current state, kept compact: slotted records whose id fields share the
+    string objects used as dict keys, and settled history (PICKED_UP /
+    EXPIRED reservations, cleared faults) moved out to a `ColdStore` that is
+    only read when a rule or query needs it.
+    """
+
+    def __init__(self, dedup: Optional[DedupIndex] = None, cold: Optional[ColdStore] = None,
+                 metrics: Optional[Metrics] = None, expiry: Optional[ExpiryScheduler] = None):
         self.lockers: Dict[str, Locker] = {}
         self.compartments: Dict[str, Compartment] = {}
         self.reservations: Dict[str, Reservation] = {}
         self.faults: Dict[str, Fault] = {}
+        # Secondary indexes for fleet-wide queries, kept in step by apply
+        self.locker_ids: List[str] = []  # sorted, for cursor pagination
+        self.active_lockers = SortedIdSet()  # lockers with active reservations
+        self.degraded_lockers = SortedIdSet()  # lockers with degraded compartments
+        # A standalone projection dedupes events itself. When it shares the
+        # store's DedupIndex, only logged (already unique) events reach it, so
+        # the ids are not held a second time.
+        self.dedup = dedup
         self.applied_event_ids = set()
+        self.cold = cold if cold is not None else ColdStore()
+        self.position = 0  # log sequence number of the next record to apply
+        # Bumped by every non-duplicate event; an entity's `version` is the
+        # clock of its last change, so versions never repeat for an id even
+        # if the entity is replaced, and replay reproduces them exactly
+        self.clock = 0
+        self.metrics = metrics
+        self.expiry = expiry
+        # Looked up by the logged type string; a str Enum hashes by its name,
+        # so the members are keys too for events built with EventType
+        self._handlers = {}
+        for etype, handler in self._HANDLERS.items():
+            self._handlers[etype.value] = self._handlers[etype] = handler.__get__(self)
 
-    def rebuild(self, events):
+    def clear(self):
         self.lockers.clear()
         self.compartments.clear()
         self.reservations.clear()
         self.faults.clear()
+        self.locker_ids.clear()
+        self.active_lockers.clear()
+        self.degraded_lockers.clear()
         self.applied_event_ids.clear()
-        for event in events:
-            self.apply(event)
-
-    def apply(self, event):
-        eid = event['event_id']
-        if eid in self.applied_event_ids:
-            return
-        self.applied_event_ids.add(eid)
-        locker_id = event['locker_id']
-        etype = event['type']
-        payload = event['payload']
+        self.cold.clear()
+        if self.expiry is not None:
+            self.expiry.clear()
+        self.position = 0
+        self.clock = 0
 
-        if locker_id not in self.lockers:
-            self.lockers[locker_id] = Locker(locker_id=locker_id)
-
-        if etype == EventType.COMPARTMENT_REGISTERED:
-            cid = payload['compartment_id']
-            self.lockers[locker_id].compartments.add(cid)
-            self.compartments[cid] = Compartment(compartment_id=cid, locker_id=locker_id)
-
-        elif etype == EventType.RESERVATION_CREATED:
-            cid = payload['compartment_id']
-            rid = payload['reservation_id']
-            if cid not in self.compartments:
-                return  # Compartment must exist
-            comp = self.compartments[cid]
-            if comp.active_reservation is not None:
-                return  # Only one active reservation
-            if comp.degraded:
-                return  # Cannot reserve degraded compartment
-            comp.active_reservation = rid
-            self.lockers[locker_id].active_reservations.add(rid)
-            self.reservations[rid] = Reservation(
-                reservation_id=rid,
-                compartment_id=cid,
-                locker_id=locker_id,
-                status=ReservationStatusEnum.CREATED
-            )
-
-        elif etype == EventType.PARCEL_DEPOSITED:
-            rid = payload['reservation_id']
-            if rid not in self.reservations:
-                return
-            res = self.reservations[rid]
-            if res.status != ReservationStatusEnum.CREATED:
-                return
-            res.status = ReservationStatusEnum.DEPOSITED
+    def rebuild(self, events: Iterable[Dict[str, Any]]):
+        """Replays `events` (any iterable, e.g. a stream of the log) from an empty state."""
+        self.clear()
+        self.replay(enumerate(events))
 
-        elif etype == EventType.PARCEL_PICKED_UP:
-            rid = payload['reservation_id']
-            if rid not in self.reservations:
+    def replay(self, records: Iterable[Tuple[int, Dict[str, Any]]]):
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, REPLAY_CHUNK))
+            if not chunk:
                 return
-            res = self.reservations[rid]
-            if res.status != ReservationStatusEnum.DEPOSITED:
-                return
-            res.status = ReservationStatusEnum.PICKED_UP
-            cid = res.compartment_id
-            self.compartments[cid].active_reservation = None
-            locker_id = res.locker_id
-            self.lockers[locker_id].active_reservations.discard(rid)
-
-        elif etype == EventType.RESERVATION_EXPIRED:
-            rid = payload['reservation_id']
-            if rid not in self.reservations:
-                return
-            res = self.reservations[rid]
-            res.status = ReservationStatusEnum.EXPIRED
-            cid = res.compartment_id
-            self.compartments[cid].active_reservation = None
-            locker_id = res.locker_id
-            self.lockers[locker_id].active_reservations.discard(rid)
-
-        elif etype == EventType.FAULT_REPORTED:
-            cid = payload['compartment_id']
-            fid = event['event_id']
-            severity = payload.get('severity', 1)
-            self.faults[fid] = Fault(
-                fault_id=fid,
-                compartment_id=cid,
-                severity=severity,
-                cleared=False
-            )
-            if cid in self.compartments:
-                self.compartments[cid].faults.add(fid)
-                if severity >= 3:
-                    self.compartments[cid].degraded = True
-                    self.lockers[locker_id].degraded_compartments.add(cid)
+            self.apply_many(chunk)
 
-        elif etype == EventType.FAULT_CLEARED:
-            ref_fault_id = payload['fault_event_id']
-            cid = payload['compartment_id']
-            if ref_fault_id not in self.faults:
-                return
-            fault = self.faults[ref_fault_id]
-            if fault.compartment_id != cid:
-                return
-            if fault.cleared:
-                return
-            fault.cleared = True
-            if cid in self.compartments:
-                self.compartments[cid].faults.discard(ref_fault_id)
-                # If no uncleared faults with severity >= 3, clear degraded
-                uncleared = [self.faults[fid] for fid in self.compartments[cid].faults if not self.faults[fid].cleared and self.faults[fid].severity >= 3]
-                if not uncleared:
-                    self.compartments[cid].degraded = False
-                    self.lockers[locker_id].degraded_compartments.discard(cid)
+    def apply(self, event, seq: Optional[int] = None) -> ApplyOutcome:
+        """Applies one event; returns whether it changed state or which rule rejected it."""
+        if seq is not None:
+            self.position = seq + 1
+        metrics = self.metrics
+        if metrics is None:
+            return self._apply(event)
+        started = time.perf_counter()
+        outcome = self._apply(event)
+        metrics.apply_seconds.observe(time.perf_counter() - started, event['type'])
+        metrics.events.inc(event['type'], outcome)
+        return outcome
+
+    def apply_many(self, records: Iterable[Tuple[int, Dict[str, Any]]]) -> List[ApplyOutcome]:
+        """
+        Applies (seq, event) records in log order; returns their outcomes.
+        The same as `apply` per record, without its per-call overhead (with
+        metrics, every event is still timed through `apply`).
+        """
+        if self.metrics is not None:
+            return [self.apply(event, seq) for seq, event in records]
+        outcomes = []
+        append = outcomes.append
+        handlers = self._handlers
+        lockers = self.lockers
+        applied = self.applied_event_ids if self.dedup is None else None
+        duplicate, unhandled = ApplyOutcome.DUPLICATE, ApplyOutcome.APPLIED
+        # Handlers are passed the clock, so position and clock are only stored once
+        clock, seq = self.clock, self.position - 1
+        try:
+            for seq, event in records:
+                if applied is not None:
+                    eid = event['event_id']
+                    if eid in applied:
+                        append(duplicate)
+                        continue
+                    applied.add(eid)
+                clock += 1
+                locker = lockers.get(event['locker_id'])
+                if locker is None:
+                    locker = self._add_locker(event['locker_id'])
+                handler = handlers.get(event['type'])
+                append(unhandled if handler is None else handler(event, event['payload'], locker, clock))
+        finally:
+            self.clock = clock
+            self.position = seq + 1
+        return outcomes
+
+    def _apply(self, event) -> ApplyOutcome:
+        if self.dedup is None:
+            eid = event['event_id']
+            if eid in self.applied_event_ids:
+                return ApplyOutcome.DUPLICATE
+            self.applied_event_ids.add(eid)
+        self.clock = clock = self.clock + 1
+        locker = self.lockers.get(event['locker_id'])
+        if locker is None:
+            locker = self._add_locker(event['locker_id'])
+        handler = self._handlers.get(event['type'])
+        if handler is None:
+            return ApplyOutcome.APPLIED
+        return handler(event, event['payload'], locker, clock)
+
+    def _add_locker(self, locker_id: str) -> Locker:
+        locker = self.lockers[locker_id] = Locker(locker_id=locker_id)
+        insort(self.locker_ids, locker_id)
+        return locker
+
+    # Handlers get the event, its payload, its locker (created if new; its
+    # locker_id is the one string shared by the locker's records) and the
+    # event's clock, and return the outcome
+    def _compartment_registered(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        cid = payload['compartment_id']
+        locker.add('compartments', cid)
+        locker.version = clock
+        self.compartments[cid] = Compartment(compartment_id=cid, locker_id=locker.locker_id, version=clock)
+        return ApplyOutcome.APPLIED
+
+    def _reservation_created(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        rid = payload['reservation_id']
+        comp = self.compartments.get(payload['compartment_id'])
+        if comp is None:
+            return ApplyOutcome.UNKNOWN_COMPARTMENT  # Compartment must exist
+        if comp.active_reservation is not None:
+            return ApplyOutcome.COMPARTMENT_OCCUPIED  # Only one active reservation
+        if comp.degraded:
+            return ApplyOutcome.COMPARTMENT_DEGRADED  # Cannot reserve degraded compartment
+        comp.active_reservation = rid
+        comp.version = clock
+        locker.add('active_reservations', rid)
+        locker.version = clock
+        self.active_lockers.add(locker.locker_id)
+        res = self.reservations[rid] = Reservation(
+            reservation_id=rid,
+            compartment_id=comp.compartment_id,
+            locker_id=locker.locker_id,
+            status=ReservationStatusEnum.CREATED,
+            version=clock
+        )
+        if self.expiry is not None:
+            self._set_deadline(res, event)
+        return ApplyOutcome.APPLIED
+
+    def _parcel_deposited(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        res = self.reservations.get(payload['reservation_id'])
+        if res is None:
+            return ApplyOutcome.UNKNOWN_RESERVATION  # Unknown, or already settled in the cold store
+        if res.status != ReservationStatusEnum.CREATED:
+            return ApplyOutcome.INVALID_STATUS
+        res.status = ReservationStatusEnum.DEPOSITED
+        res.version = clock
+        if self.expiry is not None:
+            self._set_deadline(res, event)
+        return ApplyOutcome.APPLIED
+
+    def _parcel_picked_up(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        res = self.reservations.get(payload['reservation_id'])
+        if res is None:
+            return ApplyOutcome.UNKNOWN_RESERVATION
+        if res.status != ReservationStatusEnum.DEPOSITED:
+            return ApplyOutcome.INVALID_STATUS
+        res.status = ReservationStatusEnum.PICKED_UP
+        self._release_reservation(res, clock)
+        return ApplyOutcome.APPLIED
+
+    def _reservation_expired(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        rid = payload['reservation_id']
+        res = self.reservations.get(rid)
+        if res is None:
+            # A settled reservation (picked up, or expired already) cannot expire: an
+            # expiry that lost a race with the pickup is logged but changes nothing
+            if self.cold.get_reservation(rid) is not None:
+                return ApplyOutcome.INVALID_STATUS
+            return ApplyOutcome.UNKNOWN_RESERVATION
+        res.status = ReservationStatusEnum.EXPIRED
+        self._release_reservation(res, clock)
+        return ApplyOutcome.APPLIED
+
+    def _fault_reported(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        cid = payload['compartment_id']
+        fid = event['event_id']
+        severity = payload.get('severity', 1)
+        self.faults[fid] = Fault(
+            fault_id=fid,
+            compartment_id=cid,
+            severity=severity,
+            cleared=False
+        )
+        comp = self.compartments.get(cid)
+        if comp is not None:
+            faults = comp.faults
+            if faults is None:
+                faults = comp.faults = set()
+            if severity >= 3:
+                if fid not in faults:
+                    comp.severe_faults += 1
+                comp.degraded = True
+                comp.version = clock
+                locker.add('degraded_compartments', cid)
+                locker.version = clock
+                self.degraded_lockers.add(locker.locker_id)
+            faults.add(fid)
+        return ApplyOutcome.APPLIED
+
+    def _fault_cleared(self, event, payload, locker: Locker, clock: int) -> ApplyOutcome:
+        ref_fault_id = payload['fault_event_id']
+        cid = payload['compartment_id']
+        fault = self.faults.get(ref_fault_id)
+        if fault is None:
+            return ApplyOutcome.UNKNOWN_FAULT  # Unknown, or already cleared (moved to the cold store)
+        if fault.compartment_id != cid:
+            return ApplyOutcome.COMPARTMENT_MISMATCH
+        fault.cleared = True
+        del self.faults[ref_fault_id]
+        self.cold.put_fault(fault.fault_id, fault.compartment_id, fault.severity)
+        comp = self.compartments.get(cid)
+        if comp is not None:
+            if comp.faults and ref_fault_id in comp.faults:
+                comp.faults.discard(ref_fault_id)
+                if fault.severity >= 3:
+                    comp.severe_faults -= 1
+            # If no uncleared faults with severity >= 3, clear degraded
+            if not comp.severe_faults:
+                if comp.degraded:
+                    comp.degraded = False
+                    comp.version = clock
+                # A compartment re-registered while degraded is still in the
+                # locker's set, though the new record is not degraded
+                if cid in locker.degraded_compartments:
+                    locker.discard('degraded_compartments', cid)
+                    locker.version = clock
+                    if not locker.degraded_compartments:
+                        self.degraded_lockers.discard(locker.locker_id)
+        return ApplyOutcome.APPLIED
+
+    # Handler per event type, bound once per projection
+    _HANDLERS = {
+        EventType.COMPARTMENT_REGISTERED: _compartment_registered,
+        EventType.RESERVATION_CREATED: _reservation_created,
+        EventType.PARCEL_DEPOSITED: _parcel_deposited,
+        EventType.PARCEL_PICKED_UP: _parcel_picked_up,
+        EventType.RESERVATION_EXPIRED: _reservation_expired,
+        EventType.FAULT_REPORTED: _fault_reported,
+        EventType.FAULT_CLEARED: _fault_cleared,
+    }
+
+    def _set_deadline(self, res: Reservation, event):
+        res.deadline = self.expiry.deadline_for(event, res.status)
+        if res.deadline is not None:
+            self.expiry.schedule(res.reservation_id, res.deadline)
+
+    def _release_reservation(self, res: Reservation, clock: int):
+        comp = self.compartments[res.compartment_id]
+        comp.active_reservation = None
+        comp.version = clock
+        locker = self.lockers[res.locker_id]
+        locker.discard('active_reservations', res.reservation_id)
+        locker.version = clock
+        if not locker.active_reservations:
+            self.active_lockers.discard(locker.locker_id)
+        res.version = clock
+        self._settle_reservation(res)
+
+    def _settle_reservation(self, res: Reservation):
+        if self.reservations.get(res.reservation_id) is res:
+            del self.reservations[res.reservation_id]
+        self.cold.put_reservation(res.reservation_id, res.compartment_id, res.locker_id, res.status.value, res.version)
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        # Plain lists so the copy can be serialized off the apply thread
+        return {
+            'position': self.position,
+            'clock': self.clock,
+            'lockers': [
+                [l.locker_id, list(l.compartments), list(l.active_reservations), list(l.degraded_compartments),
+                 l.version]
+                for l in self.lockers.values()
+            ],
+            'compartments': [
+                [c.compartment_id, c.locker_id, c.degraded, c.active_reservation, list(c.faults or ()), c.version]
+                for c in self.compartments.values()
+            ],
+            # Settled rows are written alongside the live ones, restore_state
+            # sends them back to the cold store by status
+            'reservations': [
+                [rid, cid, locker_id, status, None, version]
+                for rid, cid, locker_id, status, version in self.cold.reservations()
+            ] + [
+                [r.reservation_id, r.compartment_id, r.locker_id, r.status.value, r.deadline, r.version]
+                for r in self.reservations.values()
+            ],
+            'faults': [
+                [fid, cid, severity, True] for fid, cid, severity in self.cold.faults()
+            ] + [
+                [f.fault_id, f.compartment_id, f.severity, f.cleared]
+                for f in self.faults.values()
+            ],
+            'applied_event_ids': list(self.applied_event_ids),
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        self.clear()
+        # Trailing fields (deadline, version) were added over time and are optional
+        for locker_id, comps, active, degraded, *version in state['lockers']:
+            locker = Locker(locker_id, set(comps), set(active), set(degraded), 0, *version)
+            locker.state_acc = locker.recompute_state_acc()
+            self.lockers[locker_id] = locker
+        # Sorted once each, rather than one insort per locker
+        self.active_lockers.update(lid for lid, locker in self.lockers.items() if locker.active_reservations)
+        self.degraded_lockers.update(lid for lid, locker in self.lockers.items() if locker.degraded_compartments)
+        for cid, locker_id, degraded, active_reservation, faults, *version in state['compartments']:
+            self.compartments[cid] = Compartment(cid, locker_id, degraded, active_reservation, set(faults) or None,
+                                                 *version)
+        for rid, cid, locker_id, status, *extra in state['reservations']:
+            res = Reservation(rid, cid, locker_id, ReservationStatusEnum(status), *extra)
+            if res.status in TERMINAL_STATUSES:
+                self._settle_reservation(res)
+            else:
+                self.reservations[rid] = res
+                if self.expiry is not None and res.deadline is not None:
+                    self.expiry.schedule(rid, res.deadline)
+        for fid, cid, severity, cleared in state['faults']:
+            if cleared:
+                self.cold.put_fault(fid, cid, severity)
+            else:
+                self.faults[fid] = Fault(fid, cid, severity, cleared)
+                if severity >= 3:
+                    comp = self.compartments.get(cid)
+                    if comp is not None and comp.faults and fid in comp.faults:
+                        comp.severe_faults += 1
+        self.applied_event_ids.update(state['applied_event_ids'])
+        self.locker_ids.extend(sorted(self.lockers))
+        self.position = state['position']
+        self.clock = state.get('clock', 0)
 
     def locker_summary(self, locker_id: str) -> Optional[LockerSummary]:
         if locker_id not in self.lockers:
@@ -178,20 +543,103 @@ class Projection:
         )
 
     def reservation_status(self, reservation_id: str) -> Optional[ReservationStatus]:
-        if reservation_id not in self.reservations:
-            return None
-        res = self.reservations[reservation_id]
+        res = self.reservations.get(reservation_id)
+        if res is not None:
+            status = res.status
+        else:
+            row = self.cold.get_reservation(reservation_id)
+            if row is None:
+                return None
+            status = row[3]
         return ReservationStatus(
             reservation_id=reservation_id,
-            status=res.status
+            status=status
         )
 
-    def _compute_state_hash(self, locker_id: str) -> str:
-        # Deterministic hash of locker state
-        locker = self.lockers[locker_id]
-        summary = {
-            'compartments': sorted(list(locker.compartments)),
-            'active_reservations': sorted(list(locker.active_reservations)),
-            'degraded_compartments': sorted(list(locker.degraded_compartments)),
+    def summary_row(self, locker_id: str) -> Optional[Dict[str, Any]]:
+        """`locker_summary` as a plain dict, for bulk reads that skip model construction."""
+        locker = self.lockers.get(locker_id)
+        if locker is None:
+            return None
+        return {
+            "locker_id": locker.locker_id,
+            "compartments": len(locker.compartments),
+            "active_reservations": len(locker.active_reservations),
+            "degraded_compartments": len(locker.degraded_compartments),
+            "state_hash": locker.state_hash,
         }
-        return hashlib.sha256(str(summary).encode()).hexdigest()
+
+    def compartment_row(self, locker_id: str, compartment_id: str) -> Optional[Dict[str, Any]]:
+        comp = self.compartments.get(compartment_id)
+        if comp is None:
+            return None
+        return {"compartment_id": comp.compartment_id, "degraded": comp.degraded,
+                "active_reservation": comp.active_reservation}
+
+    def reservation_row(self, reservation_id: str) -> Optional[Dict[str, Any]]:
+        res = self.reservations.get(reservation_id)
+        if res is not None:
+            return {"reservation_id": res.reservation_id, "status": res.status.value}
+        row = self.cold.get_reservation(reservation_id)
+        return None if row is None else {"reservation_id": row[0], "status": row[3]}
+
+    def reservation_locker(self, reservation_id: str) -> Optional[str]:
+        """The locker a reservation was made on, live or settled."""
+        res = self.reservations.get(reservation_id)
+        if res is not None:
+            return res.locker_id
+        row = self.cold.get_reservation(reservation_id)
+        return None if row is None else row[2]
+
+    def list_lockers(self, degraded: Optional[bool] = None, active: Optional[bool] = None,
+                     after: Optional[str] = None, limit: int = 100) -> List[str]:
+        """
+        Up to `limit` locker ids after `after`, in id order. `degraded` /
+        `active` filter on having degraded compartments / active
+        reservations (None: either). The walk starts at the cursor in the
+        smallest required index's sorted ids (or all locker ids), checking the
+        other filters per id; over all locker ids, a run of excluded lockers
+        is skipped in one step, so a page costs about O(limit + log n).
+        """
+        filters = ((degraded, self.degraded_lockers), (active, self.active_lockers))
+        required = [index for flag, index in filters if flag]
+        excluded = [index for flag, index in filters if flag is False]
+        if required:
+            smallest = min(required, key=len)
+            ids = smallest.ids
+            required = [index for index in required if index is not smallest]
+        else:
+            ids = self.locker_ids
+        page = []
+        i = 0 if after is None else bisect_right(ids, after)
+        # Applies may be running: re-read the length, an id moved meanwhile is at worst skipped
+        while i < len(ids) and len(page) < limit:
+            lid = ids[i]
+            skip = next((index for index in excluded if lid in index), None)
+            if skip is not None:
+                # Every excluded index is a subset of the locker ids, not of another index
+                i = skip.run_end(ids, i) if ids is self.locker_ids else i + 1
+                continue
+            if all(lid in index for index in required):
+                page.append(lid)
+            i += 1
+        return page
+
+    def locker_version(self, locker_id: str) -> Optional[int]:
+        locker = self.lockers.get(locker_id)
+        return None if locker is None else locker.version
+
+    def compartment_version(self, locker_id: str, compartment_id: str) -> Optional[int]:
+        comp = self.compartments.get(compartment_id)
+        return None if comp is None else comp.version
+
+    def reservation_version(self, reservation_id: str) -> Optional[int]:
+        res = self.reservations.get(reservation_id)
+        if res is not None:
+            return res.version
+        row = self.cold.get_reservation(reservation_id)
+        return None if row is None else row[4]
+
+    def _compute_state_hash(self, locker_id: str) -> str:
+        # Maintained incrementally in apply, see STATE_HASH_VERSION
+        return self.lockers[locker_id].state_hash
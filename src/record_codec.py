@@ -0,0 +1,468 @@
+import json
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from src.locker_index import to_micros
+from src.models import EventType
+
+# Binary log records: u32 body length, u32 crc32 of the body, then the body.
+#
+# An event body is: kind, type code, occurred_at (epoch micros) and how to
+# spell it, event_id form, then the strings this record adds to its
+# segment's string table (u16 count, each u16 length + utf-8), the locker_id
+# as a table reference, and the payload as a msgpack-style value.
+#
+# Events that the layout cannot reproduce byte for byte as JSON (other keys,
+# unknown types, huge ints...) are stored as a JSON body instead, so decoding
+# always returns exactly what was appended.
+FRAME = struct.Struct('<II')
+HEADER = struct.Struct('<BBqBBH')
+RECORD_HEAD = struct.Struct('<IIBBqBBH')
+REF_VALUE = struct.Struct('<BI')
+# The body length and the header's definition count, skipping what is between
+FRAME_DEFS = struct.Struct('<I16xH')
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+I64 = struct.Struct('<q')
+F64 = struct.Struct('<d')
+
+KIND_EVENT = 0
+KIND_JSON = 1
+
+# occurred_at spellings: isoformat() of the UTC datetime, the same with a
+# 'Z' suffix, or anything else stored verbatim after the header
+TIME_ISO = 0
+TIME_ZULU = 1
+TIME_RAW = 2
+
+# event_id forms: a canonical (lower-case, hyphenated) UUID as 16 bytes, or a string
+ID_UUID = 0
+ID_STR = 1
+
+EVENT_KEYS = ('event_id', 'occurred_at', 'locker_id', 'type', 'payload')
+TYPE_CODES = {etype.value: code for code, etype in enumerate(EventType)}
+TYPE_NAMES = [etype.value for etype in EventType]
+# Payload values repeated across a segment's records, kept in its string table
+# (payload keys always are)
+INTERNED_FIELDS = frozenset(('compartment_id',))
+
+# msgpack tags; 0xc1 (unused by msgpack) is a reference into the string table
+NIL, FALSE, TRUE, REF = 0xc0, 0xc2, 0xc3, 0xc1
+FLOAT64, INT64 = 0xcb, 0xd3
+STR8, STR16, STR32 = 0xd9, 0xda, 0xdb
+ARRAY16, ARRAY32, MAP16, MAP32 = 0xdc, 0xdd, 0xde, 0xdf
+
+FIXMAP = [bytes((0x80 | n,)) for n in range(16)]
+FIXSTR = [bytes((0xa0 | n,)) for n in range(32)]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class CorruptRecord(ValueError):
+    pass
+
+
+class _Unencodable(Exception):
+    """The event has no exact binary form and is stored as JSON."""
+
+
+class StringTable:
+    """
+    A segment's interned strings (locker ids, payload keys, compartment ids).
+    Records define the strings they introduce, so a segment's table is the
+    concatenation of its records' definitions, in log order.
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        # string -> its encoded reference
+        self.refs: Dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def extend(self, strings: List[str]):
+        for value in strings:
+            self.refs[value] = REF_VALUE.pack(REF, len(self.strings))
+            self.strings.append(value)
+
+
+def _json_default(obj):
+    # Same as event_store.default_serializer
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+_DAYS: Dict[int, str] = {}
+# (epoch second, its 'YYYY-MM-DDTHH:MM:SS'): consecutive records mostly share one
+_LAST_SECOND = [(None, '')]
+
+
+def _iso(micros: int, suffix: str = '+00:00') -> str:
+    """datetime.isoformat() of `micros` as a UTC datetime, ending in `suffix` instead of '+00:00'."""
+    second, fraction = divmod(micros, 1_000_000)
+    cached, prefix = _LAST_SECOND[0]
+    if cached != second:
+        days, rest = divmod(second, 86_400)
+        date = _DAYS.get(days)
+        if date is None:
+            if len(_DAYS) > 10_000:
+                _DAYS.clear()
+            date = _DAYS[days] = (EPOCH + timedelta(days=days)).date().isoformat()
+        minutes, sec = divmod(rest, 60)
+        hour, minute = divmod(minutes, 60)
+        prefix = f"{date}T{hour:02d}:{minute:02d}:{sec:02d}"
+        _LAST_SECOND[0] = (second, prefix)
+    if fraction:
+        return f"{prefix}.{fraction:06d}{suffix}"
+    return prefix + suffix
+
+
+def _uuid_bytes(value: str) -> Optional[bytes]:
+    if len(value) != 36 or value[8] != '-' or value[13] != '-' or value[18] != '-' or value[23] != '-':
+        return None
+    hexed = value.replace('-', '')
+    if hexed != hexed.lower():
+        return None
+    try:
+        return bytes.fromhex(hexed)
+    except ValueError:
+        return None
+
+
+class _Encoder:
+    __slots__ = ('table', 'new', 'out')
+
+    def __init__(self, table: StringTable):
+        self.table = table
+        self.new: Dict[str, int] = {}
+        self.out: List[bytes] = []
+
+    def ref(self, value: str):
+        packed = self.table.refs.get(value)
+        if packed is None:
+            sid = self.new.get(value)
+            if sid is None:
+                sid = self.new[value] = len(self.table) + len(self.new)
+            packed = REF_VALUE.pack(REF, sid)
+        self.out.append(packed)
+
+    def string(self, value: str):
+        raw = value.encode()
+        n = len(raw)
+        out = self.out
+        if n < 32:
+            out.append(bytes((0xa0 | n,)))
+        elif n < 0x100:
+            out.append(bytes((STR8, n)))
+        elif n < 0x10000:
+            out.append(bytes((STR16,)) + U16.pack(n))
+        else:
+            out.append(bytes((STR32,)) + U32.pack(n))
+        out.append(raw)
+
+    def value(self, value: Any):
+        out = self.out
+        if isinstance(value, str):
+            self.string(value)
+        elif value is None:
+            out.append(bytes((NIL,)))
+        elif value is True:
+            out.append(bytes((TRUE,)))
+        elif value is False:
+            out.append(bytes((FALSE,)))
+        elif isinstance(value, int):
+            if 0 <= value < 0x80:
+                out.append(bytes((value,)))
+            elif -32 <= value < 0:
+                out.append(bytes((value & 0xff,)))
+            elif -(1 << 63) <= value < (1 << 63):
+                out.append(bytes((INT64,)) + I64.pack(value))
+            else:
+                raise _Unencodable()
+        elif isinstance(value, float):
+            out.append(bytes((FLOAT64,)) + F64.pack(value))
+        elif isinstance(value, dict):
+            self.map(value)
+        elif isinstance(value, (list, tuple)):
+            n = len(value)
+            if n < 16:
+                out.append(bytes((0x90 | n,)))
+            elif n < 0x10000:
+                out.append(bytes((ARRAY16,)) + U16.pack(n))
+            else:
+                out.append(bytes((ARRAY32,)) + U32.pack(n))
+            for item in value:
+                self.value(item)
+        elif isinstance(value, datetime):
+            self.string(value.isoformat())  # as default_serializer
+        else:
+            raise _Unencodable()
+
+    def map(self, value: Dict[str, Any]):
+        n = len(value)
+        out = self.out
+        if n < 16:
+            out.append(FIXMAP[n])
+        elif n < 0x10000:
+            out.append(bytes((MAP16,)) + U16.pack(n))
+        else:
+            out.append(bytes((MAP32,)) + U32.pack(n))
+        ref = self.ref
+        for key, item in value.items():
+            if type(key) is not str:
+                raise _Unencodable()  # JSON would turn it into a string
+            ref(key)
+            if type(item) is str:
+                if key in INTERNED_FIELDS:
+                    ref(item)
+                    continue
+                raw = item.encode()
+                if len(raw) < 32:
+                    out.append(FIXSTR[len(raw)])
+                    out.append(raw)
+                    continue
+            self.value(item)
+
+
+def _frame(body: bytes) -> bytes:
+    return FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _event_body(event: Dict[str, Any], table: StringTable) -> Tuple[bytes, List[str]]:
+    if tuple(event) != EVENT_KEYS:
+        raise _Unencodable()
+    event_id, occurred_at, locker_id, etype, payload = event.values()
+    code = TYPE_CODES.get(etype.value if isinstance(etype, EventType) else etype)
+    if code is None or not isinstance(event_id, str) or not isinstance(locker_id, str) \
+            or not isinstance(payload, dict):
+        raise _Unencodable()
+    if isinstance(occurred_at, datetime):
+        occurred_at = occurred_at.isoformat()
+    if not isinstance(occurred_at, str):
+        raise _Unencodable()
+    try:
+        micros = to_micros(occurred_at)
+    except ValueError:
+        raise _Unencodable()
+    if occurred_at == _iso(micros):
+        time_form = TIME_ISO
+    elif occurred_at == _iso(micros, 'Z'):
+        time_form = TIME_ZULU
+    else:
+        time_form = TIME_RAW
+    uuid_raw = _uuid_bytes(event_id)
+
+    encoder = _Encoder(table)
+    if time_form == TIME_RAW:
+        encoder.string(occurred_at)
+    if uuid_raw is None:
+        encoder.string(event_id)
+    else:
+        encoder.out.append(uuid_raw)
+    encoder.ref(locker_id)
+    encoder.map(payload)
+    new = list(encoder.new)
+    head = [HEADER.pack(KIND_EVENT, code, micros, time_form, ID_STR if uuid_raw is None else ID_UUID, len(new))]
+    for value in new:
+        raw = value.encode()
+        head.append(U16.pack(len(raw)) + raw)
+    return b''.join(head + encoder.out), new
+
+
+def encode_record(event: Dict[str, Any], table: StringTable) -> Tuple[bytes, List[str]]:
+    """
+    The framed record for `event` against `table`, and the strings it adds to
+    the table. The table is not changed: `extend` it with them once the
+    record is going to be written.
+    """
+    try:
+        body, new = _event_body(event, table)
+    except (_Unencodable, UnicodeEncodeError, struct.error):
+        body, new = bytes((KIND_JSON,)) + json.dumps(event, default=_json_default).encode(), []
+    return _frame(body), new
+
+
+def _decode_value(data, pos: int, strings: List[str]) -> Tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+    if tag < 0x80:
+        return tag, pos
+    if 0xa0 <= tag < 0xc0:
+        end = pos + (tag & 0x1f)
+        return str(data[pos:end], 'utf-8'), end
+    if tag == REF:
+        return strings[U32.unpack_from(data, pos)[0]], pos + 4
+    if 0x80 <= tag < 0x90:
+        return _decode_map(data, pos, tag & 0x0f, strings)
+    if tag >= 0xe0:
+        return tag - 0x100, pos
+    if tag == NIL:
+        return None, pos
+    if tag == TRUE:
+        return True, pos
+    if tag == FALSE:
+        return False, pos
+    if tag == INT64:
+        return I64.unpack_from(data, pos)[0], pos + 8
+    if tag == FLOAT64:
+        return F64.unpack_from(data, pos)[0], pos + 8
+    if tag in (STR8, STR16, STR32):
+        if tag == STR8:
+            n, pos = data[pos], pos + 1
+        elif tag == STR16:
+            n, pos = U16.unpack_from(data, pos)[0], pos + 2
+        else:
+            n, pos = U32.unpack_from(data, pos)[0], pos + 4
+        return str(data[pos:pos + n], 'utf-8'), pos + n
+    if 0x90 <= tag < 0xa0 or tag in (ARRAY16, ARRAY32):
+        if tag == ARRAY16:
+            n, pos = U16.unpack_from(data, pos)[0], pos + 2
+        elif tag == ARRAY32:
+            n, pos = U32.unpack_from(data, pos)[0], pos + 4
+        else:
+            n = tag & 0x0f
+        items = []
+        for _ in range(n):
+            item, pos = _decode_value(data, pos, strings)
+            items.append(item)
+        return items, pos
+    if tag == MAP16:
+        return _decode_map(data, pos + 2, U16.unpack_from(data, pos)[0], strings)
+    if tag == MAP32:
+        return _decode_map(data, pos + 4, U32.unpack_from(data, pos)[0], strings)
+    raise CorruptRecord(f"Unknown value tag {tag:#x}")
+
+
+def _decode_map(data, pos: int, n: int, strings: List[str]) -> Tuple[Dict[str, Any], int]:
+    out = {}
+    for _ in range(n):
+        # Keys are always table references
+        key = strings[U32.unpack_from(data, pos + 1)[0]]
+        out[key], pos = _decode_value(data, pos + 5, strings)
+    return out, pos
+
+
+def _skip_defs(data, pos: int, count: int) -> int:
+    for _ in range(count):
+        pos += 2 + U16.unpack_from(data, pos)[0]
+    return pos
+
+
+def decode_record(data, pos: int, strings: List[str]) -> Tuple[Dict[str, Any], int]:
+    """The event of the record at `pos` and the offset after it; `strings` must cover its references."""
+    # The frame and the event header in one unpack; a JSON body is at least
+    # as long as the header, so this never reads past the end of the data
+    length, crc, kind, code, micros, time_form, id_form, defs = RECORD_HEAD.unpack_from(data, pos)
+    start = pos + FRAME.size
+    end = start + length
+    if zlib.crc32(data[start:end]) != crc or end > len(data):
+        raise CorruptRecord(f"Checksum mismatch in record at offset {pos}")
+    if kind == KIND_JSON:
+        return json.loads(data[start + 1:end]), end
+    p = start + HEADER.size
+    if defs:
+        p = _skip_defs(data, p, defs)
+    if time_form == TIME_RAW:
+        occurred_at, p = _decode_value(data, p, strings)
+    else:
+        occurred_at = _iso(micros, 'Z' if time_form == TIME_ZULU else '+00:00')
+    if id_form == ID_UUID:
+        h = data[p:p + 16].hex()
+        event_id = f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+        p += 16
+    else:
+        event_id, p = _decode_value(data, p, strings)
+    locker_id = strings[U32.unpack_from(data, p + 1)[0]]
+    p += 5
+    tag = data[p]
+    if 0x80 <= tag < 0x90:
+        # Inline the common payload: a small map of references, short
+        # strings and small ints
+        payload = {}
+        p += 1
+        for _ in range(tag & 0x0f):
+            key = strings[U32.unpack_from(data, p + 1)[0]]
+            tag = data[p + 5]
+            if tag == REF:
+                payload[key] = strings[U32.unpack_from(data, p + 6)[0]]
+                p += 10
+            elif 0xa0 <= tag < 0xc0:
+                p += 6
+                payload[key] = str(data[p:p + (tag & 0x1f)], 'utf-8')
+                p += tag & 0x1f
+            elif tag < 0x80:
+                payload[key] = tag
+                p += 6
+            else:
+                payload[key], p = _decode_value(data, p + 5, strings)
+    else:
+        payload, _ = _decode_value(data, p, strings)
+    return {
+        "event_id": event_id,
+        "occurred_at": occurred_at,
+        "locker_id": locker_id,
+        "type": TYPE_NAMES[code],
+        "payload": payload,
+    }, end
+
+
+def table_strings(data, pos: int = 0, end: Optional[int] = None) -> List[str]:
+    """Every string defined by the (complete) records in data[pos:end], in order."""
+    end = len(data) if end is None else end
+    strings = []
+    frame, header = FRAME.size, HEADER.size
+    u16 = U16.unpack_from
+    while pos < end:
+        length, defs = FRAME_DEFS.unpack_from(data, pos)
+        if defs and data[pos + frame] == KIND_EVENT:
+            p = pos + frame + header
+            for _ in range(defs):
+                n = u16(data, p)[0]
+                strings.append(str(data[p + 2:p + 2 + n], 'utf-8'))
+                p += 2 + n
+        pos += frame + length
+    return strings
+
+
+def scan(data, pos: int = 0):
+    """
+    Walks the records in data[pos:] without decoding them, yielding each
+    one's (offset, end offset); stops at the first that is incomplete or
+    fails its checksum.
+    """
+    end = len(data)
+    while pos + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(data, pos)
+        start = pos + FRAME.size
+        if length == 0 or start + length > end or zlib.crc32(data[start:start + length]) != crc:
+            return
+        yield pos, start + length
+        pos = start + length
+
+
+def record_header(data, pos: int) -> Optional[Tuple[str, int]]:
+    """(type, occurred_at micros) of the record at `pos` from its header alone; None for a JSON body."""
+    _, _, kind, code, micros, _, _, _ = RECORD_HEAD.unpack_from(data, pos)
+    if kind == KIND_JSON:
+        return None
+    return TYPE_NAMES[code], micros
+
+
+def locker_of(data, pos: int, strings: List[str]) -> Tuple[int, str]:
+    """(occurred_at micros, locker_id) of the record at `pos`, decoding only its header."""
+    start = pos + FRAME.size
+    if data[start] == KIND_JSON:
+        event, _ = decode_record(data, pos, strings)
+        return to_micros(event['occurred_at']), event['locker_id']
+    _, _, micros, time_form, id_form, defs = HEADER.unpack_from(data, start)
+    p = _skip_defs(data, start + HEADER.size, defs)
+    if time_form == TIME_RAW:
+        _, p = _decode_value(data, p, strings)
+    if id_form == ID_UUID:
+        p += 16
+    else:
+        _, p = _decode_value(data, p, strings)
+    return micros, strings[U32.unpack_from(data, p + 1)[0]]
@@ -0,0 +1,239 @@
+import multiprocessing as mp
+import threading
+import zlib
+from bisect import bisect_left
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from src.event_store import EventStore
+from src.models import EventType, LockerSummary, CompartmentStatus, ReservationStatus
+from src.projection import Projection
+from src.snapshot import SnapshotStore, load_start
+
+# Read methods a shard will run on behalf of the router
+SHARD_QUERIES = ('locker_summary', 'compartment_status', 'reservation_status')
+# Records a partition's reader decodes at a time
+DECODE_CHUNK = 4096
+
+
+def shard_for(locker_id: str, num_shards: int) -> int:
+    # Range partition of the 32-bit crc so each shard owns a contiguous hash range
+    return (zlib.crc32(locker_id.encode()) * num_shards) >> 32
+
+
+def split_state(state: Dict[str, Any], partitions: int) -> List[Dict[str, Any]]:
+    """A snapshot state cut into per-partition states; `applied_event_ids` stay with the caller."""
+    parts = [
+        {'position': state['position'], 'clock': state.get('clock', 0), 'lockers': [], 'compartments': [],
+         'reservations': [], 'faults': [], 'applied_event_ids': []}
+        for _ in range(partitions)
+    ]
+    owner: Dict[str, int] = {}
+    for row in state['lockers']:
+        parts[shard_for(row[0], partitions)]['lockers'].append(row)
+    for row in state['compartments']:
+        part = owner[row[0]] = shard_for(row[1], partitions)
+        parts[part]['compartments'].append(row)
+    for row in state['reservations']:
+        parts[shard_for(row[2], partitions)]['reservations'].append(row)
+    for row in state['faults']:
+        # A fault on an unknown compartment has no locker; the merge catches any other partition using it
+        parts[owner.get(row[1], 0)]['faults'].append(row)
+    return parts
+
+
+def iter_partition(store: EventStore, partition: int, partitions: int, start: int,
+                   end: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yields (seq, event) for the partition's records in [start, end), in log
+    order. Each segment's per-locker index gives the partition's records, so
+    only those are read and decoded.
+    """
+    owned: Dict[str, bool] = {}
+    for segment in store.segments:
+        if segment.base_seq >= end:
+            break
+        if segment.end_seq <= start:
+            continue
+        seqs: List[int] = []
+        for locker_id, (locker_seqs, _) in segment.lockers().lockers.items():
+            mine = owned.get(locker_id)
+            if mine is None:
+                mine = owned[locker_id] = shard_for(locker_id, partitions) == partition
+            if mine:
+                seqs.extend(locker_seqs)
+        seqs.sort()
+        seqs = seqs[bisect_left(seqs, start):bisect_left(seqs, end)]
+        for lo in range(0, len(seqs), DECODE_CHUNK):
+            chunk = seqs[lo:lo + DECODE_CHUNK]
+            yield from zip(chunk, segment.decode_records(chunk))
+
+
+def _shard_main(conn, shard: int, num_shards: int, log_path: str):
+    projection = Projection()
+    # Every logged record bumps the clock once, so a shard sets it from the
+    # record's sequence number and its versions match a serial replay
+    clock_offset = 0
+    while True:
+        msg = conn.recv()
+        op = msg[0]
+        if op == 'apply':
+            _, seq, event = msg
+            if seq is not None:
+                projection.clock = clock_offset + seq
+            projection.apply(event, seq)
+        elif op == 'call':
+            _, name, args = msg
+            try:
+                if name not in SHARD_QUERIES:
+                    raise ValueError(f"Unknown shard query {name!r}")
+                conn.send(('ok', getattr(projection, name)(*args)))
+            except Exception as exc:
+                conn.send(('error', exc))
+        elif op == 'state':
+            # The router's snapshot; duplicates are the store's to catch, so no event ids
+            conn.send(('ok', dict(projection.snapshot_state(), applied_event_ids=[])))
+        elif op == 'rebuild':
+            _, state, end = msg
+            projection.restore_state(state)
+            clock_offset = state['clock'] - state['position']
+            store = EventStore(log_path, read_only=True)
+            try:
+                for seq, event in iter_partition(store, shard, num_shards, state['position'], end):
+                    projection.clock = clock_offset + seq
+                    projection.apply(event, seq)
+            finally:
+                store.close()
+            # Settled reservations are in the cold store, and are still looked up
+            reservation_ids = list(projection.reservations)
+            reservation_ids.extend(row[0] for row in projection.cold.reservations())
+            conn.send(('ok', reservation_ids))
+        elif op == 'stop':
+            conn.close()
+            return
+
+
+class ShardedProjection:
+    """
+    Projection partitioned by locker_id across worker processes. Each shard
+    owns a hash range of lockers and its own `Projection`; this object routes
+    applies and queries to the owning shard over a pipe, and keeps a global
+    reservation_id -> shard index for reservation lookups.
+
+    Applies are fire-and-forget but share the pipe with queries, so a query
+    sent after an apply always observes it. Events are routed by their own
+    locker_id: references across lockers (a reservation on another locker's
+    compartment) are not resolved across shards.
+
+    `position` and `snapshot_state` follow `Projection`, so a `Snapshotter`
+    can save the shards' combined state for the next rebuild to start from.
+    """
+
+    def __init__(self, num_shards: int, log_path: str):
+        if num_shards < 1:
+            raise ValueError("num_shards must be >= 1")
+        self.num_shards = num_shards
+        self.log_path = str(log_path)
+        self.reservation_shard: Dict[str, int] = {}
+        self.position = 0
+        self._clock_offset = 0
+        self._shards: List[Any] = []
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+
+    def start(self):
+        ctx = mp.get_context('spawn')
+        for shard in range(self.num_shards):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_shard_main,
+                args=(child, shard, self.num_shards, self.log_path),
+                name=f'projection-shard-{shard}',
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self._shards.append((proc, parent))
+
+    def shard_for(self, locker_id: str) -> int:
+        return shard_for(locker_id, self.num_shards)
+
+    def rebuild_from_log(self, snapshots: Optional[SnapshotStore] = None) -> int:
+        """
+        Seeds every shard with its part of the newest snapshot (if any), then
+        the shards replay their own lockers' records after it concurrently.
+        Returns the number of records replayed.
+        """
+        store = EventStore(self.log_path, read_only=True)
+        try:
+            end = store.next_seq
+            state = load_start(store, snapshots, end)
+        finally:
+            store.close()
+        if state is None:
+            state = Projection().snapshot_state()
+        for shard, ((_, conn), part) in enumerate(zip(self._shards, split_state(state, self.num_shards))):
+            self._locks[shard].acquire()
+            conn.send(('rebuild', part, end))
+        self.reservation_shard.clear()
+        for shard, (_, conn) in enumerate(self._shards):
+            try:
+                _, reservation_ids = conn.recv()
+            finally:
+                self._locks[shard].release()
+            for rid in reservation_ids:
+                self.reservation_shard[rid] = shard
+        self.position = end
+        self._clock_offset = state['clock'] - state['position']
+        return end - state['position']
+
+    def apply(self, event: Dict[str, Any], seq: Optional[int] = None):
+        if seq is not None:
+            self.position = seq + 1
+        shard = self.shard_for(event['locker_id'])
+        if event['type'] == EventType.RESERVATION_CREATED and 'reservation_id' in event['payload']:
+            self.reservation_shard[event['payload']['reservation_id']] = shard
+        with self._locks[shard]:
+            self._shards[shard][1].send(('apply', seq, event))
+
+    def _call(self, shard: int, name: str, *args):
+        with self._locks[shard]:
+            conn = self._shards[shard][1]
+            conn.send(('call', name, args))
+            status, result = conn.recv()
+        if status == 'error':
+            raise result
+        return result
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """The shards' states as one, in the `Projection.snapshot_state` layout, at `position`."""
+        parts = []
+        for shard, (_, conn) in enumerate(self._shards):
+            with self._locks[shard]:
+                conn.send(('state',))
+                parts.append(conn.recv()[1])
+        return {
+            'position': self.position,
+            'clock': self._clock_offset + self.position,
+            'lockers': [row for state in parts for row in state['lockers']],
+            'compartments': [row for state in parts for row in state['compartments']],
+            'reservations': [row for state in parts for row in state['reservations']],
+            'faults': [row for state in parts for row in state['faults']],
+            'applied_event_ids': [],
+        }
+
+    def locker_summary(self, locker_id: str) -> Optional[LockerSummary]:
+        return self._call(self.shard_for(locker_id), 'locker_summary', locker_id)
+
+    def compartment_status(self, locker_id: str, compartment_id: str) -> Optional[CompartmentStatus]:
+        return self._call(self.shard_for(locker_id), 'compartment_status', locker_id, compartment_id)
+
+    def reservation_status(self, reservation_id: str) -> Optional[ReservationStatus]:
+        shard = self.reservation_shard.get(reservation_id)
+        if shard is None:
+            return None
+        return self._call(shard, 'reservation_status', reservation_id)
+
+    def close(self):
+        for shard, (proc, conn) in enumerate(self._shards):
+            with self._locks[shard]:
+                conn.send(('stop',))
+            proc.join(timeout=5)
+        self._shards = []
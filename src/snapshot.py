@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+from src.event_store import EventStore, write_atomic
+from src.projection import Projection
+
+SNAPSHOT_VERSION = 1
+DEFAULT_EVERY_EVENTS = 100_000
+DEFAULT_INTERVAL = 60.0
+# Under the log directory: the state at the log's start_seq once compacted
+BASE_DIR = 'base'
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Projection snapshots on disk. Each file is a one-line JSON header
+    (version, log position, sha256 of the body) followed by the JSON body, and
+    is named by the log position it covers so the newest sorts last.
+    """
+
+    def __init__(self, path: str, keep: int = 2):
+        self.path = Path(path)
+        self.keep = keep
+
+    def _files(self) -> List[Path]:
+        if not self.path.exists():
+            return []
+        return sorted(self.path.glob('snapshot-*.json'))
+
+    def save(self, state: Dict[str, Any]) -> Path:
+        body = json.dumps(state, separators=(',', ':')).encode()
+        header = {
+            'version': SNAPSHOT_VERSION,
+            'position': state['position'],
+            'sha256': hashlib.sha256(body).hexdigest(),
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self.path / f"snapshot-{state['position']:020d}.json"
+        write_atomic(target, json.dumps(header).encode() + b'\n' + body)
+        for old in self._files()[:-self.keep]:
+            old.unlink(missing_ok=True)
+        return target
+
+    def load(self, file: Path) -> Optional[Dict[str, Any]]:
+        try:
+            header_line, body = file.read_bytes().split(b'\n', 1)
+            header = json.loads(header_line)
+        except (OSError, ValueError):
+            return None
+        if header.get('version') != SNAPSHOT_VERSION:
+            return None
+        if hashlib.sha256(body).hexdigest() != header.get('sha256'):
+            return None
+        state = json.loads(body)
+        if state.get('position') != header.get('position'):
+            return None
+        return state
+
+    def load_latest(self, max_position: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Newest snapshot that passes its checksum and does not run past the log."""
+        for file in reversed(self._files()):
+            state = self.load(file)
+            if state is None:
+                logger.warning("Ignoring corrupt snapshot %s", file)
+                continue
+            if max_position is not None and state['position'] > max_position:
+                logger.warning("Ignoring snapshot %s ahead of the log", file)
+                continue
+            return state
+        return None
+
+
+def load_base(store: EventStore) -> Optional[Dict[str, Any]]:
+    """The state the log starts from: None for an uncompacted log, else the compaction base at `start_seq`."""
+    if store.start_seq == 0:
+        return None
+    state = SnapshotStore(store.path / BASE_DIR).load_latest(max_position=store.start_seq)
+    if state is None or state['position'] != store.start_seq:
+        raise RuntimeError(f"Log starts at {store.start_seq} but its compaction base is missing or corrupt")
+    return state
+
+
+def load_start(store: EventStore, snapshots: Optional[SnapshotStore], max_position: int) -> Optional[Dict[str, Any]]:
+    """Newest state to replay the log from up to `max_position`: a snapshot, else the log's base."""
+    state = snapshots.load_latest(max_position=max_position) if snapshots is not None else None
+    if state is not None and state['position'] >= store.start_seq:
+        return state
+    return load_base(store)
+
+
+def restore(projection: Projection, store: EventStore, snapshots: SnapshotStore) -> int:
+    """
+    Load the newest valid snapshot into `projection` and replay the log tail.
+    Falls back to a full replay (from the compaction base, if any) when no
+    usable snapshot exists. Returns the number of events replayed.
+    """
+    state = load_start(store, snapshots, store.next_seq)
+    if state is None:
+        projection.clear()
+    else:
+        projection.restore_state(state)
+    start = projection.position
+    projection.replay(store.iter_records(start))
+    return projection.position - start
+
+
+class Snapshotter:
+    """
+    Periodic background snapshots. `on_applied` is called on the thread that
+    applies events (so the state copy is consistent with the projection
+    position); encoding, hashing and the write happen on a worker thread.
+    """
+
+    def __init__(self, projection: Projection, snapshots: SnapshotStore,
+                 every_events: int = DEFAULT_EVERY_EVENTS, interval: float = DEFAULT_INTERVAL):
+        self.projection = projection
+        self.snapshots = snapshots
+        self.every_events = every_events
+        self.interval = interval
+        self._last_position = projection.position
+        self._last_time = time.monotonic()
+        self._queue: queue.Queue = queue.Queue(maxsize=1)
+        self._worker = threading.Thread(target=self._run, name='snapshotter', daemon=True)
+        self._worker.start()
+
+    def on_applied(self, *_):
+        behind = self.projection.position - self._last_position
+        if behind <= 0:
+            return
+        if behind >= self.every_events or time.monotonic() - self._last_time >= self.interval:
+            self.capture()
+
+    def capture(self):
+        if self._queue.full():
+            return  # previous snapshot still being written
+        self._last_position = self.projection.position
+        self._last_time = time.monotonic()
+        self._queue.put(self.projection.snapshot_state())
+
+    def _run(self):
+        while True:
+            state = self._queue.get()
+            if state is None:
+                return
+            try:
+                self.snapshots.save(state)
+            except Exception:
+                logger.exception("Failed to write snapshot at position %d", state['position'])
+
+    def close(self, final: bool = True):
+        if final and self.projection.position > self._last_position:
+            self._queue.put(self.projection.snapshot_state())
+        self._queue.put(None)
+        self._worker.join()
@@ -0,0 +1,103 @@
+import pytest
+import json
+from fastapi.testclient import TestClient
+from src.api import app
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+def batch_events():
+    return [
+        {
+            "event_id": "batch-1",
+            "occurred_at": "2026-02-21T13:00:00Z",
+            "locker_id": "batch-locker",
+            "type": "CompartmentRegistered",
+            "payload": {"compartment_id": "batch-c1"}
+        },
+        {
+            "event_id": "batch-2",
+            "occurred_at": "2026-02-21T13:01:00Z",
+            "locker_id": "batch-locker",
+            "type": "ReservationCreated",
+            "payload": {"compartment_id": "batch-c1", "reservation_id": "batch-r1"}
+        },
+        # Repeat within the same batch
+        {
+            "event_id": "batch-1",
+            "occurred_at": "2026-02-21T13:00:00Z",
+            "locker_id": "batch-locker",
+            "type": "CompartmentRegistered",
+            "payload": {"compartment_id": "batch-c1"}
+        },
+        # Schema violation
+        {
+            "event_id": "batch-3",
+            "occurred_at": "2026-02-21T13:02:00Z",
+            "locker_id": "batch-locker",
+            "type": "NotAValidType",
+            "payload": {}
+        },
+        {
+            "event_id": "batch-4",
+            "occurred_at": "2026-02-21T13:03:00Z",
+            "locker_id": "batch-locker",
+            "type": "ParcelDeposited",
+            "payload": {"reservation_id": "batch-r1"}
+        },
+    ]
+
+def test_batch_per_event_results_and_order():
+    r = client.post("/events:batch", json=batch_events())
+    assert r.status_code == 202
+    body = r.json()
+    assert [res["status"] for res in body["results"]] == ["accepted", "accepted", "duplicate", "rejected", "accepted"]
+    assert (body["accepted"], body["duplicates"], body["rejected"]) == (3, 1, 1)
+    assert body["results"][3]["event_id"] == "batch-3"
+    # Applied in order: the deposit saw the reservation created earlier in the batch
+    r2 = client.get("/reservations/batch-r1")
+    assert r2.json()["status"] == "DEPOSITED"
+    # Replaying the whole batch is idempotent
+    r3 = client.post("/events:batch", json=batch_events())
+    assert r3.status_code == 200
+    assert [res["status"] for res in r3.json()["results"]] == ["duplicate", "duplicate", "duplicate", "rejected", "duplicate"]
+    # Single-event endpoint agrees with the batch on duplicates
+    r4 = client.post("/events", json=batch_events()[0])
+    assert r4.status_code == 200
+
+def test_batch_accepts_ndjson():
+    events = [dict(e, event_id=f"nd-{i}") for i, e in enumerate(batch_events()) if i != 3]
+    body = "\n".join(json.dumps(e) for e in events) + "\n"
+    r = client.post("/events:batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert r.status_code == 202
+    assert r.json()["accepted"] == 4
+
+def test_batch_body_must_be_array():
+    r = client.post("/events:batch", json={"event_id": "not-a-list"})
+    assert r.status_code == 422
+
+def test_export_streams_the_log_as_ndjson(tmp_path, monkeypatch):
+    from src import api
+    from src.event_store import EventStore
+    store = EventStore(tmp_path / "log")
+    events = [e for e in batch_events() if isinstance(e.get("event_id"), str) and "type" in e]
+    events += [dict(e, event_id=f"export-{i}", locker_id="export-locker") for i, e in enumerate(events)]
+    store.append_many(events)
+    logged = [event for _, event in store.iter_records()]
+    monkeypatch.setattr(api, "event_store", store)
+    r = client.get("/events")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in r.text.splitlines()] == logged
+    assert (r.headers["x-log-start"], r.headers["x-log-end"]) == ("0", str(len(logged)))
+    r = client.get("/events", params={"from_seq": 1, "type": "CompartmentRegistered", "locker_id": "export-locker"})
+    assert [json.loads(line)["event_id"] for line in r.text.splitlines()] == ["export-0", "export-2"]
+    r = client.get("/events", params={"until": "2026-02-21T13:01:00Z"})
+    assert {json.loads(line)["occurred_at"] for line in r.text.splitlines()} == {"2026-02-21T13:00:00Z"}
+    assert client.get("/events", params={"type": "Nope"}).status_code == 422
+    # An export is a valid batch body
+    body = client.get("/events").text
+    monkeypatch.undo()
+    r = client.post("/events:batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 202
+    store.close()
@@ -0,0 +1,103 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from src.event_store import EventStore, default_serializer
+from src.fixtures import make_event
+from src.log_convert import convert, main
+
+def registration(i, locker_id="lockerB", **overrides):
+    event = make_event(f"00000000-0000-4000-8000-{i:012d}", "CompartmentRegistered",
+                       {"compartment_id": f"c{i % 7}"}, locker_id, i % 60)
+    event.update(overrides)
+    return event
+
+# Events exercising every way a record can be spelled
+ODD_EVENTS = [
+    registration(1000, event_id="not-a-uuid", occurred_at="2026-02-21T10:00:00.250000+00:00"),
+    registration(1001, occurred_at="2026-02-21T12:00:00+02:00", type="FaultReported",
+                 payload={"compartment_id": "c1", "severity": -3, "note": "x" * 300, "ratio": 0.5,
+                          "tags": [None, True, False, 1 << 40], "nested": {"a": []}}),
+    registration(1002, occurred_at=datetime(2026, 2, 21, 10, 0, 1, tzinfo=timezone.utc)),
+    registration(1003, payload={"huge": 1 << 70}),
+    registration(1004, type="SomethingNew"),
+    dict(registration(1005), extra="kept"),
+]
+
+def as_logged(event):
+    return json.loads(json.dumps(event, default=default_serializer))
+
+def test_binary_records_round_trip_across_segments(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=1024, log_format="binary")
+    events = [registration(i, locker_id=f"lockerB{i % 3}") for i in range(60)] + ODD_EVENTS
+    for event in events:
+        assert store.append(event)
+    assert len(store.segments) > 2
+    assert store.load_all() == [as_logged(e) for e in events]
+    store.close()
+
+    # Readers rebuild the string tables, sidecars are rebuilt from records
+    for lidx in (tmp_path / "log").glob("*.lidx"):
+        lidx.unlink()
+    reader = EventStore(tmp_path / "log", read_only=True)
+    assert reader.log_format == "binary"
+    assert reader.read_range(40, 62) == [as_logged(e) for e in events[40:62]]
+    assert reader.load_by_locker("lockerB1") == [e for e in events if e["locker_id"] == "lockerB1"]
+    reopened = EventStore(tmp_path / "log", segment_bytes=1024)
+    assert not reopened.append(registration(5))
+    assert reopened.append(registration(99))
+    assert reopened.read_from(reopened.next_seq - 1) == [registration(99)]
+    reopened.close()
+
+@pytest.mark.parametrize("damage", ["torn", "corrupt"])
+def test_reopen_drops_damaged_tail(tmp_path, damage):
+    store = EventStore(tmp_path / "log", log_format="binary")
+    for i in range(20):
+        store.append(registration(i))
+    store.close()
+    data = bytearray(store.head.path.read_bytes())
+    if damage == "torn":
+        data += data[-40:-10]
+    else:
+        data[-3] ^= 0xff  # last record fails its checksum
+    store.head.path.write_bytes(bytes(data))
+    reopened = EventStore(tmp_path / "log")
+    assert reopened.next_seq == (20 if damage == "torn" else 19)
+    assert reopened.append(registration(20))
+    assert reopened.read_from(reopened.next_seq - 2)[-1] == registration(20)
+    reopened.close()
+
+def test_format_is_fixed_per_log(tmp_path):
+    EventStore(tmp_path / "log", log_format="binary").close()
+    manifest = json.loads((tmp_path / "log" / "manifest.json").read_text())
+    assert manifest["format"] == "binary"
+    reopened = EventStore(tmp_path / "log")
+    assert reopened.log_format == "binary"
+    reopened.close()
+    with pytest.raises(ValueError):
+        EventStore(tmp_path / "log", log_format="jsonl")
+    with pytest.raises(ValueError):
+        EventStore(tmp_path / "other", log_format="protobuf")
+
+def test_convert_both_ways(tmp_path, capsys):
+    events = [registration(i) for i in range(50)] + ODD_EVENTS
+    source = EventStore(tmp_path / "jsonl", segment_bytes=2048)
+    source.append_many(events)
+    source.close()
+    (tmp_path / "jsonl" / "snapshots").mkdir()
+
+    binary = convert(tmp_path / "jsonl", tmp_path / "binary", "binary", segment_bytes=2048)
+    assert binary["records"] == len(events)
+    assert (tmp_path / "binary" / "snapshots").is_dir()
+    assert binary["bytes"] < EventStore(tmp_path / "jsonl", read_only=True).size_bytes
+
+    main([str(tmp_path / "binary"), str(tmp_path / "export.jsonl"), "--to", "jsonl"])
+    assert json.loads(capsys.readouterr().out)["records"] == len(events)
+    exported = [json.loads(line) for line in (tmp_path / "export.jsonl").read_text().splitlines()]
+    assert exported == EventStore(tmp_path / "jsonl", read_only=True).load_all()
+
+    # Plain JSONL files import with the store's dedup
+    (tmp_path / "dupes.jsonl").write_text((tmp_path / "export.jsonl").read_text() * 2)
+    imported = convert(tmp_path / "dupes.jsonl", tmp_path / "imported", "binary")
+    assert imported == {"events": 2 * len(events), "records": len(events), "bytes": imported["bytes"]}
+    with pytest.raises(ValueError):
+        convert(tmp_path / "dupes.jsonl", tmp_path / "imported", "binary")
@@ -0,0 +1,105 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src.api import app
+from src.fixtures import event_maker
+from src.projection import Projection
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+make_event = event_maker("lockerBQ")
+
+def seeded_projection():
+    projection = Projection()
+    for i in range(10):
+        locker_id = f"q-{i:02d}"
+        projection.apply(make_event(f"{locker_id}-reg", "CompartmentRegistered", {"compartment_id": f"{locker_id}-c"}, locker_id))
+        if i % 2 == 0:
+            projection.apply(make_event(f"{locker_id}-res", "ReservationCreated",
+                                        {"compartment_id": f"{locker_id}-c", "reservation_id": f"{locker_id}-r"}, locker_id))
+        if i % 3 == 0:
+            projection.apply(make_event(f"{locker_id}-flt", "FaultReported",
+                                        {"compartment_id": f"{locker_id}-c", "severity": 4}, locker_id))
+    return projection
+
+def test_list_lockers_filters_and_pages():
+    projection = seeded_projection()
+    assert projection.list_lockers(limit=4) == ["q-00", "q-01", "q-02", "q-03"]
+    assert projection.list_lockers(after="q-03", limit=3) == ["q-04", "q-05", "q-06"]
+    assert projection.list_lockers(active=True) == ["q-00", "q-02", "q-04", "q-06", "q-08"]
+    assert projection.list_lockers(degraded=True) == ["q-00", "q-03", "q-06", "q-09"]
+    assert projection.list_lockers(degraded=True, active=True, after="q-00") == ["q-06"]
+    assert projection.list_lockers(degraded=False, active=False) == ["q-01", "q-05", "q-07"]
+
+    # Releasing and clearing keep the indexes current, and they survive snapshots
+    projection.apply(make_event("q-00-exp", "ReservationExpired", {"reservation_id": "q-00-r"}, "q-00"))
+    projection.apply(make_event("q-03-clr", "FaultCleared", {"fault_event_id": "q-03-flt", "compartment_id": "q-03-c"}, "q-03"))
+    restored = Projection()
+    restored.restore_state(projection.snapshot_state())
+    for proj in (projection, restored):
+        assert proj.list_lockers(active=True) == ["q-02", "q-04", "q-06", "q-08"]
+        assert proj.list_lockers(degraded=True) == ["q-00", "q-06", "q-09"]
+
+def test_query_endpoints_report_not_found():
+    client.post("/events", json=make_event("bq-1", "CompartmentRegistered", {"compartment_id": "bq-c1"}))
+    client.post("/events", json=make_event("bq-2", "ReservationCreated",
+                                           {"compartment_id": "bq-c1", "reservation_id": "bq-r1"}))
+    lockers = client.post("/lockers:query", json={"locker_ids": ["lockerBQ", "missing"]}).json()
+    assert [l["locker_id"] for l in lockers["lockers"]] == ["lockerBQ"]
+    assert lockers["lockers"][0] == client.get("/lockers/lockerBQ").json()
+    assert lockers["not_found"] == ["missing"]
+
+    reservations = client.post("/reservations:query", json={"reservation_ids": ["bq-r1", "nope"]}).json()
+    assert reservations["reservations"] == [client.get("/reservations/bq-r1").json()]
+    assert reservations["not_found"] == ["nope"]
+
+    too_many = client.post("/lockers:query", json={"locker_ids": ["x"] * 10_001})
+    assert too_many.status_code == 413
+
+def test_list_endpoint_cursor_and_ndjson():
+    for i in range(5):
+        client.post("/events", json=make_event(f"bl-{i}", "CompartmentRegistered", {"compartment_id": f"bl-c{i}"}, f"bl-{i}"))
+    client.post("/events", json=make_event("bl-f", "FaultReported", {"compartment_id": "bl-c3", "severity": 3}, "bl-3"))
+    # Other tests share the service, so page from just before the bl- lockers
+    first = client.get("/lockers", params={"limit": 2, "cursor": "bl-"}).json()
+    assert [l["locker_id"] for l in first["items"]] == ["bl-0", "bl-1"]
+    second = client.get("/lockers", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [l["locker_id"] for l in second["items"]] == ["bl-2", "bl-3"]
+    degraded = client.get("/lockers", params={"degraded": "true", "cursor": "bl-", "limit": 1}).json()
+    assert [l["locker_id"] for l in degraded["items"]] == ["bl-3"] and degraded["next_cursor"] == "bl-3"
+
+    streamed = client.get("/lockers", params={"cursor": "bl-1"}, headers={"Accept": "application/x-ndjson"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [row["locker_id"] for row in rows if row["locker_id"].startswith("bl-")] == ["bl-2", "bl-3", "bl-4"]
+    assert client.get("/lockers", params={"limit": 1001}).status_code == 422
+
+def test_list_lockers_pages_match_a_full_scan():
+    # Runs of degraded / active lockers of varied lengths, restored in bulk
+    lockers = []
+    for i in range(50000):
+        locker_id = f"p-{i:05d}"
+        degraded = [f"{locker_id}-c"] if (i // 700) % 3 else []
+        active = [f"{locker_id}-r"] if i % 5 in (1, 2) or i > 40000 else []
+        lockers.append([locker_id, [f"{locker_id}-c"], active, degraded])
+    projection = Projection()
+    projection.restore_state({"position": 0, "lockers": lockers, "compartments": [], "reservations": [],
+                              "faults": [], "applied_event_ids": []})
+    for degraded in (None, True, False):
+        for active in (None, True, False):
+            expected = [row[0] for row in lockers
+                        if (degraded is None or bool(row[3]) == degraded) and (active is None or bool(row[2]) == active)]
+            listed, after = [], None
+            while True:
+                page = projection.list_lockers(degraded=degraded, active=active, after=after, limit=1000)
+                listed += page
+                if len(page) < 1000:
+                    break
+                after = page[-1]
+            assert listed == expected
+    # The sorted ids follow adds and discards
+    projection.degraded_lockers.discard("p-00701")
+    projection.degraded_lockers.add("p-00003")
+    assert projection.degraded_lockers.ids == sorted(projection.degraded_lockers.members)
@@ -0,0 +1,39 @@
+from src.projection import Projection
+
+def ev(eid, etype, payload, locker_id="lockerC"):
+    return {"event_id": eid, "occurred_at": "2026-02-21T10:00:00Z",
+            "locker_id": locker_id, "type": etype, "payload": payload}
+
+LIFECYCLE = [
+    ev("cold-1", "CompartmentRegistered", {"compartment_id": "cC1"}),
+    ev("cold-2", "ReservationCreated", {"compartment_id": "cC1", "reservation_id": "rC1"}),
+    ev("cold-3", "ParcelDeposited", {"reservation_id": "rC1"}),
+    ev("cold-4", "ParcelPickedUp", {"reservation_id": "rC1"}),
+    ev("cold-5", "ReservationCreated", {"compartment_id": "cC1", "reservation_id": "rC2"}),
+    ev("cold-6", "ReservationExpired", {"reservation_id": "rC2"}),
+    ev("cold-7", "FaultReported", {"compartment_id": "cC1", "severity": 3}),
+    ev("cold-8", "FaultCleared", {"compartment_id": "cC1", "fault_event_id": "cold-7"}),
+]
+
+def test_settled_history_moves_to_cold_store():
+    proj = Projection()
+    proj.rebuild(LIFECYCLE)
+    assert proj.reservations == {} and proj.faults == {}
+    assert proj.cold.counts() == (2, 1)
+    assert proj.reservation_status("rC1").status == "PICKED_UP"
+    assert proj.reservation_status("rC2").status == "EXPIRED"
+    # Settled reservations still ignore later transitions
+    proj.apply(ev("cold-9", "ParcelDeposited", {"reservation_id": "rC1"}))
+    assert proj.reservation_status("rC1").status == "PICKED_UP"
+    # A second clear of the same fault is still a no-op
+    proj.apply(ev("cold-10", "FaultCleared", {"compartment_id": "cC1", "fault_event_id": "cold-7"}))
+    assert proj.compartment_status("lockerC", "cC1").degraded is False
+
+def test_snapshot_round_trip_keeps_cold_rows():
+    proj = Projection()
+    proj.rebuild(LIFECYCLE)
+    restored = Projection()
+    restored.restore_state(proj.snapshot_state())
+    assert restored.cold.counts() == (2, 1)
+    assert restored.reservation_status("rC2").status == "EXPIRED"
+    assert restored.locker_summary("lockerC") == proj.locker_summary("lockerC")
@@ -0,0 +1,102 @@
+import json
+import shutil
+import threading
+from src.compaction import Compactor, main
+from src.event_store import EventStore
+from src.expiry import ExpiryScheduler
+from src.fixtures import make_event
+from src.projection import Projection
+from src.snapshot import SnapshotStore, restore
+
+def history(rounds, prefix="h"):
+    """Registrations, then rounds of reservations that mostly settle and faults that mostly clear."""
+    events = [make_event(f"{prefix}-reg-{l}-{c}", "CompartmentRegistered", {"compartment_id": f"cpt-{l}-{c}"},
+                         f"lockerC{l}") for l in range(4) for c in range(3)]
+    for r in range(rounds):
+        for l in range(4):
+            locker, cid, rid = f"lockerC{l}", f"cpt-{l}-{r % 3}", f"{prefix}-r{r}-{l}"
+            events.append(make_event(f"{rid}-res", "ReservationCreated",
+                                     {"compartment_id": cid, "reservation_id": rid}, locker, r))
+            if (r + l) % 4:
+                events.append(make_event(f"{rid}-dep", "ParcelDeposited", {"reservation_id": rid}, locker, r))
+                events.append(make_event(f"{rid}-pick", "ParcelPickedUp", {"reservation_id": rid}, locker, r))
+            elif r < rounds - 3:
+                events.append(make_event(f"{rid}-exp", "ReservationExpired", {"reservation_id": rid}, locker, r))
+            if r % 5 == l:
+                events.append(make_event(f"{rid}-flt", "FaultReported", {"compartment_id": cid, "severity": 3},
+                                         locker, r))
+                if r % 2:
+                    events.append(make_event(f"{rid}-clr", "FaultCleared",
+                                             {"fault_event_id": f"{rid}-flt", "compartment_id": cid}, locker, r))
+    return events
+
+def projection_factory(store):
+    return lambda: Projection(dedup=store.dedup, expiry=ExpiryScheduler(reservation_ttl=3600))
+
+def canonical(proj):
+    state = proj.snapshot_state()
+    return {
+        "position": state["position"],
+        "clock": state["clock"],
+        "lockers": sorted([l[0], sorted(l[1]), sorted(l[2]), sorted(l[3]), *l[4:]] for l in state["lockers"]),
+        "compartments": sorted([*c[:4], sorted(c[4]), *c[5:]] for c in state["compartments"]),
+        "reservations": sorted(state["reservations"]),
+        "faults": sorted(state["faults"]),
+        "hashes": {lid: proj.locker_summary(lid).state_hash for lid in proj.lockers},
+    }
+
+def test_compacted_log_restores_identical_projection(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=2048)
+    events = history(40)
+    store.append_many(events)
+    full = projection_factory(store)()
+    full.replay(store.iter_records())
+
+    compactor = Compactor(store, retain_records=100, projection_factory=projection_factory(store))
+    result = compactor.compact()
+    assert result["dropped_records"] > 0 and store.start_seq == result["start_seq"]
+    assert store.next_seq - store.start_seq >= 100
+    assert not (tmp_path / "log" / f"{0:020d}.jsonl").exists()
+    assert compactor.compact()["dropped_records"] == 0  # nothing new to drop
+    store.close()
+
+    # The dedup index is rebuilt from what is left: ids inside the retained window still dedupe
+    shutil.rmtree(tmp_path / "log" / "dedup")
+    reopened = EventStore(tmp_path / "log", segment_bytes=2048)
+    restored = projection_factory(reopened)()
+    restore(restored, reopened, SnapshotStore(tmp_path / "snapshots"))
+    assert canonical(restored) == canonical(full)
+    assert not reopened.append(events[-100])
+    reopened.close()
+
+def test_online_compaction_does_not_block_appends(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=2048, durability="none")
+    live = projection_factory(store)()
+    store.subscribe(lambda seq, event: live.apply(event, seq))
+    store.append_many(history(30, "a"))
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    snapshots.save(live.snapshot_state())
+    compactor = Compactor(store, snapshots, retain_records=50, projection_factory=projection_factory(store))
+
+    later = history(30, "b")[12:]
+    writer = threading.Thread(target=lambda: [store.append(e) for e in later])
+    writer.start()
+    first = compactor.compact()
+    writer.join()
+    second = compactor.compact()
+    assert first["dropped_records"] + second["dropped_records"] == store.start_seq > 0
+    assert [e["event_id"] for e in store.read_from(store.next_seq - 1)] == [later[-1]["event_id"]]
+
+    restored = projection_factory(store)()
+    restore(restored, store, snapshots)
+    assert canonical(restored) == canonical(live)
+    store.close()
+
+def test_offline_cli(tmp_path, capsys):
+    store = EventStore(tmp_path / "log", segment_bytes=2048)
+    store.append_many(history(20))
+    store.close()
+    main([str(tmp_path / "log"), "--retain", "30", "--reservation-ttl", "3600"])
+    result = json.loads(capsys.readouterr().out)
+    assert result["dropped_records"] > 0
+    assert EventStore(tmp_path / "log", read_only=True).start_seq == result["start_seq"]
@@ -0,0 +1,68 @@
+import uuid
+from src.dedup import DedupIndex, event_key
+from src.event_store import EventStore
+
+def test_keys_are_128_bit():
+    u = str(uuid.uuid4())
+    assert event_key(u) == uuid.UUID(u).bytes
+    assert len(event_key("not-a-uuid")) == 16
+    assert event_key(u.upper()) != event_key(u)
+
+def test_index_grows_and_reopens_from_checkpoint(tmp_path):
+    index = DedupIndex(tmp_path / "dedup")
+    ids = [f"id-{i}" for i in range(3000)]
+    for eid in ids:
+        assert index.add(eid)
+    assert not index.add("id-17")
+    assert len(index) == 3000
+    index.checkpoint(3000)
+    index.close()
+
+    reopened = DedupIndex(tmp_path / "dedup")
+    assert reopened.position == 3000
+    assert all(eid in reopened for eid in ids)
+    assert "id-3000" not in reopened
+    reopened.close()
+
+def test_window_bounds_remembered_ids(tmp_path):
+    index = DedupIndex(tmp_path / "dedup", window=100)
+    for i in range(350):
+        index.add(f"w-{i}")
+    assert len(index.generations) == 2
+    assert len(index) <= 200
+    assert all(f"w-{i}" in index for i in range(250, 350))
+    assert "w-0" not in index
+    index.close()
+
+def test_store_restart_replays_only_tail_ids(tmp_path):
+    store = EventStore(tmp_path / "log")
+    for i in range(10):
+        store.append({"event_id": f"d-{i}", "occurred_at": "2026-02-21T10:00:00Z",
+                      "locker_id": "lockerD", "type": "CompartmentRegistered",
+                      "payload": {"compartment_id": f"c{i}"}})
+    store.close()
+    reopened = EventStore(tmp_path / "log")
+    assert reopened.dedup.position == 10
+    assert not reopened.append({"event_id": "d-3", "occurred_at": "2026-02-21T10:00:00Z",
+                                "locker_id": "lockerD", "type": "CompartmentRegistered",
+                                "payload": {"compartment_id": "c3"}})
+    reopened.close()
+
+def test_time_ordered_ids_spread_over_the_table(tmp_path):
+    index = DedupIndex(tmp_path / "dedup")
+    base = 0x0190_0000_0000
+    # UUIDv7-style ids (a millisecond prefix, then a per-millisecond counter)
+    # and plain sequential UUIDs that only differ in their last bytes
+    ids = [str(uuid.UUID(int=((base + i // 16) << 80) | (0x7 << 76) | (0x2 << 62) | i)) for i in range(20000)]
+    ids += [str(uuid.UUID(int=i)) for i in range(1, 20001)]
+    for eid in ids:
+        assert index.add(eid)
+    table = index.generations[-1]
+    # Linear probing stays short: the mean distance from the home slot is a few slots at most
+    displacement = 0
+    for off in range(32, 32 + table.capacity * 16, 16):
+        key = table._buf[off:off + 16]
+        if any(key):
+            displacement += ((off - 32) // 16 - table._slot(key)) & table._mask
+    assert displacement / len(ids) < 4
+    index.close()
@@ -1,16 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
 from src.api import app
-import os
 
 client = TestClient(app)
 
-@pytest.fixture(autouse=True)
-def clear_event_log():
-    path = os.path.join(os.path.dirname(__file__), '..', 'events.jsonl')
-    path = os.path.abspath(path)
-    if os.path.exists(path):
-        os.remove(path)
+pytestmark = pytest.mark.usefixtures("clear_event_log")
 
 # reservation can only exist for an existing compartment
 def test_reservation_only_for_existing_compartment():
@@ -0,0 +1,120 @@
+import threading
+import pytest
+import json
+from src.event_store import EventStore
+from src.fixtures import make_event
+
+def registration(i, locker_id="lockerS"):
+    return make_event(f"seg-{i}", "CompartmentRegistered", {"compartment_id": f"c{i}"}, locker_id)
+
+def test_segments_roll_and_range_reads(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=512)
+    for i in range(50):
+        assert store.append(registration(i))
+    assert len(store.segments) > 1
+    assert all(s.sealed for s in store.segments[:-1])
+    assert [e["event_id"] for e in store.load_all()] == [f"seg-{i}" for i in range(50)]
+    assert [e["event_id"] for e in store.read_from(42)] == [f"seg-{i}" for i in range(42, 50)]
+    assert [e["event_id"] for e in store.read_range(7, 23)] == [f"seg-{i}" for i in range(7, 23)]
+    manifest = json.loads((tmp_path / "log" / "manifest.json").read_text())
+    assert [s["base_seq"] for s in manifest["segments"]] == [s.base_seq for s in store.segments]
+    store.close()
+
+def test_reopen_recovers_partial_head(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=512)
+    for i in range(20):
+        store.append(registration(i))
+    store.close()
+    # Simulate a crash in the middle of a write
+    with store.head.path.open("ab") as f:
+        f.write(b'{"event_id": "torn')
+    reopened = EventStore(tmp_path / "log", segment_bytes=512)
+    assert reopened.next_seq == 20
+    assert not reopened.append(registration(3))
+    assert reopened.append(registration(20))
+    assert reopened.read_from(19)[-1]["event_id"] == "seg-20"
+    reopened.close()
+
+@pytest.mark.parametrize("durability", ["none", "batch", "always"])
+def test_concurrent_appends_are_group_committed(tmp_path, durability):
+    store = EventStore(tmp_path / "log", segment_bytes=4096, durability=durability)
+    def writer(t):
+        for i in range(50):
+            store.append(registration(f"{t}-{i}"))
+            # Acked appends are visible to readers
+            assert store.next_seq > 0
+    threads = [threading.Thread(target=writer, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.next_seq == 400
+    assert len({e["event_id"] for e in store.load_all()}) == 400
+    store.close()
+    assert EventStore(tmp_path / "log").next_seq == 400
+
+def test_unknown_durability_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        EventStore(tmp_path / "log", durability="sometimes")
+
+def test_load_by_locker_uses_index_across_segments(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=1024)
+    for i in range(60):
+        event = registration(i, locker_id=f"lockerI{i % 4}")
+        event["occurred_at"] = f"2026-02-21T10:{i:02d}:00Z"
+        store.append(event)
+    assert len(store.segments) > 2
+    history = store.load_by_locker("lockerI1")
+    assert [e["event_id"] for e in history] == [f"seg-{i}" for i in range(1, 60, 4)]
+    window = store.load_by_locker("lockerI1", since="2026-02-21T10:10:00Z", until="2026-02-21T10:30:00+00:00")
+    assert [e["event_id"] for e in window] == [f"seg-{i}" for i in range(13, 30, 4)]
+    assert store.load_by_locker("nobody") == []
+    store.close()
+
+    # Lost sidecars are rebuilt from the log
+    for lidx in (tmp_path / "log").glob("*.lidx"):
+        lidx.unlink()
+    reopened = EventStore(tmp_path / "log", segment_bytes=1024)
+    assert [e["event_id"] for e in reopened.load_by_locker("lockerI1")] == [f"seg-{i}" for i in range(1, 60, 4)]
+    reopened.close()
+
+def test_load_by_locker_after_batched_rolls(tmp_path):
+    # Each new head segment is indexed once, as its records are written
+    store = EventStore(tmp_path / "log", segment_bytes=1024)
+    store.append_many([registration(i, locker_id=f"lockerJ{i % 2}") for i in range(80)])
+    assert len(store.segments) > 2
+    assert [e["event_id"] for e in store.load_by_locker("lockerJ1")] == [f"seg-{i}" for i in range(1, 80, 2)]
+    assert [seq for seq, _ in store.iter_by_locker("lockerJ0", 10, 20)] == list(range(10, 20, 2))
+    store.close()
+
+@pytest.mark.parametrize("log_format", ["jsonl", "binary"])
+def test_iter_events_streams_filtered_records(tmp_path, monkeypatch, log_format):
+    import src.event_store
+    monkeypatch.setattr(src.event_store, "READ_CHUNK", 5)
+    store = EventStore(tmp_path / "log", segment_bytes=1024, log_format=log_format)
+    events = []
+    for i in range(60):
+        event = dict(registration(i, f"locker{i % 4}"), occurred_at=f"2026-02-21T10:{i:02d}:00Z")
+        if i % 3 == 0:
+            event.update(type="FaultReported", payload={"compartment_id": f"c{i}", "severity": 1})
+        if i % 10 == 1:
+            event["payload"]["note"] = "FaultReported"  # names the type without being one
+        events.append(event)
+    store.append_many(events)
+    assert len(store.segments) > 2
+    everything = list(store.iter_records())
+    def expected(start=0, types=None, lockers=None, since=None, until=None):
+        return [(seq, e) for seq, e in everything if seq >= start
+                and (types is None or e["type"] in types) and (lockers is None or e["locker_id"] in lockers)
+                and (since is None or e["occurred_at"] >= since) and (until is None or e["occurred_at"] < until)]
+    assert list(store.iter_events()) == everything
+    assert list(store.iter_events(7, types=["FaultReported"])) == expected(7, types={"FaultReported"})
+    assert list(store.iter_events(lockers=["locker1", "locker3"], types=["CompartmentRegistered"])) == \
+        expected(lockers={"locker1", "locker3"}, types={"CompartmentRegistered"})
+    window = dict(since="2026-02-21T10:12:00Z", until="2026-02-21T10:41:00Z")
+    assert list(store.iter_events(**window)) == expected(**window)
+    assert list(store.iter_events(20, lockers=["locker2"], **window)) == expected(20, lockers={"locker2"}, **window)
+    assert list(store.iter_events(types=["ParcelPickedUp"])) == []
+    with pytest.raises(ValueError):
+        list(store.iter_events(types=["NotAType"]))
+    store.close()
@@ -0,0 +1,141 @@
+from src.event_store import EventStore
+from src.expiry import ExpiryScheduler, ExpiryEngine, expiry_event_id
+from src.fixtures import event_maker
+from src.locker_index import to_micros
+from src.models import ReservationStatusEnum
+from src.projection import Projection
+from src.snapshot import SnapshotStore, restore
+
+T0 = to_micros("2026-02-21T10:00:00Z")
+SECOND = 1_000_000
+
+make_event = event_maker("lockerX")
+
+def open_service(path, **ttls):
+    store = EventStore(path, durability='none')
+    projection = Projection(dedup=store.dedup, expiry=ExpiryScheduler(**ttls))
+    store.subscribe(lambda seq, event: projection.apply(event, seq))
+    return store, projection, ExpiryEngine(projection, store, projection.expiry)
+
+def seed(store, count=3):
+    for i in range(count):
+        store.append(make_event(f"reg-{i}", "CompartmentRegistered", {"compartment_id": f"x-c{i}"}))
+        store.append(make_event(f"res-{i}", "ReservationCreated",
+                                {"compartment_id": f"x-c{i}", "reservation_id": f"x-r{i}"}))
+
+def test_scheduler_pops_due_buckets_in_order():
+    scheduler = ExpiryScheduler()
+    scheduler.schedule("late", T0 + 10 * SECOND)
+    scheduler.schedule("early", T0 + 1)
+    scheduler.schedule("early2", T0 + SECOND)
+    assert len(scheduler) == 3
+    assert scheduler.pop_due(T0) == []
+    assert scheduler.pop_due(T0 + SECOND) == ["early", "early2"]
+    assert scheduler.next_due() == T0 + 10 * SECOND
+    assert scheduler.pop_due(T0 + 60 * SECOND) == ["late"]
+    assert len(scheduler) == 0
+
+def test_engine_expires_overdue_reservations_once(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+    seed(store)
+    # Deposited parcels have no pickup TTL, so they stop being timed
+    store.append(make_event("dep-1", "ParcelDeposited", {"reservation_id": "x-r1"}))
+    store.append(make_event("dep-2", "ParcelDeposited", {"reservation_id": "x-r2"}))
+    store.append(make_event("pick-2", "ParcelPickedUp", {"reservation_id": "x-r2"}))
+    assert engine.run_once(T0 + 30 * SECOND) == 0
+    assert engine.run_once(T0 + 61 * SECOND) == 1
+    assert projection.reservation_status("x-r0").status == ReservationStatusEnum.EXPIRED
+    assert projection.reservation_status("x-r1").status == ReservationStatusEnum.DEPOSITED
+    assert projection.reservation_status("x-r2").status == ReservationStatusEnum.PICKED_UP
+    expired = store.load_all()[-1]
+    assert expired["event_id"] == expiry_event_id("x-r0", T0 + 60 * SECOND)
+    assert to_micros(expired["occurred_at"]) == T0 + 60 * SECOND
+    assert engine.run_once(T0 + 120 * SECOND) == 0
+    store.close()
+
+def test_payload_deadline_and_pickup_ttl(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60, pickup_ttl=3600)
+    store.append(make_event("reg", "CompartmentRegistered", {"compartment_id": "x-c0"}))
+    store.append(make_event("res", "ReservationCreated", {
+        "compartment_id": "x-c0", "reservation_id": "x-r0", "expires_at": "2026-02-21T10:00:05Z"}))
+    store.append(make_event("dep", "ParcelDeposited", {"reservation_id": "x-r0"},
+                            occurred_at="2026-02-21T10:00:03Z"))
+    # The deposit moved the deadline to 1h after it, the old bucket is stale
+    assert engine.run_once(T0 + 10 * SECOND) == 0
+    assert engine.run_once(T0 + 3603 * SECOND) == 1
+    assert projection.reservation_status("x-r0").status == ReservationStatusEnum.EXPIRED
+    store.close()
+
+def test_timers_survive_restart_without_double_fire(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+    seed(store)
+    assert engine.run_once(T0 + 61 * SECOND) == 3
+    store.append(make_event("reg-9", "CompartmentRegistered", {"compartment_id": "x-c9"}))
+    store.append(make_event("res-9", "ReservationCreated", {"compartment_id": "x-c9", "reservation_id": "x-r9"},
+                            occurred_at="2026-02-21T11:00:00Z"))
+    state = projection.snapshot_state()
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    snapshots.save(state)
+    store.close()
+
+    # Deadlines travel in snapshots
+    restored = Projection(expiry=ExpiryScheduler(reservation_ttl=60))
+    restored.restore_state(state)
+    assert restored.reservations["x-r9"].deadline == T0 + 3660 * SECOND
+    assert restored.expiry.pop_due(T0 + 3660 * SECOND) == ["x-r9"]
+
+    # Replayed from the log, and restored from the snapshot
+    for use_snapshot in (False, True):
+        store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+        if use_snapshot:
+            restore(projection, store, snapshots)
+        else:
+            projection.replay(store.iter_records())
+            assert list(projection.reservations) == ["x-r9"]
+        assert engine.run_once(T0 + 61 * SECOND) == 0
+        expired = engine.run_once(T0 + 3661 * SECOND)
+        assert projection.reservation_status("x-r9").status == ReservationStatusEnum.EXPIRED
+        assert expired == (0 if use_snapshot else 1)
+        store.close()
+
+def test_malformed_payload_deadline_falls_back_to_the_ttl(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+    for i, expires_at in enumerate(("soon", 12.5, "2026-02-31T10:00:00Z")):
+        store.append(make_event(f"reg-{i}", "CompartmentRegistered", {"compartment_id": f"x-c{i}"}))
+        store.append(make_event(f"res-{i}", "ReservationCreated", {
+            "compartment_id": f"x-c{i}", "reservation_id": f"x-r{i}", "expires_at": expires_at}))
+    assert [r.deadline for r in projection.reservations.values()] == [T0 + 60 * SECOND] * 3
+    store.close()
+
+    # The logged events replay on restart
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+    restore(projection, store, SnapshotStore(tmp_path / "snapshots"))
+    assert len(projection.reservations) == 3
+    assert engine.run_once(T0 + 61 * SECOND) == 3
+    store.close()
+
+def test_pickup_between_check_and_append_wins(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60, pickup_ttl=60)
+    seed(store, 1)
+    store.append(make_event("dep-0", "ParcelDeposited", {"reservation_id": "x-r0"}))
+    append_many = store.append_many
+    def pickup_first(events):
+        # The parcel is picked up after the engine found the reservation due
+        store.append(make_event("pick-0", "ParcelPickedUp", {"reservation_id": "x-r0"}))
+        return append_many(events)
+    engine.store = type("Racing", (), {"append_many": staticmethod(pickup_first)})()
+    engine.run_once(T0 + 61 * SECOND)
+    assert store.load_all()[-1]["type"] == "ReservationExpired"
+    assert projection.reservation_status("x-r0").status == ReservationStatusEnum.PICKED_UP
+    assert projection.compartment_status("lockerX", "x-c0").active_reservation is None
+    store.close()
+
+def test_reused_reservation_id_expires_again(tmp_path):
+    store, projection, engine = open_service(tmp_path / "log", reservation_ttl=60)
+    seed(store, 1)
+    assert engine.run_once(T0 + 61 * SECOND) == 1
+    store.append(make_event("res-again", "ReservationCreated", {"compartment_id": "x-c0", "reservation_id": "x-r0"},
+                            occurred_at="2026-02-21T11:00:00Z"))
+    assert engine.run_once(T0 + 3661 * SECOND) == 1
+    assert projection.reservation_status("x-r0").status == ReservationStatusEnum.EXPIRED
+    store.close()
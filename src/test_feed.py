@@ -0,0 +1,78 @@
+import asyncio
+from fastapi.testclient import TestClient
+from src.api import app
+from src.feed import ChangeFeed, sse_stream
+from src.fixtures import event_maker
+from src.projection import Projection
+
+client = TestClient(app)
+
+make_event = event_maker("lockerF")
+
+def feed_with(events, **kwargs):
+    projection = Projection()
+    feed = ChangeFeed(projection, **kwargs)
+    def push(batch):
+        for event in batch:
+            seq = projection.position
+            feed.publish(seq, event, projection.apply(event, seq))
+    push(events)
+    return projection, feed, push
+
+def lifecycle(locker_id="lockerF", n=0):
+    return [
+        make_event(f"{locker_id}-reg-{n}", "CompartmentRegistered", {"compartment_id": f"{locker_id}-c{n}"}, locker_id),
+        make_event(f"{locker_id}-res-{n}", "ReservationCreated",
+                   {"compartment_id": f"{locker_id}-c{n}", "reservation_id": f"{locker_id}-r{n}"}, locker_id),
+        make_event(f"{locker_id}-dep-{n}", "ParcelDeposited", {"reservation_id": f"{locker_id}-r{n}"}, locker_id),
+    ]
+
+def test_live_deltas_for_followed_lockers():
+    async def run():
+        projection, feed, push = feed_with([])
+        sub = feed.subscribe({"lockerF"})
+        push(lifecycle("lockerF") + lifecycle("other"))
+        # Rejected events do not produce deltas
+        push([make_event("bad", "ParcelPickedUp", {"reservation_id": "nope"})])
+        return await sub.next_batch(1.0), projection
+    batch, projection = asyncio.run(run())
+    assert [d["position"] for d in batch] == [0, 1, 2]
+    last = batch[-1]
+    assert last["event_type"] == "ParcelDeposited"
+    assert last["reservation"] == {"reservation_id": "lockerF-r0", "status": "DEPOSITED"}
+    assert last["compartment"] == {"compartment_id": "lockerF-c0", "degraded": False, "active_reservation": "lockerF-r0"}
+    assert last["locker"]["state_hash"] == projection.locker_summary("lockerF").state_hash
+
+def test_resume_from_history_without_gaps_or_repeats():
+    async def run():
+        _, feed, push = feed_with(lifecycle("lockerF", 0) + lifecycle("lockerF", 1))
+        sub = feed.subscribe(after=3)
+        push(lifecycle("lockerF", 2))
+        return await sub.next_batch(1.0)
+    batch = asyncio.run(run())
+    assert [d["position"] for d in batch] == [4, 5, 6, 7, 8]
+    assert all(d["kind"] == "delta" for d in batch)
+
+def test_resume_past_history_starts_with_reset():
+    async def run():
+        _, feed, _ = feed_with(lifecycle("lockerF", 0) + lifecycle("lockerG", 0), history=2)
+        return await feed.subscribe({"lockerF"}, after=1).next_batch(1.0)
+    batch = asyncio.run(run())
+    assert [(d["kind"], d["position"], d["locker_id"]) for d in batch] == [("reset", 5, "lockerF")]
+    assert batch[0]["locker"]["active_reservations"] == 1
+
+def test_slow_subscriber_is_dropped_not_blocking():
+    async def run():
+        _, feed, push = feed_with([], max_buffer=2)
+        sub = feed.subscribe()
+        push(lifecycle("lockerF", 0) + lifecycle("lockerF", 1))
+        assert feed.subscribers == 0
+        return [chunk async for chunk in sse_stream(feed, sub, heartbeat=0.1)]
+    chunks = asyncio.run(run())
+    assert chunks[0].startswith("id: 0\nevent: delta\n")
+    assert chunks[0].count("event: delta") == 2
+    assert chunks[-1].startswith("event: dropped")
+
+def test_feed_rejects_bad_last_event_id():
+    response = client.get("/feed", headers={"Last-Event-ID": "not-a-position"})
+    assert response.status_code == 422
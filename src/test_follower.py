@@ -0,0 +1,91 @@
+import pytest
+from fastapi.testclient import TestClient
+from src.api import app
+from src.compaction import Compactor
+from src.event_store import EventStore
+from src.fixtures import make_event
+from src.follower import Follower
+from src.projection import Projection
+from src.snapshot import SnapshotStore
+
+client = TestClient(app)
+
+def traffic(rounds, prefix="f"):
+    events = [make_event(f"{prefix}-reg-{l}", "CompartmentRegistered", {"compartment_id": f"{prefix}-c{l}"},
+                         f"lockerF{l}") for l in range(3)]
+    for r in range(rounds):
+        for l in range(3):
+            rid = f"{prefix}-r{r}-{l}"
+            events.append(make_event(f"{rid}-res", "ReservationCreated",
+                                     {"compartment_id": f"{prefix}-c{l}", "reservation_id": rid}, f"lockerF{l}", r))
+            events.append(make_event(f"{rid}-dep", "ParcelDeposited", {"reservation_id": rid}, f"lockerF{l}", r))
+            events.append(make_event(f"{rid}-pick", "ParcelPickedUp", {"reservation_id": rid}, f"lockerF{l}", r))
+    return events
+
+def writer(path, **kwargs):
+    store = EventStore(path, segment_bytes=2048, durability="none", **kwargs)
+    live = Projection(dedup=store.dedup)
+    store.subscribe(lambda seq, event: live.apply(event, seq))
+    return store, live
+
+def same(replica, live):
+    assert replica.position == live.position and replica.clock == live.clock
+    for locker_id in live.lockers:
+        assert replica.locker_summary(locker_id) == live.locker_summary(locker_id)
+        assert replica.locker_version(locker_id) == live.locker_version(locker_id)
+
+@pytest.mark.parametrize("log_format", ["jsonl", "binary"])
+def test_follower_tails_the_writer_across_segment_rolls(tmp_path, log_format):
+    store, live = writer(tmp_path / "log", log_format=log_format)
+    events = traffic(20)
+    store.append_many(events[:40])
+    follower = Follower(EventStore(tmp_path / "log", read_only=True), Projection(), interval=60)
+    follower.start()
+    same(follower.projection, live)
+    # Reads through the per-locker index keep up with the followed head too
+    assert follower.store.load_by_locker("lockerF1") == store.load_by_locker("lockerF1")
+
+    for event in events[40:]:
+        store.append(event)
+    assert len(store.segments) > 2
+    follower.store.refresh()
+    assert follower.lag_records == len(events) - 40
+    follower.poll()
+    assert follower.lag_records == 0 and follower.lag_seconds < 5
+    same(follower.projection, live)
+    assert follower.store.load_by_locker("lockerF1") == store.load_by_locker("lockerF1")
+    assert not follower.projection.applied_event_ids
+    follower.close()
+    store.close()
+
+def test_follower_resumes_from_its_snapshot_and_restarts_past_compaction(tmp_path):
+    store, live = writer(tmp_path / "log")
+    store.append_many(traffic(10, "a"))
+    snapshots = SnapshotStore(tmp_path / "replica")
+    first = Follower(EventStore(tmp_path / "log", read_only=True), Projection(), snapshots, interval=60)
+    first.start()
+    first.close()
+    snapshots.save(first.projection.snapshot_state())
+
+    store.append_many(traffic(3, "b"))
+    resumed = Follower(EventStore(tmp_path / "log", read_only=True), Projection(), snapshots, interval=60)
+    assert resumed.start() == store.next_seq - first.projection.position
+    same(resumed.projection, live)
+
+    # The writer compacts away records the replica has not applied yet: it restarts from the base
+    store.append_many(traffic(40, "c"))
+    Compactor(store, retain_records=30).compact()
+    assert store.start_seq > resumed.projection.position
+    resumed.poll()
+    assert resumed.restores == 2
+    same(resumed.projection, live)
+    resumed.close()
+    store.close()
+
+def test_replica_refuses_writes(monkeypatch):
+    from src import api
+    monkeypatch.setattr(api, "ingest", None)
+    event = make_event("w-1", "CompartmentRegistered", {"compartment_id": "cW"}, "lockerW")
+    assert client.post("/events", json=event).status_code == 405
+    assert client.post("/events:batch", json=[event]).status_code == 405
+    assert client.get("/ingest/stats").status_code == 405
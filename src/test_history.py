@@ -0,0 +1,116 @@
+import pytest
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from src.api import app
+from src.compaction import Compactor
+from src.event_store import EventStore
+from src.fixtures import event_maker
+from src.history import HistoryStore, TimeTravel, HistoryCompacted
+from src.locker_index import to_micros
+from src.projection import Projection
+
+client = TestClient(app)
+
+# Minutes count from midnight, so a long history runs over into the next days
+make_event = event_maker(start=datetime(2026, 2, 21, tzinfo=timezone.utc))
+
+def history(locker_id, rounds, other="lockerT9"):
+    """A locker's reservations, faults and a late-logged event, interleaved with another locker."""
+    events = [make_event(f"{locker_id}-reg-{c}", "CompartmentRegistered", {"compartment_id": f"{locker_id}-c{c}"},
+                         locker_id) for c in range(3)]
+    for r in range(rounds):
+        cid, rid = f"{locker_id}-c{r % 3}", f"{locker_id}-r{r}"
+        events.append(make_event(f"{rid}-res", "ReservationCreated", {"compartment_id": cid, "reservation_id": rid},
+                                 locker_id, 3 * r))
+        events.append(make_event(f"{rid}-dep", "ParcelDeposited", {"reservation_id": rid}, locker_id, 3 * r + 1))
+        events.append(make_event(f"{rid}-pick", "ParcelPickedUp", {"reservation_id": rid}, locker_id, 3 * r + 2))
+        if r % 7 == 3:
+            # Expiring a reservation settled long ago, after checkpoints moved it to the history
+            events.append(make_event(f"{rid}-exp", "ReservationExpired", {"reservation_id": f"{locker_id}-r{r - 3}"},
+                                     locker_id, 3 * r + 2))
+        if r % 5 == 0:
+            events.append(make_event(f"{rid}-flt", "FaultReported", {"compartment_id": cid, "severity": 3},
+                                     locker_id, 3 * r + 2))
+        if r % 5 == 2:
+            events.append(make_event(f"{rid}-clr", "FaultCleared",
+                                     {"fault_event_id": f"{locker_id}-r{r - 2}-flt",
+                                      "compartment_id": f"{locker_id}-c{(r - 2) % 3}"}, locker_id, 3 * r + 2))
+        if r == rounds // 2:
+            events.append(make_event(f"{rid}-late", "FaultReported", {"compartment_id": cid, "severity": 4},
+                                     locker_id, 5))
+        events.append(make_event(f"{rid}-other", "CompartmentRegistered", {"compartment_id": f"o{r}"}, other, 3 * r))
+    return events
+
+def reference(store, locker_id, seq=None, micros=None):
+    projection = Projection()
+    for s, event in store.iter_records():
+        if event["locker_id"] == locker_id and (seq is None or s <= seq) and \
+                (micros is None or to_micros(event["occurred_at"]) <= micros):
+            projection.apply(event, s)
+    return projection
+
+def same_state(past, expected, locker_id, rounds):
+    assert past.locker_summary(locker_id) == expected.locker_summary(locker_id)
+    for c in range(3):
+        cid = f"{locker_id}-c{c}"
+        assert past.compartment_status(locker_id, cid) == expected.compartment_status(locker_id, cid)
+    for r in range(rounds):
+        rid = f"{locker_id}-r{r}"
+        assert past.reservation_status(rid) == expected.reservation_status(rid)
+
+def test_as_of_matches_replaying_the_locker_up_to_the_point(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=8192)
+    store.append_many(history("lockerT", 60))
+    tt = TimeTravel(store, HistoryStore(), every=16)
+    for seq in (0, 17, 100, 181, 250, 333, store.next_seq - 1, store.next_seq + 10):
+        same_state(tt.at("lockerT", seq), reference(store, "lockerT", seq=seq), "lockerT", 60)
+    assert tt.history.latest("lockerT").seq > store.next_seq - 60
+    for minute in (4, 5, 30, 90, 179):
+        micros = to_micros(f"2026-02-21T{minute // 60:02d}:{minute % 60:02d}:00Z")
+        same_state(tt.at("lockerT", f"2026-02-21T{minute // 60:02d}:{minute % 60:02d}:00Z"),
+                   reference(store, "lockerT", micros=micros), "lockerT", 60)
+    # Before the locker's first event there is nothing
+    assert tt.at("lockerT", "2026-02-20T00:00:00Z").locker_summary("lockerT") is None
+    store.close()
+
+def test_compacted_history_starts_from_the_base(tmp_path):
+    store = EventStore(tmp_path / "log", segment_bytes=4096)
+    store.append_many(history("lockerU", 40))
+    tt = TimeTravel(store, HistoryStore(), every=16)
+    tt.catch_up("lockerU")
+    checkpoint = tt.history.before("lockerU", seq=70)
+    before = tt.at("lockerU", checkpoint.seq - 1).locker_summary("lockerU")
+    expected = reference(store, "lockerU", seq=store.next_seq - 5)
+    Compactor(store, retain_records=50).compact()
+    assert store.start_seq > 70
+    # Points held by a checkpoint made before compaction still answer, others are gone
+    assert tt.at("lockerU", checkpoint.seq - 1).locker_summary("lockerU") == before
+    for seq in (10, checkpoint.seq):
+        with pytest.raises(HistoryCompacted):
+            tt.at("lockerU", seq)
+    fresh = TimeTravel(store, HistoryStore(), every=16)
+    same_state(fresh.at("lockerU", store.next_seq - 5), expected, "lockerU", 40)
+    with pytest.raises(HistoryCompacted):
+        fresh.at("lockerU", 60)
+    store.close()
+
+def test_as_of_endpoints(tmp_path, monkeypatch):
+    from src import api
+    store = EventStore(tmp_path / "log")
+    store.append_many(history("lockerTA", 4, other="lockerTA9"))
+    live = Projection(dedup=store.dedup)
+    live.replay(store.iter_records())
+    monkeypatch.setattr(api, "projection", live)
+    monkeypatch.setattr(api, "time_travel", TimeTravel(store, HistoryStore()))
+    # Reservation r1 was created at minute 3 and deposited at minute 4
+    r = client.get("/reservations/lockerTA-r1", params={"as_of": "2026-02-21T00:03:30Z"})
+    assert r.status_code == 200 and r.json() == {"reservation_id": "lockerTA-r1", "status": "CREATED"}
+    assert "etag" not in r.headers
+    assert client.get("/reservations/lockerTA-r1").json()["status"] == "PICKED_UP"
+    r = client.get("/lockers/lockerTA/compartments/lockerTA-c0", params={"as_of": "2026-02-21T00:02:00+00:00"})
+    assert r.json() == {"compartment_id": "lockerTA-c0", "degraded": True, "active_reservation": None}
+    assert client.get("/lockers/lockerTA", params={"as_of": "2026-02-21T00:00:00Z"}).json()["active_reservations"] == 1
+    assert client.get("/lockers/lockerTA", params={"as_of": "2026-01-01T00:00:00Z"}).status_code == 404
+    assert client.get("/reservations/nope", params={"as_of": "0"}).status_code == 404
+    assert client.get("/lockers/lockerTA", params={"as_of": "yesterday"}).status_code == 422
+    store.close()
@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+from src.api import app, response_cache
+from src.fixtures import event_maker
+from src.http_cache import etag_matches
+from src.projection import Projection
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+make_event = event_maker("lockerE")
+
+def test_etag_matching():
+    assert etag_matches('"l-3"', '"l-3"')
+    assert etag_matches('"x", W/"l-3"', '"l-3"')
+    assert etag_matches('*', '"l-3"')
+    assert not etag_matches('"l-2"', '"l-3"')
+    assert not etag_matches(None, '"l-3"')
+
+def test_conditional_get_and_version_bumps():
+    client.post("/events", json=make_event("etag-1", "CompartmentRegistered", {"compartment_id": "etag-c1"}))
+    first = client.get("/lockers/lockerE")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    hits = response_cache.hits
+    again = client.get("/lockers/lockerE")
+    assert again.json() == first.json() and response_cache.hits == hits + 1
+    not_modified = client.get("/lockers/lockerE", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag and not_modified.content == b""
+
+    client.post("/events", json=make_event("etag-2", "ReservationCreated",
+                                           {"compartment_id": "etag-c1", "reservation_id": "etag-r1"}))
+    changed = client.get("/lockers/lockerE", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["active_reservations"] == 1
+
+    # Deposits change the reservation, not the locker or compartment
+    locker_etag = changed.headers["ETag"]
+    comp_etag = client.get("/lockers/lockerE/compartments/etag-c1").headers["ETag"]
+    res_etag = client.get("/reservations/etag-r1").headers["ETag"]
+    client.post("/events", json=make_event("etag-3", "ParcelDeposited", {"reservation_id": "etag-r1"}))
+    assert client.get("/lockers/lockerE", headers={"If-None-Match": locker_etag}).status_code == 304
+    assert client.get("/lockers/lockerE/compartments/etag-c1",
+                      headers={"If-None-Match": comp_etag}).status_code == 304
+    deposited = client.get("/reservations/etag-r1", headers={"If-None-Match": res_etag})
+    assert deposited.status_code == 200 and deposited.json()["status"] == "DEPOSITED"
+
+    # Settled reservations keep their version in the cold store
+    client.post("/events", json=make_event("etag-4", "ParcelPickedUp", {"reservation_id": "etag-r1"}))
+    picked_up = client.get("/reservations/etag-r1")
+    assert picked_up.json()["status"] == "PICKED_UP"
+    assert client.get("/reservations/etag-r1",
+                      headers={"If-None-Match": picked_up.headers["ETag"]}).status_code == 304
+
+def test_unknown_entities_are_404():
+    assert client.get("/lockers/nope").status_code == 404
+    assert client.get("/reservations/nope").status_code == 404
+
+def test_versions_are_reproduced_by_replay_and_snapshots():
+    events = [
+        make_event("v1", "CompartmentRegistered", {"compartment_id": "v-c1"}),
+        make_event("v2", "ReservationCreated", {"compartment_id": "v-c1", "reservation_id": "v-r1"}),
+        make_event("v3", "ParcelDeposited", {"reservation_id": "v-r1"}),
+        make_event("v4", "ParcelPickedUp", {"reservation_id": "v-r1"}),
+        make_event("v5", "FaultReported", {"compartment_id": "v-c1", "severity": 3}),
+    ]
+    live = Projection()
+    for event in events:
+        live.apply(event)
+    rebuilt = Projection()
+    rebuilt.rebuild(events)
+    restored = Projection()
+    restored.restore_state(live.snapshot_state())
+    for proj in (rebuilt, restored):
+        assert proj.clock == live.clock == 5
+        assert proj.locker_version("lockerE") == live.locker_version("lockerE") == 5
+        assert proj.compartment_version("lockerE", "v-c1") == 5
+        assert proj.reservation_version("v-r1") == 4
@@ -1,17 +1,11 @@
 import pytest
-import os
 from fastapi.testclient import TestClient
 from src.api import app
 from src.models import Event
 
 client = TestClient(app)
 
-@pytest.fixture(autouse=True)
-def clear_event_log():
-    path = os.path.join(os.path.dirname(__file__), '..', 'events.jsonl')
-    path = os.path.abspath(path)
-    if os.path.exists(path):
-        os.remove(path)
+pytestmark = pytest.mark.usefixtures("clear_event_log")
 
 
 def test_event_idempotency():
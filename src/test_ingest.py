@@ -0,0 +1,70 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from src.api import app
+from src.event_store import EventStore
+from src.fixtures import make_event
+from src.ingest import IngestPipeline, IngestQueueFull
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+def registration(i, locker_id="lockerQ"):
+    return make_event(f"ingest-{i}", "CompartmentRegistered", {"compartment_id": f"c{i}"}, locker_id)
+
+def test_pipeline_appends_in_submission_order(tmp_path):
+    store = EventStore(tmp_path / "log", durability='none')
+    applied = []
+    store.subscribe(lambda seq, event: applied.append((seq, event["event_id"])))
+    pipeline = IngestPipeline(store)
+    futures = [pipeline.submit([registration(i)]) for i in range(200)]
+    futures.append(pipeline.submit([registration(3), registration(200)]))
+    assert [f.result(timeout=5) for f in futures[:200]] == [[True]] * 200
+    assert futures[-1].result(timeout=5) == [False, True]
+    assert applied == [(i, f"ingest-{i}") for i in range(201)]
+    assert pipeline.stats.accepted == 201 and pipeline.stats.duplicates == 1
+    assert pipeline.depth == 0
+    pipeline.close()
+    store.close()
+
+def test_full_queue_refuses_whole_submissions(tmp_path):
+    store = EventStore(tmp_path / "log", durability='none')
+    release = threading.Event()
+    store.subscribe(lambda seq, event: release.wait(5))
+    pipeline = IngestPipeline(store, capacity=4)
+    # The first submission occupies the writer, the next fills the queue
+    first = pipeline.submit([registration(0)])
+    while pipeline.depth:
+        pass
+    queued = pipeline.submit([registration(i) for i in range(1, 5)])
+    with pytest.raises(IngestQueueFull) as exc:
+        pipeline.submit([registration(5)])
+    assert exc.value.retry_after >= 1
+    assert pipeline.stats.rejected_full == 1
+    release.set()
+    assert first.result(timeout=5) == [True]
+    assert queued.result(timeout=5) == [True] * 4
+    assert pipeline.submit([registration(5)]).result(timeout=5) == [True]
+    pipeline.close()
+    store.close()
+
+def test_api_reports_ingest_stats():
+    for i in range(3):
+        assert client.post("/events", json=registration(i)).status_code == 202
+    assert client.get("/lockers/lockerQ").json()["compartments"] == 3
+    stats = client.get("/ingest/stats").json()
+    assert stats["queue_depth"] == 0
+    assert stats["accepted"] >= 3
+    assert stats["service_seconds_max"] > 0
+
+def test_api_answers_503_when_queue_full(monkeypatch):
+    from src import api
+    def refuse(events):
+        raise IngestQueueFull(retry_after=2)
+    monkeypatch.setattr(api.ingest, "submit", refuse)
+    response = client.post("/events", json=registration(0))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    response = client.post("/events:batch", json=[registration(1)])
+    assert response.status_code == 503
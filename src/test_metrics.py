@@ -0,0 +1,74 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from src.api import app
+from src.fixtures import event_maker
+from src.metrics import Metrics, Registry
+from src.projection import Projection, ApplyOutcome
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+make_event = event_maker("lockerM")
+
+def test_counters_aggregate_per_thread_shards():
+    registry = Registry()
+    counter = registry.counter('test_total', 'help', ('kind',))
+    def work():
+        for _ in range(1000):
+            counter.inc('a')
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc('b', amount=5)
+    assert counter.values() == {('a',): 8000, ('b',): 5}
+    text = registry.render()
+    assert '# TYPE test_total counter' in text
+    assert 'test_total{kind="a"} 8000' in text
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.histogram('test_seconds', 'help', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        hist.observe(value)
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'test_seconds_sum 6.05' in lines
+    assert 'test_seconds_count 4' in lines
+
+def test_apply_reports_rejection_reasons():
+    metrics = Metrics()
+    proj = Projection(metrics=metrics)
+    assert proj.apply(make_event("m1", "CompartmentRegistered", {"compartment_id": "m-c1"})) == ApplyOutcome.APPLIED
+    assert proj.apply(make_event("m1", "CompartmentRegistered", {"compartment_id": "m-c1"})) == ApplyOutcome.DUPLICATE
+    assert proj.apply(make_event("m2", "ReservationCreated", {"compartment_id": "nope", "reservation_id": "m-r1"})) \
+        == ApplyOutcome.UNKNOWN_COMPARTMENT
+    assert proj.apply(make_event("m3", "ReservationCreated", {"compartment_id": "m-c1", "reservation_id": "m-r1"})) \
+        == ApplyOutcome.APPLIED
+    assert proj.apply(make_event("m4", "ParcelPickedUp", {"reservation_id": "m-r1"})) == ApplyOutcome.INVALID_STATUS
+    assert proj.apply(make_event("m5", "FaultCleared", {"compartment_id": "m-c1", "fault_event_id": "x"})) \
+        == ApplyOutcome.UNKNOWN_FAULT
+    counts = metrics.events.values()
+    assert counts[("CompartmentRegistered", ApplyOutcome.APPLIED)] == 1
+    assert counts[("ParcelPickedUp", ApplyOutcome.INVALID_STATUS)] == 1
+    assert 'lockstream_events_total{type="ReservationCreated",outcome="unknown_compartment"} 1' in metrics.render()
+
+def test_metrics_endpoint():
+    event = make_event("metrics-1", "CompartmentRegistered", {"compartment_id": "metrics-c1"})
+    assert client.post("/events", json=event).status_code == 202
+    assert client.post("/events", json=event).status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'lockstream_events_total{type="CompartmentRegistered",outcome="applied"}' in text
+    assert 'lockstream_events_total{type="CompartmentRegistered",outcome="duplicate"}' in text
+    assert 'lockstream_append_seconds_count' in text
+    assert 'lockstream_fsync_seconds_bucket{le="+Inf"}' in text
+    assert 'lockstream_entities{kind="compartments"}' in text
+    assert 'lockstream_log_records' in text
@@ -0,0 +1,83 @@
+import subprocess
+import sys
+import threading
+from pathlib import Path
+import pytest
+from src.event_store import EventStore
+from src.fixtures import make_event
+from src.projection import Projection
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def registration(eid, locker_id="lockerM"):
+    return make_event(eid, "CompartmentRegistered", {"compartment_id": f"c-{eid}"}, locker_id)
+
+def worker(path, **kwargs):
+    store = EventStore(path, segment_bytes=2048, durability="none", shared=True, **kwargs)
+    projection = Projection(dedup=store.dedup)
+    seen = []
+    def on_durable(seq, event):
+        seen.append(seq)
+        projection.apply(event, seq)
+    store.subscribe(on_durable)
+    return store, projection, seen
+
+@pytest.mark.parametrize("log_format", ["jsonl", "binary"])
+def test_shared_writers_number_records_once_and_dedup_across_workers(tmp_path, log_format):
+    stores = [worker(tmp_path / "log", log_format=log_format) for _ in range(2)]
+    results = {0: [], 1: []}
+    def append(w):
+        store = stores[w][0]
+        for i in range(150):
+            # Every id is sent by both workers, the log keeps each once
+            results[w].append(store.append(registration(f"m-{i}", f"locker{i % 7}")))
+    threads = [threading.Thread(target=append, args=(w,)) for w in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [a or b for a, b in zip(results[0], results[1])] == [True] * 150
+    assert not any(a and b for a, b in zip(results[0], results[1]))
+
+    for store, projection, seen in stores:
+        assert store.catch_up() == 150
+        # Each worker saw every record once, in log order, and rolled with the others
+        assert seen == list(range(150))
+        assert len(store.segments) > 1
+        assert sorted(e["event_id"] for e in store.load_all()) == sorted(f"m-{i}" for i in range(150))
+        assert len(store.load_by_locker("locker3")) == len(range(3, 150, 7))
+        assert projection.position == 150 and len(projection.compartments) == 150
+        assert not store.append(registration("m-42"))
+    assert stores[0][1].locker_summary("locker3") == stores[1][1].locker_summary("locker3")
+    for store, _, _ in stores:
+        store.close()
+
+    reopened = EventStore(tmp_path / "log")
+    assert reopened.next_seq == 150 and not reopened.append(registration("m-7"))
+    reopened.close()
+
+def test_read_your_writes_across_workers(tmp_path):
+    (first, first_projection, _), (second, second_projection, _) = [worker(tmp_path / "log") for _ in range(2)]
+    assert first.append(registration("a-1", "lockerA"))
+    assert "lockerA" not in second_projection.lockers
+    second.catch_up()
+    assert second_projection.locker_summary("lockerA") == first_projection.locker_summary("lockerA")
+    assert second.append(registration("b-1", "lockerA"))
+    assert first.catch_up() == 2
+    assert first_projection.locker_version("lockerA") == second_projection.locker_version("lockerA")
+    first.close()
+    second.close()
+
+def test_single_writer_is_exclusive(tmp_path):
+    path = tmp_path / "log"
+    shared, _, _ = worker(path)
+    with pytest.raises(RuntimeError):
+        EventStore(path)
+    # Another process cannot open the log for writing alone while workers share it
+    script = f"from src.event_store import EventStore; EventStore({str(path)!r})"
+    done = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True)
+    assert done.returncode != 0 and "shared=True" in done.stderr
+    with pytest.raises(RuntimeError):
+        shared.drop_before(0)
+    shared.close()
+    EventStore(path).close()
@@ -1,16 +1,10 @@
 import pytest
-import os
 from fastapi.testclient import TestClient
 from src.api import app
 
 client = TestClient(app)
 
-@pytest.fixture(autouse=True)
-def clear_event_log():
-    path = os.path.join(os.path.dirname(__file__), '..', 'events.jsonl')
-    path = os.path.abspath(path)
-    if os.path.exists(path):
-        os.remove(path)
+pytestmark = pytest.mark.usefixtures("clear_event_log")
 
 # 1. Requests violating OpenAPI schema must return 422
 @pytest.mark.parametrize("invalid_event", [
@@ -0,0 +1,86 @@
+import pytest
+from src.event_store import EventStore
+from src.expiry import ExpiryScheduler
+from src.fixtures import make_event
+from src.parallel_rebuild import restore_parallel
+from src.projection import Projection
+from src.sharding import shard_for
+from src.snapshot import SnapshotStore, restore
+
+def fleet(lockers, rounds):
+    """Every kind of event, rejected ones included, over several lockers."""
+    events = [make_event(f"reg-{l}-{c}", "CompartmentRegistered", {"compartment_id": f"cP{l}-{c}"}, f"lockerP{l}")
+              for l in range(lockers) for c in range(2)]
+    for r in range(rounds):
+        for l in range(lockers):
+            locker, cid, rid = f"lockerP{l}", f"cP{l}-{r % 2}", f"rP{r}-{l}"
+            events.append(make_event(f"{rid}-res", "ReservationCreated",
+                                     {"compartment_id": cid, "reservation_id": rid}, locker, r))
+            events.append(make_event(f"{rid}-dep", "ParcelDeposited", {"reservation_id": rid}, locker, r))
+            if (r + l) % 3:
+                events.append(make_event(f"{rid}-pick", "ParcelPickedUp", {"reservation_id": rid}, locker, r))
+            elif r < rounds - 2:
+                events.append(make_event(f"{rid}-exp", "ReservationExpired", {"reservation_id": rid}, locker, r))
+            if r % 4 == l % 4:
+                events.append(make_event(f"{rid}-flt", "FaultReported", {"compartment_id": cid, "severity": 3},
+                                         locker, r))
+                events.append(make_event(f"{rid}-clr", "FaultCleared",
+                                         {"fault_event_id": f"{rid}-flt", "compartment_id": cid}, locker, r))
+            events.append(make_event(f"{rid}-ghost", "ParcelDeposited", {"reservation_id": f"ghost-{rid}"},
+                                     locker, r))
+    return events
+
+def expiring(store):
+    return Projection(dedup=store.dedup, expiry=ExpiryScheduler(reservation_ttl=3600, pickup_ttl=7200))
+
+def canonical(proj):
+    state = proj.snapshot_state()
+    return {
+        "position": state["position"],
+        "clock": state["clock"],
+        "lockers": sorted([l[0], sorted(l[1]), sorted(l[2]), sorted(l[3]), *l[4:]] for l in state["lockers"]),
+        "compartments": sorted([*c[:4], sorted(c[4]), *c[5:]] for c in state["compartments"]),
+        "reservations": sorted(state["reservations"]),
+        "faults": sorted(state["faults"]),
+        "applied_event_ids": sorted(state["applied_event_ids"]),
+        "hashes": {lid: proj.locker_summary(lid).state_hash for lid in proj.lockers},
+    }
+
+@pytest.mark.parametrize("log_format", ["jsonl", "binary"])
+def test_parallel_rebuild_matches_serial(tmp_path, log_format, caplog):
+    store = EventStore(tmp_path / "log", segment_bytes=4096, log_format=log_format)
+    events = fleet(6, 12)
+    store.append_many(events[:300])
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    at_snapshot = expiring(store)
+    at_snapshot.replay(store.iter_records())
+    snapshots.save(at_snapshot.snapshot_state())
+    store.append_many(events[300:])
+
+    serial, parallel = expiring(store), expiring(store)
+    restore(serial, store, snapshots)
+    assert restore_parallel(parallel, store, snapshots, workers=3, min_records=0) == store.next_seq - 300
+    assert canonical(parallel) == canonical(serial)
+
+    # A standalone projection dedupes by itself, the parallel path keeps its ids too
+    serial, parallel = Projection(), Projection()
+    serial.replay(store.iter_records())
+    restore_parallel(parallel, store, workers=2, min_records=0)
+    assert canonical(parallel) == canonical(serial)
+    assert "serially" not in caplog.text
+    store.close()
+
+def test_ids_shared_across_partitions_fall_back_to_serial(tmp_path, caplog):
+    # A reservation on another partition's compartment: only a serial replay sees both
+    other = next(f"lockerQ{i}" for i in range(100) if shard_for(f"lockerQ{i}", 2) != shard_for("lockerP0", 2))
+    store = EventStore(tmp_path / "log")
+    store.append_many(fleet(4, 3) + [
+        make_event("x-res", "ReservationCreated", {"compartment_id": "cP0-0", "reservation_id": "rX"}, other),
+    ])
+    serial, parallel = expiring(store), expiring(store)
+    serial.replay(store.iter_records())
+    assert serial.reservation_status("rX") is not None
+    restore_parallel(parallel, store, workers=2, min_records=0)
+    assert "replaying the log serially" in caplog.text
+    assert canonical(parallel) == canonical(serial)
+    store.close()
@@ -3,22 +3,16 @@ import pytest
 from fastapi.testclient import TestClient
 from src.api import app
 from src.event_store import EventStore
+from src.fixtures import event_maker
 from src.projection import Projection
-import os
 
 client = TestClient(app)
 
-@pytest.fixture(autouse=True)
-def clear_event_log():
-    path = os.path.join(os.path.dirname(__file__), '..', 'events.jsonl')
-    path = os.path.abspath(path)
-    if os.path.exists(path):
-        os.remove(path)
+pytestmark = pytest.mark.usefixtures("clear_event_log")
 
 def test_projection_equivalence_state_hash():
-    # Setup: clear event log and add events
-    store = EventStore('events.jsonl')
-    store.path.unlink(missing_ok=True)  # Remove file if exists
+    # Setup: event log is cleared by the fixture, add events
+    store = EventStore('event_log')
     events = [
         {
             "event_id": "eq-1",
@@ -57,3 +51,88 @@ def test_projection_equivalence_state_hash():
     hash_inc = proj_inc.locker_summary("lockerE").state_hash
 
     assert hash_full == hash_inc, f"State hash mismatch: {hash_full} != {hash_inc}"
+
+def test_incremental_state_hash_matches_recomputed():
+    events = [
+        {"event_id": f"h-reg-{i}", "occurred_at": "2026-02-21T10:00:00Z", "locker_id": "lockerH",
+         "type": "CompartmentRegistered", "payload": {"compartment_id": f"cH{i}"}}
+        for i in range(4)
+    ] + [
+        {"event_id": "h-res", "occurred_at": "2026-02-21T10:01:00Z", "locker_id": "lockerH",
+         "type": "ReservationCreated", "payload": {"compartment_id": "cH0", "reservation_id": "rH0"}},
+        {"event_id": "h-fault", "occurred_at": "2026-02-21T10:02:00Z", "locker_id": "lockerH",
+         "type": "FaultReported", "payload": {"compartment_id": "cH1", "severity": 4}},
+        {"event_id": "h-exp", "occurred_at": "2026-02-21T10:03:00Z", "locker_id": "lockerH",
+         "type": "ReservationExpired", "payload": {"reservation_id": "rH0"}},
+        {"event_id": "h-clear", "occurred_at": "2026-02-21T10:04:00Z", "locker_id": "lockerH",
+         "type": "FaultCleared", "payload": {"compartment_id": "cH1", "fault_event_id": "h-fault"}},
+    ]
+    proj = Projection()
+    seen = set()
+    for e in events:
+        proj.apply(e)
+        locker = proj.lockers["lockerH"]
+        assert locker.state_acc == locker.recompute_state_acc()
+        seen.add(locker.state_hash)
+    assert all(h.startswith("v2:") for h in seen)
+    # Only the four registered compartments remain, whatever order they arrived in
+    reordered = Projection()
+    for e in reversed(events[:4]):
+        reordered.apply(e)
+    assert reordered.locker_summary("lockerH").state_hash == proj.locker_summary("lockerH").state_hash
+
+def _state(proj):
+    state = proj.snapshot_state()
+    rows = {k: sorted(repr([sorted(v) if isinstance(v, list) else v for v in row]) for row in state[k])
+            for k in ('lockers', 'compartments', 'reservations', 'faults')}
+    return rows, state['position'], state['clock'], sorted(proj.active_lockers), sorted(proj.degraded_lockers)
+
+def test_apply_many_matches_apply():
+    from bench.fleet import generate_fleet
+    from src.models import EventType
+    events = list(generate_fleet(20000, num_lockers=50, seed=3))
+    one_by_one = Projection()
+    outcomes = [one_by_one.apply(e, seq) for seq, e in enumerate(events)]
+    batched = Projection()
+    assert batched.apply_many(enumerate(events)) == outcomes
+    assert _state(batched) == _state(one_by_one)
+    assert any(c.degraded for c in batched.compartments.values())
+    # Events built with the EventType members dispatch like the logged strings
+    typed = Projection()
+    typed.replay((seq, dict(e, type=EventType(e['type']))) for seq, e in enumerate(events))
+    assert _state(typed) == _state(one_by_one)
+
+def test_degraded_until_last_severe_fault_cleared():
+    event = event_maker("lockerD")
+    proj = Projection()
+    proj.apply(event("d-reg", "CompartmentRegistered", {"compartment_id": "cD"}))
+    for fid, severity in (("d-f1", 3), ("d-f2", 1), ("d-f3", 5)):
+        proj.apply(event(fid, "FaultReported", {"compartment_id": "cD", "severity": severity}))
+    assert proj.compartments["cD"].severe_faults == 2
+    proj.apply(event("d-c1", "FaultCleared", {"compartment_id": "cD", "fault_event_id": "d-f1"}))
+    assert proj.compartment_status("lockerD", "cD").degraded
+    # The count is derived again from the open faults on restore
+    restored = Projection()
+    restored.restore_state(proj.snapshot_state())
+    assert restored.compartments["cD"].severe_faults == 1
+    for p in (proj, restored):
+        p.apply(event("d-c2", "FaultCleared", {"compartment_id": "cD", "fault_event_id": "d-f2"}))
+        assert p.compartment_status("lockerD", "cD").degraded
+        p.apply(event("d-c3", "FaultCleared", {"compartment_id": "cD", "fault_event_id": "d-f3"}))
+        assert not p.compartment_status("lockerD", "cD").degraded
+        assert "lockerD" not in p.degraded_lockers
+
+def test_clearing_a_fault_of_a_re_registered_compartment():
+    event = event_maker("lockerR")
+    proj = Projection()
+    proj.apply(event("rr-reg", "CompartmentRegistered", {"compartment_id": "cR"}))
+    proj.apply(event("rr-f", "FaultReported", {"compartment_id": "cR", "severity": 3}))
+    proj.apply(event("rr-reg2", "CompartmentRegistered", {"compartment_id": "cR"}))
+    assert proj.locker_summary("lockerR").degraded_compartments == 1
+    version = proj.locker_version("lockerR")
+    proj.apply(event("rr-c", "FaultCleared", {"compartment_id": "cR", "fault_event_id": "rr-f"}))
+    # Cleared from the locker's set as the if/elif reducer did, which the hash covers too
+    assert proj.locker_summary("lockerR").degraded_compartments == 0
+    assert "lockerR" not in proj.degraded_lockers and proj.locker_version("lockerR") > version
+    locker = proj.lockers["lockerR"]
+    assert locker.state_acc == locker.recompute_state_acc()
@@ -0,0 +1,70 @@
+from src.event_store import EventStore
+from src.projection import Projection
+from src.snapshot import SnapshotStore, Snapshotter, restore
+
+def locker_events(n):
+    events = []
+    for i in range(n):
+        events.append({
+            "event_id": f"snap-reg-{i}",
+            "occurred_at": "2026-02-21T10:00:00Z",
+            "locker_id": f"lockerS{i % 3}",
+            "type": "CompartmentRegistered",
+            "payload": {"compartment_id": f"cS{i}"}
+        })
+        events.append({
+            "event_id": f"snap-res-{i}",
+            "occurred_at": "2026-02-21T10:01:00Z",
+            "locker_id": f"lockerS{i % 3}",
+            "type": "ReservationCreated",
+            "payload": {"compartment_id": f"cS{i}", "reservation_id": f"rS{i}"}
+        })
+    return events
+
+def hashes(proj):
+    return {lid: proj.locker_summary(lid).state_hash for lid in proj.lockers}
+
+def test_restore_from_snapshot_replays_only_tail(tmp_path):
+    store = EventStore(tmp_path / "log")
+    events = locker_events(20)
+    for e in events[:30]:
+        store.append(e)
+    proj = Projection()
+    proj.replay(store.iter_records())
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    snapshots.save(proj.snapshot_state())
+    for e in events[30:]:
+        store.append(e)
+
+    restored = Projection()
+    replayed = restore(restored, store, snapshots)
+    assert replayed == 10
+    full = Projection()
+    full.rebuild(store.load_all())
+    assert restored.position == full.position == 40
+    assert hashes(restored) == hashes(full)
+
+def test_corrupt_snapshot_falls_back_to_full_replay(tmp_path):
+    store = EventStore(tmp_path / "log")
+    for e in locker_events(5):
+        store.append(e)
+    proj = Projection()
+    proj.replay(store.iter_records())
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    path = snapshots.save(proj.snapshot_state())
+    path.write_bytes(path.read_bytes()[:-5] + b'xxxxx')
+
+    restored = Projection()
+    assert restore(restored, store, snapshots) == 10
+    assert hashes(restored) == hashes(proj)
+
+def test_snapshotter_writes_in_background(tmp_path):
+    proj = Projection()
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    snapshotter = Snapshotter(proj, snapshots, every_events=8)
+    for seq, e in enumerate(locker_events(4)):
+        proj.apply(e, seq)
+        snapshotter.on_applied()
+    snapshotter.close(final=False)
+    state = snapshots.load_latest()
+    assert state is not None and state["position"] == 8
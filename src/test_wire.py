@@ -0,0 +1,54 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from src import api
+from src.api import app
+from src.fixtures import event_maker
+from src.models import Event
+from src.wire import canonical_event
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("clear_event_log")
+
+make_event = event_maker("lockerW")
+
+@pytest.mark.parametrize("occurred_at", [
+    "2026-02-21T10:00:00Z", "2026-02-21T10:00:00", "2026-02-21T10:00:00.5+02:00",
+    "2026-02-21T10:00:00.123456-05:30", "2026-02-21 10:00:00Z", "2026-02-21T10:00:00.1234567Z", 1771668000,
+])
+def test_canonical_event_matches_the_model(occurred_at):
+    event = make_event("w-1", "CompartmentRegistered", {"compartment_id": "cW1"}, occurred_at=occurred_at)
+    event["extra"] = "dropped"
+    # Logged exactly as the Event model would have written it, fast path or not
+    model = Event.model_validate(event).model_dump()
+    model.update(occurred_at=model["occurred_at"].isoformat(), type=model["type"].value)
+    assert json.dumps(canonical_event(event)) == json.dumps(model)
+
+@pytest.mark.parametrize("bad", [
+    {"occurred_at": "2026-04-31T10:00:00Z"}, {"occurred_at": "2026-02-21T10:00:00+00:60"},
+    {"occurred_at": "2026-02-21T24:00:00Z"}, {"occurred_at": "2026-02-21T10:00:60Z"},
+    {"type": "NotAValidType"}, {"payload": []}, {"event_id": 7},
+])
+def test_canonical_event_rejects_what_the_model_rejects(bad):
+    event = dict(make_event("w-2", "CompartmentRegistered", {"compartment_id": "cW2"}), **bad)
+    with pytest.raises(ValidationError):
+        canonical_event(event)
+
+def test_post_errors_keep_the_body_model_shape():
+    event = make_event("w-3", "NotAValidType", {})
+    detail = client.post("/events", json=event).json()["detail"]
+    assert detail[0]["loc"] == ["body", "type"]
+    r = client.post("/events", content=b'{"event_id": ', headers={"Content-Type": "application/json"})
+    assert r.status_code == 422 and r.json()["detail"][0]["type"] == "json_invalid"
+
+def test_read_bodies_match_the_response_models():
+    client.post("/events", json=make_event("w-4", "CompartmentRegistered", {"compartment_id": "cW4"}))
+    client.post("/events", json=make_event("w-5", "ReservationCreated", {"compartment_id": "cW4", "reservation_id": "rW4"}))
+    projection = api.projection
+    assert client.get("/lockers/lockerW").content == projection.locker_summary("lockerW").model_dump_json().encode()
+    assert (client.get("/lockers/lockerW/compartments/cW4").content
+            == projection.compartment_status("lockerW", "cW4").model_dump_json().encode())
+    assert client.get("/reservations/rW4").content == projection.reservation_status("rW4").model_dump_json().encode()
+    assert client.get("/lockers/lockerW/compartments/missing").status_code == 404
@@ -0,0 +1,51 @@
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict
+from src.models import Event, EventType
+
+# RFC 3339 date-times as devices send them, with the time and offset fields
+# in the ranges the Event model allows (fromisoformat alone would take an
+# offset of +00:60 as +01:00). Other spellings the model accepts (a space
+# separator, unix timestamps, more than 6 fraction digits...) and days past
+# the end of a month take the model path.
+_RFC3339 = re.compile(
+    r'[0-9]{4}-[0-9]{2}-[0-9]{2}T(?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9](?:\.[0-9]{1,6})?'
+    r'(?:Z|[+-](?:[01][0-9]|2[0-3]):[0-5][0-9])?'
+)
+_EVENT_TYPES = frozenset(etype.value for etype in EventType)
+
+
+def canonical_event(obj: Any) -> Dict[str, Any]:
+    """
+    A decoded request event as it is logged and applied: the `Event` fields
+    in schema order, occurred_at as the `isoformat()` of the parsed time and
+    type as its string, other keys dropped. An event in the common shape is
+    checked field by field without building a model. Anything else goes
+    through `Event`, which raises the ValidationError for invalid input, so
+    both paths accept and log exactly the same events.
+    """
+    if type(obj) is dict:
+        event_id = obj.get('event_id')
+        occurred_at = obj.get('occurred_at')
+        locker_id = obj.get('locker_id')
+        etype = obj.get('type')
+        payload = obj.get('payload')
+        if (type(event_id) is str and type(locker_id) is str and type(payload) is dict
+                and type(etype) is str and etype in _EVENT_TYPES
+                and type(occurred_at) is str and _RFC3339.fullmatch(occurred_at)):
+            try:
+                when = datetime.fromisoformat(occurred_at)
+            except ValueError:
+                pass  # out of range (a 31st of April...), for the model to report
+            else:
+                return {"event_id": event_id, "occurred_at": when.isoformat(), "locker_id": locker_id,
+                        "type": etype, "payload": payload}
+    event = Event.model_validate(obj)
+    return {"event_id": event.event_id, "occurred_at": event.occurred_at.isoformat(), "locker_id": event.locker_id,
+            "type": event.type.value, "payload": event.payload}
+
+
+def encode_json(obj: Any) -> bytes:
+    """A response body, byte for byte what pydantic's `model_dump_json` gives for the same fields."""
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()